@@ -0,0 +1,100 @@
+"""
+Benchmark: 1 MB page changes POSTed to PageChangeAPIView, with the json module parser and
+renderer, CharField and serializer.data (before), and with the orjson parser and renderer,
+LargeTextField and validated_data (after). Reports requests per second and the peak memory
+allocated while handling one request. The conversation is left out: only the HTTP,
+parsing and validation path is measured.
+
+Run from the project root:
+    python -m benchmarks.api [requests]
+"""
+import os
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from rest_framework import serializers, status  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from rest_framework.response import Response  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+from rest_framework.views import APIView  # noqa: E402
+
+from saccessco.serializers import ConversationIdSerializer  # noqa: E402
+from saccessco.utils import fastjson  # noqa: E402
+from saccessco.views import PageChangeAPIView  # noqa: E402
+
+ROW = ('<tr class="result"><td><a href="/flights/{i}" data-testid="flight-{i}">Départ {i}</a></td>'
+       '<td aria-label="Price">€{i}.00</td><td><button type="button">Select</button></td></tr>\n')
+
+
+def _page(size):
+    rows, i = [], 0
+    while sum(map(len, rows)) < size:
+        rows.append(ROW.format(i=i))
+        i += 1
+    return "<html><body><table>\n" + "".join(rows) + "</table></body></html>\n"
+
+
+class _BeforeSerializer(ConversationIdSerializer):
+    html = serializers.CharField()
+
+    def validate_html(self, value):
+        if not value or not value.strip():
+            raise serializers.ValidationError("Html content cannot be empty.")
+        return value
+
+
+class _BeforeView(APIView):
+    parser_classes = [JSONParser]
+    renderer_classes = [JSONRenderer]
+
+    def post(self, request, *args, **kwargs):
+        serializer = _BeforeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        conversation_id = serializer.data["conversation_id"]
+        page_change_html = serializer.validated_data['html']
+        assert conversation_id and page_change_html
+        return Response({"message": "Page change received successfully", "status": "success"},
+                        status=status.HTTP_200_OK)
+
+
+def _handle(view, factory, body):
+    request = factory.post("/saccessco/page_change/", body, content_type="application/json")
+    response = view(request)
+    response.render()
+    assert response.status_code == 200, response.content
+    return response
+
+
+def main():
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    html = _page(1024 * 1024)
+    body = fastjson.dumps_bytes({"conversation_id": "benchmark", "html": html})
+    print(f"{requests} requests, {len(body) / 1024 / 1024:.2f} MB bodies")
+    factory = APIRequestFactory()
+    with patch("saccessco.views.Conversation"):
+        for name, view in [("before", _BeforeView.as_view()), ("after", PageChangeAPIView.as_view())]:
+            _handle(view, factory, body)
+            started = time.perf_counter()
+            for _ in range(requests):
+                _handle(view, factory, body)
+            rate = requests / (time.perf_counter() - started)
+
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            _handle(view, factory, body)
+            peak = tracemalloc.get_traced_memory()[1] - baseline
+            tracemalloc.stop()
+            print(f"{name:7s} {rate:8.1f} requests/s  peak allocated per request {peak / 1024 / 1024:6.2f} MiB")
+
+
+if __name__ == "__main__":
+    main()
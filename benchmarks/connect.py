@@ -0,0 +1,91 @@
+"""
+Benchmark: connect-to-first-message latency on the AI WebSocket under connection churn,
+with the fixed 50ms sleep AiConsumer.connect used to do (before) and with the 'ready'
+frame (after). Each client connects, waits until it may rely on the group subscription,
+has a response sent to its conversation, receives it and disconnects; many clients do
+so concurrently. Runs in process on the in-memory channel layer.
+
+Run from the project root:
+    python -m benchmarks.connect [clients] [concurrency]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from channels.layers import get_channel_layer  # noqa: E402
+from channels.routing import URLRouter  # noqa: E402
+from channels.testing import WebsocketCommunicator  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from django.urls import re_path  # noqa: E402
+
+from saccessco.consumers import AiConsumer  # noqa: E402
+
+FRAME = '{"type":"ai_response","ai_response":{"speak":"Hello"}}'
+
+
+class SleepingAiConsumer(AiConsumer):
+    """
+    AiConsumer as it connected before: accept, then sleep 50ms, no ready frame.
+    """
+    async def connect(self):
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.group_name = f"{self.GROUP_NAME_PREFIX}{self.conversation_id}"
+        self.binary = False
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await asyncio.sleep(0.05)
+
+
+def _application(consumer):
+    return URLRouter([re_path(r'^ws/saccessco/ai/(?P<conversation_id>[^/]+)/$', consumer.as_asgi())])
+
+
+async def _client(application, index, wait_for_ready):
+    conversation_id = f"churn_{index}"
+    started = time.perf_counter()
+    communicator = WebsocketCommunicator(application, f"/ws/saccessco/ai/{conversation_id}/")
+    await communicator.connect()
+    if wait_for_ready:
+        await communicator.receive_from(timeout=5)
+    await get_channel_layer().group_send(f"{AiConsumer.GROUP_NAME_PREFIX}{conversation_id}",
+                                         {'type': 'ai_response', 'text': FRAME})
+    await communicator.receive_from(timeout=5)
+    elapsed = time.perf_counter() - started
+    await communicator.disconnect()
+    return elapsed
+
+
+async def _run(application, clients, concurrency, wait_for_ready):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _bounded(i):
+        async with semaphore:
+            return await _client(application, i, wait_for_ready)
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(_bounded(i) for i in range(clients)))
+    return sorted(latencies), time.perf_counter() - started
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    print(f"{clients} clients, {concurrency} connecting at a time")
+    with override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}}):
+        for name, consumer, wait_for_ready in [("sleep 50ms (before)", SleepingAiConsumer, False),
+                                               ("ready frame (after)", AiConsumer, True)]:
+            latencies, total = asyncio.run(_run(_application(consumer), clients, concurrency, wait_for_ready))
+            p50 = statistics.median(latencies) * 1e3
+            p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e3
+            print(f"{name:22s} p50 {p50:7.1f} ms  p99 {p99:7.1f} ms  {clients / total:8,.0f} connections/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Microbenchmark: AI responses parsed per second by the legacy regex extractor and by the
+single pass scanner, on a typical response and on long responses.
+
+Run from the project root:
+    python -m benchmarks.extract
+"""
+import json
+import re
+import timeit
+
+from saccessco.conversation.extract import extract_json_and_preamble
+
+
+def legacy_extract_json_and_preamble(raw: str):
+    """
+    The regex based extractor this module replaced, kept to measure the new one and
+    check it against (saccessco.tests.test_extract).
+    """
+    s = raw or ""
+    m = re.search(r"```json\s*([\s\S]*?)\s*```", s, flags=re.IGNORECASE)
+    if not m:
+        m = re.search(r"```\s*([\s\S]*?)\s*```", s)
+    if m:
+        json_str = m.group(1).strip()
+        pre = (s[:m.start()] + s[m.end():]).strip()
+    else:
+        lb = s.find("{"); rb = s.rfind("}")
+        if lb != -1 and rb != -1 and rb > lb:
+            json_str = s[lb:rb+1].strip()
+            pre = (s[:lb] + s[rb+1:]).strip()
+        else:
+            raise ValueError("No JSON block found")
+    return pre, json.loads(json_str)
+
+
+PLAN = {
+    "speak": "Setting the departure date to 22 October 2025.",
+    "execute": {
+        "plan": [
+            {"action": "click", "selector": "[data-testid='depart-btn']", "data": None},
+            {"action": "typeInto", "selector": "#destination", "data": "destination"},
+        ],
+        "parameters": {"destination": "Madrid"},
+    },
+}
+
+CASES = {
+    "typical fenced": "Sure.\n```json\n" + json.dumps(PLAN, indent=2) + "\n```",
+    "typical bare": "Sure. " + json.dumps(PLAN),
+    # A long chatty preamble before the block, as models produce after a page analysis
+    "long preamble": ("The page offers the following functions. " * 5000) + "```json\n" + json.dumps(PLAN) + "\n```",
+    # Whitespace runs inside the fence make the lazy [\s\S]*?\s*``` pattern backtrack
+    "long whitespace": "```json\n" + json.dumps(PLAN) + (" \n" * 20000) + "x```",
+}
+
+
+def main():
+    for case, response in CASES.items():
+        for name, fn in [("legacy", legacy_extract_json_and_preamble), ("scanner", extract_json_and_preamble)]:
+            def _run():
+                try:
+                    fn(response)
+                except ValueError:
+                    pass
+            timer = timeit.Timer(_run)
+            number, _ = timer.autorange()
+            best = min(timer.repeat(repeat=3, number=number)) / number
+            print(f"{case:16s} {name:8s} {1 / best:12,.0f} msg/s  ({best * 1e6:10.1f} us/msg)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Microbenchmark: bytes per AI WebSocket frame and encode/decode cost, for json.dumps text
+frames (before), orjson text frames and MessagePack binary frames, each with and without
+permessage-deflate (raw DEFLATE, as negotiated by the browser and the ASGI server).
+
+Run from the project root:
+    python -m benchmarks.frames
+"""
+import json
+import timeit
+import zlib
+
+import msgpack
+
+from saccessco.utils import fastjson
+
+_STEP = {"action": "typeInto", "selector": "[data-testid='search-input-destination']", "data": "destination"}
+
+FRAMES = {
+    "ai_response": {
+        "type": "ai_response",
+        "ai_response": {
+            "speak": "Setting the departure date to 22 October 2025.",
+            "execute": {"plan": [_STEP, {"action": "click", "selector": "#search", "data": None}],
+                        "parameters": {"destination": "Madrid"}},
+        },
+    },
+    "long plan": {
+        "type": "ai_response",
+        "ai_response": {"speak": "Filling in the form.",
+                        "execute": {"plan": [_STEP] * 60, "parameters": {"destination": "Madrid"}}},
+    },
+    "page_change": {
+        "type": "page_change",
+        "request_id": "1",
+        "html": "<html><body>" + "".join(
+            f'<div class="result" data-id="{i}"><a href="/flight/{i}" aria-label="Flight {i}">Madrid to Rome</a>'
+            f'<span class="price">{100 + i} EUR</span></div>' for i in range(2000)) + "</body></html>",
+    },
+}
+
+FORMATS = {
+    "json.dumps (before)": (lambda obj: json.dumps(obj).encode("utf-8"), lambda data: json.loads(data)),
+    "orjson": (fastjson.dumps_bytes, fastjson.loads),
+    "msgpack": (msgpack.packb, msgpack.unpackb),
+}
+
+
+def _deflate(data: bytes) -> bytes:
+    # permessage-deflate: raw DEFLATE per message
+    compressor = zlib.compressobj(wbits=-zlib.MAX_WBITS)
+    return compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def _per_call(fn) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def main():
+    for frame_name, frame in FRAMES.items():
+        print(f"\n{frame_name}")
+        print(f"  {'format':20s} {'bytes':>9s} {'deflated':>9s} {'encode us':>10s} {'decode us':>10s} {'deflate us':>11s}")
+        for format_name, (encode, decode) in FORMATS.items():
+            data = encode(frame)
+            deflated = _deflate(data)
+            print(f"  {format_name:20s} {len(data):9,d} {len(deflated):9,d} "
+                  f"{_per_call(lambda: encode(frame)) * 1e6:10.1f} {_per_call(lambda: decode(data)) * 1e6:10.1f} "
+                  f"{_per_call(lambda: _deflate(data)) * 1e6:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Benchmark: group_send-to-receive latency for a conversation group whose WebSocket consumer
+lives in this process, with the plain RedisChannelLayer (before) and the
+LocalFirstRedisChannelLayer (after), sending from the receiving event loop and, as
+Conversation does through async_to_sync, from another thread. The group is measured alone
+and with members whose consumers live in another process (a second layer instance with
+its own channel prefix), timing until every member has the message. Needs a Redis server.
+
+Run from the project root:
+    python -m benchmarks.layers [messages] [redis host] [redis port] [remote members]
+"""
+import asyncio
+import statistics
+import sys
+import threading
+import time
+
+from channels_redis.core import RedisChannelLayer
+
+from saccessco.layers import LocalFirstRedisChannelLayer
+
+GROUP = "WEB_SOCKET_GROUP_NAME_benchmark"
+MESSAGE = {"type": "ai_response", "text": '{"type":"ai_response","ai_response":{"speak":"Hello"}}'}
+
+
+class _SenderThread:
+    """Runs group_send calls on an event loop of its own, like async_to_sync does."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    async def group_send(self, layer, group, message):
+        await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(layer.group_send(group, message), self.loop))
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        # Closing the loop also closes the channel layer's connections made on it
+        self.loop.close()
+
+
+async def _run(layer, messages, sender, remote_layer, remote_members):
+    channel = await layer.new_channel()
+    await layer.group_add(GROUP, channel)
+    remote_channels = [await remote_layer.new_channel() for _ in range(remote_members)]
+    for remote_channel in remote_channels:
+        await remote_layer.group_add(GROUP, remote_channel)
+    latencies = []
+    try:
+        for _ in range(messages):
+            started = time.perf_counter()
+            if sender is None:
+                await layer.group_send(GROUP, MESSAGE)
+            else:
+                await sender.group_send(layer, GROUP, MESSAGE)
+            await asyncio.gather(layer.receive(channel),
+                                 *(remote_layer.receive(remote_channel) for remote_channel in remote_channels))
+            latencies.append(time.perf_counter() - started)
+    finally:
+        if sender is not None:
+            await asyncio.to_thread(sender.stop)
+        await layer.group_discard(GROUP, channel)
+        await layer.flush()
+        await layer.close_pools()
+        await remote_layer.close_pools()
+    return sorted(latencies)
+
+
+def main():
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    host = sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1"
+    port = int(sys.argv[3]) if len(sys.argv) > 3 else 6379
+    remote_members = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+    print(f"{messages} messages, Redis at {host}:{port}")
+    for members in [0, remote_members]:
+        print(f"{members} remote members")
+        for sender_name in ["same loop", "other thread"]:
+            for name, layer_class in [("RedisChannelLayer (before)", RedisChannelLayer),
+                                      ("LocalFirstRedisChannelLayer (after)", LocalFirstRedisChannelLayer)]:
+                layer = layer_class(hosts=[(host, port)])
+                remote_layer = RedisChannelLayer(hosts=[(host, port)])
+                sender = _SenderThread() if sender_name == "other thread" else None
+                latencies = asyncio.run(_run(layer, messages, sender, remote_layer, members))
+                p50 = statistics.median(latencies) * 1e6
+                p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e6
+                counts = ""
+                if isinstance(layer, LocalFirstRedisChannelLayer):
+                    counts = f"  local {layer.local_deliveries}, remote {layer.remote_deliveries}"
+                print(f"{sender_name:12s} {name:36s} p50 {p50:8.1f} us  p99 {p99:8.1f} us{counts}")
+
+
+if __name__ == "__main__":
+    main()
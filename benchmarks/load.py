@@ -0,0 +1,403 @@
+"""
+Load test: concurrent extension sessions against the whole stack, for sizing workers and Redis.
+
+Starts uvicorn on the project's ASGI application with the offline stub engine (see
+saccessco.ai.stub), or targets a running server with --url. Each session does what the
+extension does: it opens the ws/saccessco/ai/<id>/ socket, waits for its 'ready' frame, sends
+a page change every few prompts and prompts at a Poisson rate, one at a time, acknowledging
+responses with a receipt. Page changes are built from the project's templates, repeated up
+to the --page-kb sizes, and sent over the socket or POSTed to the REST API.
+
+Runs one step per --sessions count and reports, per step, the throughput and the
+prompt-to-response latency percentiles (the curves), the server's CPU and RSS and Redis'
+commands per second. A saturation report follows: the largest step still scaling (at least
+80% of the single session throughput per session) within the --slo-ms p99 latency.
+
+Needs the Redis server of the CHANNEL_LAYERS setting. Run from the project root:
+    python -m benchmarks.load [--sessions 1,5,10,25,50] [--rate 0.5] [--duration 30] [--workers 1]
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+import redis  # noqa: E402
+from django.conf import settings  # noqa: E402
+from websockets.asyncio.client import connect  # noqa: E402
+
+TEMPLATES = sorted((settings.BASE_DIR / "templates").glob("*.html"))
+PROMPTS = [
+    "Find flights from London to Lisbon next Friday",
+    "Select the cheapest result",
+    "Fill in my name and email",
+    "What is on this page?",
+    "Go back to the search form",
+]
+# A step scales while its throughput per session stays above this share of the first step's
+SCALING = 0.8
+
+
+def _pages(sizes_kb):
+    """
+    One page per size: the bodies of the templates, then copies of them in a <main> region up
+    to the size. The copies' forms become divs, so that, as on real pages, the size is in a few
+    large regions rather than in hundreds of forms (see saccessco.conversation.regions).
+    """
+    bodies = []
+    for template in TEMPLATES:
+        html = template.read_text(encoding="utf-8")
+        match = re.search(r"<body[^>]*>(.*)</body>", html, re.S | re.I)
+        bodies.append(match.group(1) if match else html)
+    bodies = [body for body in bodies if body.strip()]
+    copies = [re.sub(r"<(/?)form\b", r"<\1div", body, flags=re.I) for body in bodies]
+    pages = []
+    for size in sizes_kb:
+        sections, total, i = [], sum(map(len, bodies)), 0
+        while total < size * 1024:
+            section = f'<section id="section-{i}">{copies[i % len(copies)]}</section>\n'
+            sections.append(section)
+            total += len(section)
+            i += 1
+        pages.append("<html><head><title>Load test</title></head><body>\n" + "".join(bodies)
+                     + "<main>\n" + "".join(sections) + "</main></body></html>")
+    return pages
+
+
+class StepStats:
+
+    def __init__(self):
+        self.latencies = []
+        self.page_change_latencies = []
+        self.errors = 0
+        self.timeouts = 0
+
+
+class Session:
+
+    def __init__(self, conversation_id, args, pages, stats):
+        self.conversation_id = conversation_id
+        self.args = args
+        self.pages = pages
+        self.stats = stats
+        self.ready = asyncio.Event()
+        self.acks = {}
+        self.responses = asyncio.Queue()
+        self.socket = None
+
+    async def connect(self):
+        self.socket = await connect(f"{self.args.ws_url}/ws/saccessco/ai/{self.conversation_id}/", max_size=None)
+        self.reader = asyncio.ensure_future(self._read())
+        await asyncio.wait_for(self.ready.wait(), timeout=10)
+
+    async def _read(self):
+        async for text in self.socket:
+            frame = json.loads(text)
+            if frame.get("type") == "ready":
+                self.ready.set()
+            elif frame.get("type") == "ack":
+                future = self.acks.pop(frame.get("request_id"), None)
+                if future is not None and not future.done():
+                    future.set_result(frame)
+            elif frame.get("type") == "ai_response":
+                self.responses.put_nowait((time.perf_counter(), frame))
+
+    async def _request(self, message_type, **fields):
+        request_id = uuid.uuid4().hex
+        future = self.acks[request_id] = asyncio.get_running_loop().create_future()
+        await self.socket.send(json.dumps({"type": message_type, "request_id": request_id, **fields}))
+        ack = await asyncio.wait_for(future, timeout=self.args.timeout)
+        if ack["status_code"] != 200:
+            raise RuntimeError(f"{message_type} rejected: {ack['response']}")
+
+    async def run(self, start, deadline):
+        await start.wait()
+        prompts = 0
+        while True:
+            await asyncio.sleep(random.expovariate(self.args.rate))
+            if time.monotonic() >= deadline:
+                return
+            try:
+                if prompts % self.args.page_change_every == 0:
+                    await self._page_change()
+                await self._prompt(random.choice(PROMPTS))
+            except asyncio.TimeoutError:
+                self.stats.timeouts += 1
+            except Exception:
+                self.stats.errors += 1
+            prompts += 1
+
+    async def _page_change(self):
+        html = random.choice(self.pages)
+        sent = time.perf_counter()
+        if self.args.page_changes == "http":
+            body = json.dumps({"conversation_id": self.conversation_id, "html": html}).encode()
+            status = await _post(self.args.host, self.args.port, "/saccessco/page_change/", body)
+            if status != 200:
+                raise RuntimeError(f"page change POST returned {status}")
+        else:
+            await self._request("page_change", html=html)
+        self.stats.page_change_latencies.append(time.perf_counter() - sent)
+
+    async def _prompt(self, prompt):
+        # A response that came after its prompt timed out would be taken for this one's
+        while not self.responses.empty():
+            self.responses.get_nowait()
+        sent = time.perf_counter()
+        await self._request("user_prompt", prompt=prompt)
+        received, frame = await asyncio.wait_for(self.responses.get(), timeout=self.args.timeout)
+        self.stats.latencies.append(received - sent)
+        if frame.get("trace_id"):
+            await self.socket.send(json.dumps({"type": "receipt", "trace_id": frame["trace_id"], "seq": frame.get("seq")}))
+
+    async def close(self):
+        if self.socket is not None:
+            await self.socket.close()
+            self.reader.cancel()
+
+
+async def _post(host, port, path, body):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"POST {path} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                     f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def _processes(pid):
+    """
+    The server process and its workers.
+    """
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        children = []
+    return [pid] + [grandchild for child in children for grandchild in _processes(child)]
+
+
+def _server_usage(pid):
+    """
+    CPU seconds and RSS in MiB of the server process and its workers.
+    """
+    cpu, rss = 0.0, 0.0
+    for process in _processes(pid):
+        try:
+            with open(f"/proc/{process}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{process}/statm") as f:
+                pages = int(f.read().split()[1])
+        except OSError:
+            continue
+        cpu += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        rss += pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    return cpu, rss
+
+
+def _redis_client():
+    host = settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"][0]
+    if isinstance(host, dict):
+        return redis.Redis.from_url(host["address"])
+    if isinstance(host, str):
+        return redis.Redis.from_url(host)
+    return redis.Redis(host=host[0], port=host[1])
+
+
+def _redis_commands(client):
+    try:
+        return client.info("stats")["total_commands_processed"]
+    except redis.RedisError:
+        return None
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[max(math.ceil(fraction * len(values)) - 1, 0)] if values else float("nan")
+
+
+async def _step(step, sessions, args, pages, server_pid, redis_client):
+    stats = StepStats()
+    clients = [Session(f"load_{os.getpid()}_{step}_{i}", args, pages, stats) for i in range(sessions)]
+    try:
+        # Connected before the clock starts: the step measures requests, not connections
+        await asyncio.gather(*(client.connect() for client in clients))
+        start = asyncio.Event()
+        deadline = time.monotonic() + args.duration
+        runs = [asyncio.ensure_future(client.run(start, deadline)) for client in clients]
+        cpu_before = _server_usage(server_pid)[0] if server_pid else None
+        commands_before = _redis_commands(redis_client)
+        started = time.perf_counter()
+        start.set()
+        await asyncio.gather(*runs)
+        elapsed = time.perf_counter() - started
+    finally:
+        await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+
+    result = {
+        "sessions": sessions,
+        "prompts": len(stats.latencies),
+        "throughput": len(stats.latencies) / elapsed,
+        "p50_ms": _percentile(stats.latencies, 0.5) * 1e3,
+        "p90_ms": _percentile(stats.latencies, 0.9) * 1e3,
+        "p99_ms": _percentile(stats.latencies, 0.99) * 1e3,
+        "page_changes": len(stats.page_change_latencies),
+        "page_change_p99_ms": _percentile(stats.page_change_latencies, 0.99) * 1e3,
+        "errors": stats.errors,
+        "timeouts": stats.timeouts,
+    }
+    if server_pid:
+        cpu_after, rss = _server_usage(server_pid)
+        result["server_cpu_percent"] = (cpu_after - cpu_before) / elapsed * 100
+        result["server_rss_mib"] = rss
+    commands_after = _redis_commands(redis_client)
+    if commands_before is not None and commands_after is not None:
+        result["redis_commands_per_second"] = (commands_after - commands_before) / elapsed
+    return result
+
+
+def _saturation(results, slo_ms):
+    """
+    The largest step that still scales within the latency SLO, and where it stopped scaling.
+    """
+    base = results[0]["throughput"] / results[0]["sessions"] if results[0]["sessions"] else 0
+    for result in results:
+        result["scaling"] = result["throughput"] / (result["sessions"] * base) if base else float("nan")
+    healthy = [r for r in results
+               if r["scaling"] >= SCALING and r["p99_ms"] <= slo_ms and not r["errors"] and not r["timeouts"]]
+    capacity = healthy[-1] if healthy else None
+    # The first step past the capacity: a small step may miss the SLO on a handful of samples
+    after = results[results.index(capacity) + 1:] if capacity is not None else results
+    return {
+        "capacity": capacity,
+        "saturated_at": after[0]["sessions"] if after else None,
+        "max_throughput": max(r["throughput"] for r in results),
+    }
+
+
+def _report(results, saturation, args):
+    print(f"{'sessions':>8} {'prompts/s':>9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'scaling':>7} "
+          f"{'page p99':>8} {'err':>4} {'t/o':>4} {'cpu %':>6} {'rss MiB':>7} {'redis/s':>8}")
+    for r in results:
+        print(f"{r['sessions']:8d} {r['throughput']:9.2f} {r['p50_ms']:8.0f} {r['p90_ms']:8.0f} {r['p99_ms']:8.0f} "
+              f"{r['scaling']:7.2f} {r['page_change_p99_ms']:8.0f} {r['errors']:4d} {r['timeouts']:4d} "
+              f"{r.get('server_cpu_percent', float('nan')):6.0f} {r.get('server_rss_mib', float('nan')):7.0f} "
+              f"{r.get('redis_commands_per_second', float('nan')):8.0f}")
+
+    capacity = saturation["capacity"]
+    print(f"\nmax throughput {saturation['max_throughput']:.2f} prompts/s")
+    if capacity is None:
+        print(f"saturated from the first step: p99 over {args.slo_ms:.0f} ms or failed requests")
+        return
+    workers = f"{args.workers} worker{'s' if args.workers > 1 else ''}" if not args.url else "the server"
+    print(f"capacity of {workers}: {capacity['sessions']} sessions, {capacity['throughput']:.2f} prompts/s "
+          f"with p99 {capacity['p99_ms']:.0f} ms (SLO {args.slo_ms:.0f} ms)")
+    if "server_cpu_percent" in capacity:
+        print(f"  server CPU {capacity['server_cpu_percent']:.0f}% (100% = one core), "
+              f"RSS {capacity['server_rss_mib']:.0f} MiB")
+    if "redis_commands_per_second" in capacity:
+        print(f"  Redis {capacity['redis_commands_per_second']:.0f} commands/s, "
+              f"{capacity['redis_commands_per_second'] / max(capacity['throughput'], 1e-9):.1f} per prompt")
+    if saturation["saturated_at"] is not None:
+        print(f"saturated at {saturation['saturated_at']} sessions")
+    else:
+        print("not saturated: add larger --sessions steps")
+
+
+def _wait_for_port(host, port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server not listening on {host}:{port} after {timeout} s")
+
+
+def _arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", default="1,5,10,25,50",
+                        help="comma separated session counts, one step each")
+    parser.add_argument("--rate", type=float, default=0.5, help="prompts per second per session, Poisson")
+    parser.add_argument("--duration", type=float, default=30, help="seconds per step")
+    parser.add_argument("--page-kb", default="20,100,500", help="comma separated page change sizes in KiB")
+    parser.add_argument("--page-change-every", type=int, default=3, help="prompts per page change")
+    parser.add_argument("--page-changes", choices=["websocket", "http"], default="websocket",
+                        help="send page changes over the socket, as the extension does, or POST them")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds before a request counts as timed out")
+    parser.add_argument("--slo-ms", type=float, default=2000, help="p99 prompt-to-response latency target")
+    parser.add_argument("--stub-latency", type=float, default=0.5, help="seconds the stub engine takes per call")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--url", help="base URL of a running server (http://host:port) instead of starting one")
+    parser.add_argument("--json", help="also write the steps and the saturation report to this file")
+    args = parser.parse_args()
+    if args.url:
+        match = re.match(r"https?://([^:/]+)(?::(\d+))?", args.url)
+        args.host, args.port = match.group(1), int(match.group(2) or 80)
+    else:
+        args.host = "127.0.0.1"
+    args.ws_url = f"ws://{args.host}:{args.port}"
+    return args
+
+
+async def _run(args, server_pid):
+    pages = _pages([int(size) for size in args.page_kb.split(",")])
+    redis_client = _redis_client()
+    results = []
+    for step, sessions in enumerate(int(count) for count in args.sessions.split(",")):
+        result = await _step(step, sessions, args, pages, server_pid, redis_client)
+        results.append(result)
+        print(f"step {step}: {sessions} sessions, {result['throughput']:.2f} prompts/s, "
+              f"p99 {result['p99_ms']:.0f} ms", flush=True)
+    return results
+
+
+def main():
+    args = _arguments()
+    server = None
+    if not args.url:
+        env = dict(os.environ, SACCESSCO_AI_ENGINE="stub", SACCESSCO_STUB_LATENCY_SECONDS=str(args.stub_latency))
+        server = subprocess.Popen([sys.executable, "-m", "uvicorn", "saccessco.asgi:application",
+                                   "--port", str(args.port), "--workers", str(args.workers),
+                                   "--log-level", "warning", "--timeout-graceful-shutdown", "5"],
+                                  env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if server is not None:
+            _wait_for_port(args.host, args.port)
+        print(f"{args.sessions} sessions, {args.rate} prompts/s each, {args.duration:.0f} s per step, "
+              f"pages {args.page_kb} KiB over {args.page_changes}", flush=True)
+        results = asyncio.run(_run(args, server.pid if server is not None else None))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+    saturation = _saturation(results, args.slo_ms)
+    print()
+    _report(results, saturation, args)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"arguments": {k: v for k, v in vars(args).items()}, "steps": results,
+                       "saturation": saturation}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
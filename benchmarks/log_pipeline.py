@@ -0,0 +1,146 @@
+"""
+Benchmark: request latency with logging on, writing from the request thread (before) and
+from the listener threads of saccessco.logpipeline (after), with payloads logged in full or
+truncated and hashed. Logging off is the floor.
+
+User prompts are POSTed to UserPromptAPIView for a few conversations answered by the offline
+stub engine (see saccessco.ai.stub), so that conversation threads log their work meanwhile.
+Logs go to a temporary directory and the console handler to /dev/null. --stall-ms makes
+every file write that long, as a busy or network disk does. Requests are --interval-ms apart,
+so that the conversations keep up rather than pile up work competing for the interpreter. Reports the p50, p99 and max
+latency of the requests and the size of the log files, per configuration.
+
+Run from the project root:
+    python -m benchmarks.log_pipeline [--requests 2000] [--prompt-kb 4] [--interval-ms 5] [--stall-ms 0]
+"""
+import argparse
+import copy
+import logging
+import logging.config
+import os
+import random
+import tempfile
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+os.environ.setdefault("SACCESSCO_AI_ENGINE", "stub")
+os.environ.setdefault("SACCESSCO_STUB_LATENCY_SECONDS", "0")
+django.setup()
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+from django.conf import settings  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from saccessco import logpipeline  # noqa: E402
+from saccessco.conversation import Conversation  # noqa: E402
+from saccessco.tracing import percentile  # noqa: E402
+from saccessco.views import UserPromptAPIView  # noqa: E402
+
+CONFIGURATIONS = [
+    # (name, queued, payloads logged in full)
+    ("sync, full payloads", False, True),
+    ("sync, truncated payloads", False, False),
+    ("queue, full payloads", True, True),
+    ("queue, truncated payloads", True, False),
+    ("logging off", None, False),
+]
+
+
+class _Stall(logging.Filter):
+    """
+    Makes the file handler it filters for take seconds per record.
+    """
+
+    def __init__(self, seconds):
+        super().__init__()
+        self.seconds = seconds
+
+    def filter(self, record):
+        time.sleep(self.seconds)
+        return True
+
+
+def _logging_config(directory, stall):
+    config = copy.deepcopy(settings.LOGGING)
+    devnull = open(os.devnull, "w")
+    for handler in config["handlers"].values():
+        if "filename" in handler:
+            handler["filename"] = os.path.join(directory, os.path.basename(handler["filename"]))
+            if stall:
+                handler["filters"] = ["stall"]
+        else:
+            handler["stream"] = devnull
+    config["filters"] = {"stall": {"()": _Stall, "seconds": stall}}
+    return config
+
+
+def _configure(queued, config):
+    logpipeline.stop()
+    logging.disable(logging.NOTSET)
+    if queued is None:
+        logging.disable(logging.CRITICAL)
+    elif queued:
+        logpipeline.configure(config)
+    else:
+        logging.config.dictConfig(config)
+
+
+def _run(requests, conversations, prompt, interval, warmup=50):
+    factory = APIRequestFactory()
+    view = UserPromptAPIView.as_view()
+    latencies = []
+    for i in range(warmup + requests):
+        time.sleep(interval)
+        request = factory.post("/saccessco/user_prompt/", {"conversation_id": random.choice(conversations),
+                                                           "prompt": f"{i} {prompt}"}, format="json")
+        started = time.perf_counter()
+        view(request)
+        latencies.append(time.perf_counter() - started)
+    return sorted(latencies[warmup:])
+
+
+def _arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per configuration")
+    parser.add_argument("--conversations", type=int, default=10)
+    parser.add_argument("--prompt-kb", type=float, default=4, help="size of the prompts")
+    parser.add_argument("--interval-ms", type=float, default=5, help="time between requests")
+    parser.add_argument("--stall-ms", type=float, default=0, help="time each log file write takes")
+    return parser.parse_args()
+
+
+def main():
+    args = _arguments()
+    prompt = ("Find me a flight to Madrid leaving next Tuesday. " * int(args.prompt_kb * 1024 / 49 + 1))
+    prompt = prompt[:int(args.prompt_kb * 1024)]
+    random.seed(0)
+    print(f"{args.requests} user prompts of {args.prompt_kb:g}KB every {args.interval_ms:g} ms, "
+          f"{args.conversations} conversations, log file writes stalled {args.stall_ms:g} ms")
+    print(f"{'':28s} {'p50':>9s} {'p99':>9s} {'max':>9s} (ms) {'logged':>9s}")
+    with tempfile.TemporaryDirectory() as directory:
+        config = _logging_config(directory, args.stall_ms / 1000)
+        for name, queued, full in CONFIGURATIONS:
+            conversations = [f"logbench-{name}-{i}" for i in range(args.conversations)]
+            for conversation_id in conversations:
+                # Created beforehand and answering into memory: the requests time the logging, not these
+                Conversation(conversation_id=conversation_id).channel_layer = InMemoryChannelLayer()
+            with override_settings(SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE=1.0 if full else 0.0):
+                _configure(queued, config)
+                latencies = _run(args.requests, conversations, prompt, args.interval_ms / 1000)
+                for conversation_id in conversations:
+                    Conversation(conversation_id=conversation_id).shutdown()
+                logpipeline.stop()
+            logged = 0
+            for filename in os.listdir(directory):
+                logged += os.path.getsize(os.path.join(directory, filename))
+                os.remove(os.path.join(directory, filename))
+            print(f"{name:28s} {percentile(latencies, 0.5) * 1e3:9.3f} {percentile(latencies, 0.99) * 1e3:9.3f} "
+                  f"{latencies[-1] * 1e3:9.3f}      {logged / 1024 / 1024:7.1f}MB")
+        logging.disable(logging.CRITICAL)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: the cost of the metrics kept on the user prompt path. Times the updates one
+prompt makes (queue depth up and down, the group_send latency) against a user prompt
+through a Conversation whose engine and channel layer do nothing, then the time a
+/metrics scrape takes. Runs once in one process and once, in a child process, with
+PROMETHEUS_MULTIPROC_DIR set, where updates write to memory mapped files.
+
+Run from the project root:
+    python -m benchmarks.metrics [prompts]
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from unittest.mock import patch
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from saccessco import metrics  # noqa: E402
+from saccessco.conversation import Conversation  # noqa: E402
+
+
+def _updates():
+    # What Conversation.user_prompt does to the metrics, LLM call aside
+    metrics.EXECUTOR_QUEUE_DEPTH.inc()
+    metrics.EXECUTOR_QUEUE_DEPTH.dec()
+    metrics.CHANNEL_SEND_SECONDS.observe(0.001)
+
+
+def _per_call(function, calls):
+    started = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter() - started) / calls
+
+
+def measure(prompts):
+    mode = "multiprocess" if os.environ.get("PROMETHEUS_MULTIPROC_DIR") else "single process"
+    updates = _per_call(_updates, prompts * 10)
+
+    with patch("saccessco.conversation.AIEngine") as engine, patch("saccessco.conversation.async_to_sync"):
+        engine.return_value.respond.return_value = json.dumps({"speak": "Hello"})
+        Conversation._instances = {}
+        conversation = Conversation(conversation_id="benchmark_metrics")
+        conversation.user_prompt("Hello").result()
+        prompt = _per_call(lambda: conversation.user_prompt("Hello").result(), prompts)
+        conversation.shutdown()
+
+    metrics.exposition()
+    scrape = _per_call(metrics.exposition, 100)
+    print(f"{mode:15s} metric updates per prompt {updates * 1e6:6.2f} us, "
+          f"{updates / prompt * 100:5.2f}% of a user prompt ({prompt * 1e6:7.1f} us); "
+          f"scrape {scrape * 1e3:6.2f} ms")
+
+
+def main():
+    prompts = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        # The child process of the multiprocess run
+        measure(prompts)
+        return
+    print(f"{prompts} prompts")
+    measure(prompts)
+    with tempfile.TemporaryDirectory() as path:
+        # The mode is chosen when prometheus_client is imported, so in a new process
+        subprocess.run([sys.executable, "-m", "benchmarks.metrics", str(prompts)],
+                       env=dict(os.environ, PROMETHEUS_MULTIPROC_DIR=path), check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: the production settings (saccessco.settings.production, served by
+saccessco.asgi_production) against the development ones (saccessco.settings, saccessco.asgi).
+
+For each, reports the startup time and RSS of a worker (see benchmarks.startup), then starts
+uvicorn on its ASGI application with the offline stub engine and sends --concurrency
+requests at a time for --duration seconds to each of two API endpoints: GET /saccessco/usage/
+(a JSON response, with an operator token) and POST /saccessco/page_change/ (a small page to one conversation). Reports
+requests per second and the median and p99 latencies.
+
+Needs the Redis server of the CHANNEL_LAYERS setting. Run from the project root:
+    python -m benchmarks.production [--duration 10] [--concurrency 8]
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.startup import environ, run
+
+PROFILES = [
+    ("development", "saccessco.settings", "saccessco.asgi"),
+    ("production", "saccessco.settings.production", "saccessco.asgi_production"),
+]
+PAGE = ("<html><body><main><h1>Flights</h1><a href='/flights/1'>Flight 1</a><button>Select</button>"
+        "</main></body></html>")
+
+
+def _wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"The server did not listen on port {port} within {timeout} seconds")
+
+
+async def _load(url, method, body, concurrency, duration):
+    """
+    Latencies of the requests sent concurrency at a time for duration seconds.
+    """
+    latencies = []
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(limits=limits, headers={"Host": "localhost", "Authorization": "Bearer benchmark"}) as client:
+        async def _client():
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = await client.request(method, url, json=body)
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+
+        await asyncio.gather(*(_client() for _ in range(concurrency)))
+    return latencies
+
+
+def _throughput(name, settings_module, asgi, args):
+    env = environ("stub", settings_module, asgi)
+    env["SACCESSCO_STUB_LATENCY_SECONDS"] = "0"
+    # The production settings only serve /saccessco/usage/ with an operator token
+    env["SACCESSCO_OPS_TOKEN"] = "benchmark"
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", f"{asgi}:application", "--port", str(args.port),
+                               "--log-level", "warning"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_for_port(args.port)
+        base = f"http://127.0.0.1:{args.port}"
+        endpoints = [("GET /saccessco/usage/", "GET", f"{base}/saccessco/usage/?limit=1", None),
+                     ("POST /saccessco/page_change/", "POST", f"{base}/saccessco/page_change/",
+                      {"conversation_id": f"production-benchmark-{name}", "html": PAGE})]
+        for label, method, url, body in endpoints:
+            # Warm up, then measure
+            asyncio.run(_load(url, method, body, args.concurrency, 1))
+            latencies = sorted(asyncio.run(_load(url, method, body, args.concurrency, args.duration)))
+            print(f"  {label:30s}: {len(latencies) / args.duration:7.0f} req/s, "
+                  f"p50 {statistics.median(latencies) * 1e3:6.1f} ms, "
+                  f"p99 {latencies[int(len(latencies) * 0.99)] * 1e3:6.1f} ms")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--runs", type=int, default=5, help="worker startups measured per settings")
+    parser.add_argument("--port", type=int, default=8767)
+    args = parser.parse_args()
+
+    for name, settings_module, asgi in PROFILES:
+        runs = [run("stub", settings_module, asgi) for _ in range(args.runs)]
+        print(f"{name} ({settings_module}): worker ready in "
+              f"{statistics.median(result['ready_ms'] for result in runs):.0f} ms, "
+              f"RSS {statistics.median(result['ready_mb'] for result in runs):.1f} MB")
+        _throughput(name, settings_module, asgi, args)
+
+
+if __name__ == "__main__":
+    main()
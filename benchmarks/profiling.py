@@ -0,0 +1,107 @@
+"""
+Benchmark: the cost of the profiling hooks (saccessco.profiling) when no profile is wanted,
+and the slowdown of a profiled page change.
+
+Times the check every wrapped handler makes, then POSTs page changes of --page-kb to
+PageChangeAPIView and waits for the conversation to analyse them with the offline stub
+engine, without and with the X-Saccessco-Profile header. Profiles go to a temporary directory.
+
+Run from the project root:
+    python -m benchmarks.profiling [--requests 20] [--page-kb 500]
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+os.environ.setdefault("SACCESSCO_AI_ENGINE", "stub")
+os.environ.setdefault("SACCESSCO_STUB_LATENCY_SECONDS", "0")
+django.setup()
+
+from channels.layers import InMemoryChannelLayer  # noqa: E402
+from django.test import override_settings  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from saccessco import profiling  # noqa: E402
+from saccessco.conversation import Conversation  # noqa: E402
+from saccessco.conversation.fingerprint import get_template_cache  # noqa: E402
+from saccessco.views import PageChangeAPIView  # noqa: E402
+
+ROW = '<tr><td><a href="/flights/{i}">Flight {i}</a></td><td>€{i}.00</td><td><button>Select</button></td></tr>\n'
+
+
+def _page(size, variant):
+    rows, total, i = [], 0, 0
+    while total < size:
+        rows.append(ROW.format(i=i))
+        total += len(rows[-1])
+        i += 1
+    # A layout of its own, so that no analysis is reused from the template cache
+    return f'<html><body><main class="v{variant}"><table>\n' + "".join(rows) + "</table></main></body></html>\n"
+
+
+def _hook_cost(number=1_000_000):
+    """
+    Seconds per call of what a wrapped handler does when no profile is wanted.
+    """
+    def _check():
+        with profiling.profile("page_change", "conversation", profiling.wanted("conversation")):
+            pass
+
+    def _bare():
+        pass
+
+    check = min(timeit.repeat(_check, number=number, repeat=5)) / number
+    bare = min(timeit.repeat(_bare, number=number, repeat=5)) / number
+    return check - bare
+
+
+def _page_changes(requests, page_kb, profile):
+    factory = APIRequestFactory()
+    view = PageChangeAPIView.as_view()
+    headers = {"HTTP_X_SACCESSCO_PROFILE": "1"} if profile else {}
+    conversation_id = f"profiling-{'on' if profile else 'off'}"
+    conversation = Conversation(conversation_id=conversation_id)
+    conversation.channel_layer = InMemoryChannelLayer()
+    times = []
+    for i in range(requests):
+        get_template_cache().clear()
+        request = factory.post("/saccessco/page_change/", {"conversation_id": conversation_id,
+                                                           "html": _page(page_kb * 1024, i)},
+                               format="json", **headers)
+        started = time.perf_counter()
+        view(request)
+        # The analysis is queued after the request: wait for it
+        conversation.executor.submit(lambda: None).result()
+        times.append(time.perf_counter() - started)
+    conversation.shutdown()
+    Conversation._instances.pop(conversation_id, None)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--page-kb", type=int, default=500)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    print(f"profiling hooks, no profile wanted: {_hook_cost() * 1e9:.0f} ns per wrapped call")
+    with tempfile.TemporaryDirectory() as directory, override_settings(SACCESSCO_PROFILE_DIR=directory,
+                                                                           SACCESSCO_PROFILING=True):
+        for profile in (False, True):
+            times = _page_changes(args.requests, args.page_kb, profile)
+            print(f"{args.page_kb}KB page changes, {'profiled' if profile else 'not profiled':13s}: "
+                  f"median {statistics.median(times) * 1e3:7.1f} ms, max {max(times) * 1e3:7.1f} ms")
+        profiling.flush()
+        print(f"{len(os.listdir(directory)) // 2} profiles written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Replays conversation captures (see saccessco.capture) against an engine and compares the
+prompt-to-response latency with the recorded one.
+
+Record captures with SACCESSCO_CAPTURE=1 in the server's environment; they are written to
+SACCESSCO_CAPTURE_DIR. Several captures are replayed at once, each in a conversation of its
+own, keeping the offsets between their recorded starts. --engine cached answers with the
+recorded responses, after their recorded time unless --speed 0; stub, gemini and chtgpt
+call that engine. Responses go to an in-memory channel layer, or to the CHANNEL_LAYERS
+Redis with --redis.
+
+Run from the project root:
+    python -m benchmarks.replay CAPTURE... [--engine cached] [--speed 1] [--redis] [--json out.json]
+"""
+import argparse
+import json
+import logging
+import os
+import threading
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from channels.layers import get_channel_layer  # noqa: E402
+
+from saccessco.capture import read_capture  # noqa: E402
+from saccessco.capture.replayer import replay  # noqa: E402
+
+
+def _started_at(path):
+    return next((event["started_at"] for event in read_capture(path) if event["event"] == "start"), 0.0)
+
+
+def replay_all(paths, engine, speed, channel_layer=None):
+    """
+    The replay reports of the captures, replayed concurrently from their recorded starts.
+    """
+    starts = {path: _started_at(path) for path in paths}
+    first = min(starts.values())
+    reports = [None] * len(paths)
+
+    def _replay(index, path):
+        delay = (starts[path] - first) / speed if speed else 0.0
+        reports[index] = replay(path, engine=engine, speed=speed, channel_layer=channel_layer, delay=delay)
+
+    threads = [threading.Thread(target=_replay, args=(index, path)) for index, path in enumerate(paths)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return reports
+
+
+def _ms(seconds):
+    return "       -" if seconds is None else f"{seconds * 1e3:8.0f}"
+
+
+def _arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("captures", nargs="+", help="capture files (.jsonl.gz)")
+    parser.add_argument("--engine", default="cached", choices=["cached", "stub", "gemini", "chtgpt"])
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed: 2 for twice as fast, 0 for no waits")
+    parser.add_argument("--redis", action="store_true", help="send responses to the CHANNEL_LAYERS channel layer")
+    parser.add_argument("--json", help="write the reports to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep the application's logging")
+    return parser.parse_args()
+
+
+def main():
+    args = _arguments()
+    if not args.verbose:
+        logging.disable(logging.CRITICAL)
+    channel_layer = get_channel_layer() if args.redis else None
+    reports = replay_all(args.captures, args.engine, args.speed, channel_layer)
+
+    for report in reports:
+        summary = report["summary"]
+        print(f"\n{summary['capture']} ({summary['conversation_id']}): {summary['prompts']} prompts, "
+              f"{summary['page_changes']} page changes, engine {summary['engine']}, speed {summary['speed']:g}")
+        print(f"  {'t':>8s} {'recorded':>8s} {'replayed':>8s}  prompt (ms)")
+        for prompt in report["prompts"]:
+            print(f"  {prompt['t']:8.1f} {_ms(prompt['recorded_latency'])} {_ms(prompt.get('latency'))}  "
+                  f"{prompt['prompt'][:60]}")
+        print(f"  p50 {_ms(summary.get('recorded_latency_p50'))} -> {_ms(summary.get('latency_p50'))} ms, "
+              f"p99 {_ms(summary.get('recorded_latency_p99'))} -> {_ms(summary.get('latency_p99'))} ms")
+        if "cache_misses" in summary:
+            print(f"  cache hits {summary['cache_hits']}, misses {summary['cache_misses']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Load test: idle Server-Sent Events clients held by one server process. Starts uvicorn on the
+project's ASGI application, opens the clients (one conversation each) and reports the time
+until all of them got their 'ready' event, the server's threads and memory per client,
+whether every client got a heartbeat, and the latency of responses sent to some of them
+through the channel layer while all the others stay connected.
+
+Needs the Redis server of the CHANNEL_LAYERS setting, since responses reach the server
+process through it. Run from the project root:
+    python -m benchmarks.sse_idle [clients] [port]
+"""
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from channels.layers import get_channel_layer  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from saccessco.consumers import AiConsumer  # noqa: E402
+
+SAMPLED = 100
+BATCH = 500
+
+
+class Client:
+
+    def __init__(self, index):
+        self.conversation_id = f"sse_idle_{index}"
+        self.ready = asyncio.Event()
+        self.heartbeat = asyncio.Event()
+        self.response = asyncio.Event()
+        self.failed = False
+        self.closed = False
+        self.writer = None
+
+    async def run(self, port):
+        reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+        self.writer.write(f"GET /saccessco/events/{self.conversation_id}/?last_seq=0 HTTP/1.1\r\n"
+                          f"Host: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n".encode())
+        while True:
+            data = await reader.read(4096)
+            if not data:
+                self.closed = True
+                if not self.ready.is_set():
+                    # Refused or failed before its stream started
+                    self.failed = True
+                    self.ready.set()
+                return
+            if b"event: ready" in data:
+                self.ready.set()
+            if b": heartbeat" in data:
+                self.heartbeat.set()
+            if b"id: " in data:
+                self.response.set()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _server_status(pid):
+    status = {}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            status[key] = value.strip()
+    return int(status["Threads"]), int(status["VmRSS"].split()[0]) / 1024
+
+
+async def _run(clients, port, server_pid):
+    connected = [Client(i) for i in range(clients)]
+    tasks = []
+    try:
+        await _measure(connected, tasks, port, server_pid)
+    finally:
+        for client in connected:
+            client.close()
+        for task in tasks:
+            task.cancel()
+
+
+async def _measure(connected, tasks, port, server_pid):
+    clients = len(connected)
+    threads_before, rss_before = _server_status(server_pid)
+    started = time.perf_counter()
+    for i in range(0, clients, BATCH):
+        # In batches, each connected before the next: this process and the server share the CPU,
+        # and a burst of thousands of connections starves the server's event loop
+        batch = connected[i:i + BATCH]
+        tasks.extend(asyncio.ensure_future(client.run(port)) for client in batch)
+        await asyncio.wait_for(asyncio.gather(*(client.ready.wait() for client in batch)), timeout=60)
+    print(f"{clients} clients ready in {time.perf_counter() - started:.1f} s")
+    failed = [client for client in connected if client.failed]
+    if failed:
+        print(f"{len(failed)} clients failed to connect")
+        connected = [client for client in connected if not client.failed]
+    threads, rss = _server_status(server_pid)
+    print(f"server threads {threads_before} -> {threads}, RSS {rss_before:.0f} -> {rss:.0f} MiB "
+          f"({(rss - rss_before) * 1024 / clients:.1f} KiB per client)")
+
+    heartbeat = getattr(settings, "SACCESSCO_HEARTBEAT_SECONDS", 15)
+    try:
+        await asyncio.wait_for(asyncio.gather(*(client.heartbeat.wait() for client in connected)),
+                               timeout=heartbeat * 2 + 5)
+        print(f"every client got a heartbeat within {heartbeat * 2 + 5} s")
+    except asyncio.TimeoutError:
+        missing = sum(1 for client in connected if not client.heartbeat.is_set())
+        print(f"{missing} clients got no heartbeat within {heartbeat * 2 + 5} s")
+
+    layer = get_channel_layer()
+    latencies = []
+    for client in connected[::max(clients // SAMPLED, 1)][:SAMPLED]:
+        if client.closed:
+            continue
+        text = '{"type":"ai_response","seq":1,"ai_response":{"speak":"Hello"}}'
+        sent = time.perf_counter()
+        await layer.group_send(f"{AiConsumer.GROUP_NAME_PREFIX}{client.conversation_id}",
+                               {"type": "ai_response", "seq": 1, "text": text})
+        await asyncio.wait_for(client.response.wait(), timeout=10)
+        latencies.append(time.perf_counter() - sent)
+    latencies.sort()
+    print(f"response latency with {clients} idle clients: p50 {statistics.median(latencies) * 1e3:.1f} ms, "
+          f"max {latencies[-1] * 1e3:.1f} ms")
+    closed = sum(1 for client in connected if client.closed)
+    if closed:
+        print(f"{closed} streams closed by the server")
+
+
+def main():
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+    server = subprocess.Popen([sys.executable, "-m", "uvicorn", "saccessco.asgi:application", "--port", str(port),
+                               "--log-level", "warning", "--backlog", "4096",
+                               # Don't wait for streams left open by a failed run
+                               "--timeout-graceful-shutdown", "5"])
+    try:
+        time.sleep(3)
+        asyncio.run(_run(clients, port, server.pid))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: the startup time and RSS of a worker process, and the imports they go to.
+
+Starts --runs fresh interpreters that set up Django with --settings and import the ASGI
+application a worker serves (--asgi), then create a first conversation engine of --engine,
+and reports the median milliseconds and the peak RSS after each step. One more run under
+python -X importtime lists the --top slowest top-level imports, with their cumulative
+milliseconds.
+
+Run from the project root:
+    python -m benchmarks.startup [--engine stub] [--runs 5] [--top 12]
+    python -m benchmarks.startup --settings saccessco.settings.production --asgi saccessco.asgi_production
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Runs in the child: one JSON line of milliseconds and MB
+CHILD = """
+import importlib, json, os, resource, time
+started = time.perf_counter()
+import django
+django.setup()
+importlib.import_module(os.environ["BENCHMARK_ASGI"])
+ready = time.perf_counter()
+ready_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+from saccessco.ai import create_engine
+create_engine()
+engine = time.perf_counter()
+print(json.dumps({"ready_ms": (ready - started) * 1000, "ready_mb": ready_rss,
+                  "engine_ms": (engine - ready) * 1000,
+                  "engine_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+"""
+
+
+def environ(engine="stub", settings_module="saccessco.settings", asgi="saccessco.asgi"):
+    """
+    The environment of a worker process of these settings.
+    """
+    environ = dict(os.environ, SACCESSCO_AI_ENGINE=engine, PYTHONPATH=os.getcwd(),
+                   DJANGO_SETTINGS_MODULE=settings_module, BENCHMARK_ASGI=asgi)
+    # The engines only read their keys, no call is made; the production settings need a secret key
+    environ.setdefault("GEMINI_API_KEY", "benchmark")
+    environ.setdefault("OPENAI_API_KEY", "benchmark")
+    environ.setdefault("DJANGO_SECRET_KEY", "benchmark")
+    return environ
+
+
+def run(engine="stub", settings_module="saccessco.settings", asgi="saccessco.asgi") -> dict:
+    """
+    The milliseconds and MB of a worker process started with the settings, see CHILD.
+    """
+    output = subprocess.run([sys.executable, "-c", CHILD], env=environ(engine, settings_module, asgi),
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def _slowest_imports(args):
+    """
+    The top imports by cumulative time that no import slower than them includes.
+    """
+    stderr = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD],
+                            env=environ(args.engine, args.settings, args.asgi),
+                            capture_output=True, text=True, check=True).stderr
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # Only the imports done directly by the child (indented by one level at most)
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth <= 1:
+            imports.append((int(cumulative) / 1000, name.strip()))
+    return sorted(imports, reverse=True)[:args.top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--engine", default="stub", help="SACCESSCO_AI_ENGINE of the workers")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--settings", default="saccessco.settings", help="DJANGO_SETTINGS_MODULE of the workers")
+    parser.add_argument("--asgi", default="saccessco.asgi", help="module of the ASGI application")
+    args = parser.parse_args()
+
+    runs = [run(args.engine, args.settings, args.asgi) for _ in range(args.runs)]
+    for step in ("ready", "engine"):
+        label = "worker ready" if step == "ready" else f"first {args.engine} engine"
+        print(f"{label:22s}: median {statistics.median(result[f'{step}_ms'] for result in runs):7.1f} ms, "
+              f"RSS {statistics.median(result[f'{step}_mb'] for result in runs):6.1f} MB")
+    print(f"\nslowest imports (cumulative ms, -X importtime):")
+    for milliseconds, name in _slowest_imports(args):
+        print(f"  {milliseconds:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+"""
+Microbenchmark suite of the request hot paths, with a stable runner, JSON output and a
+comparison against a stored baseline that fails on regressions.
+
+Each benchmark is timed with timeit, garbage collection off: calibrated to run at least
+--min-time seconds per sample, then sampled --repeat times, in rounds of one sample of
+every benchmark. The best sample is kept, since noise only ever adds time; the median is
+reported too. Comparisons divide the best times by that of a fixed reference workload
+timed in the same rounds, so that the machine running faster or slower than when the
+baseline was stored (frequency scaling, busy neighbours) cancels out; --absolute
+compares seconds. Pin the runner to one CPU with --cpu for steadier numbers.
+
+Run from the project root:
+    python -m benchmarks.suite --save benchmarks/baseline.json      # store a baseline
+    python -m benchmarks.suite --compare benchmarks/baseline.json   # exit status 1 on regressions
+Other options: --filter substring, --threshold 0.10, --json results.json, --repeat, --min-time,
+--absolute.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import timeit
+
+import django
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "saccessco.settings")
+django.setup()
+
+from saccessco.ai.chtgpt import AIEngine as ChtgptAIEngine  # noqa: E402
+from saccessco.ai.gemini import AIEngine as GeminiAIEngine  # noqa: E402
+from saccessco.ai.instructions import SYSTEM_INSTRUCTIONS  # noqa: E402
+from saccessco.conversation import _parse_ai_response_merge_speak  # noqa: E402
+from saccessco.conversation.ai_response_tests.utils import parse_test_prompt  # noqa: E402
+from saccessco.conversation.extract import extract_json_and_preamble  # noqa: E402
+from saccessco.serializers import PageChangeSerializer, UserPromptSerializer  # noqa: E402
+from saccessco.validators import validate_ai_response  # noqa: E402
+
+PLAN = {
+    "speak": "Setting the departure date to 22 October 2025.",
+    "execute": {
+        "plan": [
+            {"action": "click", "selector": "[data-testid='depart-btn']", "data": None},
+            {"action": "click", "selector": "[aria-label*='October 22, 2025']", "data": None},
+            {"action": "typeInto", "selector": "#destination", "data": "destination"},
+            {"action": "enter", "selector": "#destination", "data": None},
+        ],
+        "parameters": {"destination": "Madrid"},
+    },
+}
+ROW = ('<tr class="result"><td><a href="/flights/{i}" data-testid="flight-{i}">Départ {i}</a></td>'
+       '<td aria-label="Price">€{i}.00</td><td><button type="button">Select</button></td></tr>\n')
+KB = 1024
+PAYLOAD_SIZES = {"10KB": 10 * KB, "100KB": 100 * KB, "1MB": 1024 * KB, "5MB": 5 * 1024 * KB}
+HISTORY_TURNS = [20, 200]
+
+BENCHMARKS = {}
+# Timed with the others; comparisons are relative to it unless --absolute
+REFERENCE = "reference"
+
+
+def benchmark(name):
+    """
+    Registers a setup function: called once, it returns the function to time.
+    """
+    def register(setup):
+        BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+def _page(size):
+    rows, total, i = [], 0, 0
+    while total < size:
+        row = ROW.format(i=i)
+        rows.append(row)
+        total += len(row)
+        i += 1
+    return "<html><body><table>\n" + "".join(rows) + "</table></body></html>\n"
+
+
+def _history(turns):
+    """
+    A Gemini style chat history: the instructions, then prompts and responses, with a
+    20KB page change every fifth turn.
+    """
+    history = [{"role": "model", "parts": [{"text": SYSTEM_INSTRUCTIONS}]}]
+    page = _page(20 * KB)
+    for turn in range(turns):
+        if turn % 5 == 0:
+            history.append({"role": "user", "parts": [{"text": f"PAGE CHANGE\n{page}"}]})
+            history.append({"role": "model", "parts": [{"text": "The page lists flights with their prices."}]})
+        history.append({"role": "user", "parts": [{"text": f"Select flight {turn}"}]})
+        history.append({"role": "model", "parts": [{"text": json.dumps(PLAN)}]})
+    return history
+
+
+RESPONSES = {
+    "bare": json.dumps(PLAN),
+    "fenced": "Sure, I'll do that.\n```json\n" + json.dumps(PLAN, indent=2) + "\n```",
+    "long_preamble": ("The page offers the following functions. " * 500) + "```json\n" + json.dumps(PLAN) + "\n```",
+}
+
+for _case, _response in RESPONSES.items():
+    benchmark(f"extract_json_and_preamble/{_case}")(lambda response=_response: lambda: extract_json_and_preamble(response))
+    benchmark(f"parse_ai_response_merge_speak/{_case}")(
+        # It normalises the object in place: give it a fresh string each time, as the engine does
+        lambda response=_response: lambda: _parse_ai_response_merge_speak(response))
+
+
+@benchmark("parse_test_prompt/kwargs")
+def _parse_test_prompt():
+    prompt = 'Test select date no wait {"date": "2025-10-22", "selector": "[data-testid=\'depart-btn\']"}'
+    return lambda: parse_test_prompt(prompt)
+
+
+@benchmark("validate_ai_response/plan")
+def _validate_ai_response():
+    message = {"type": "ai_response", "ai_response": PLAN, "trace_id": "0" * 32}
+    return lambda: validate_ai_response(message)
+
+
+@benchmark("validate_ai_response/invalid")
+def _validate_invalid_ai_response():
+    message = {"type": "ai_response", "ai_response": {"speak": "Hello", "execute": {"plan": [{"action": "explode"}]}}}
+    return lambda: validate_ai_response(message)
+
+
+for _label, _size in PAYLOAD_SIZES.items():
+    def _page_change_serializer(size=_size):
+        data = {"conversation_id": "benchmark", "html": _page(size)}
+
+        def _run():
+            serializer = PageChangeSerializer(data=data)
+            assert serializer.is_valid(), serializer.errors
+        return _run
+
+    def _user_prompt_serializer(size=_size):
+        data = {"conversation_id": "benchmark", "prompt": ("Find me a flight to Madrid. " * (size // 28 + 1))[:size]}
+
+        def _run():
+            serializer = UserPromptSerializer(data=data)
+            assert serializer.is_valid(), serializer.errors
+        return _run
+
+    benchmark(f"PageChangeSerializer/{_label}")(_page_change_serializer)
+    benchmark(f"UserPromptSerializer/{_label}")(_user_prompt_serializer)
+
+
+for _turns in HISTORY_TURNS:
+    def _get_chat_history(turns=_turns):
+        # Not constructed: __init__ would create an API client
+        engine = GeminiAIEngine.__new__(GeminiAIEngine)
+        engine._chat_history = _history(turns)
+        return engine.get_chat_history
+
+    def _to_openai_messages(turns=_turns):
+        engine = ChtgptAIEngine.__new__(ChtgptAIEngine)
+        engine._initial_instructions = SYSTEM_INSTRUCTIONS
+        engine._chat_history = _history(turns)
+        return engine._to_openai_messages
+
+    benchmark(f"get_chat_history/{_turns}_turns")(_get_chat_history)
+    benchmark(f"to_openai_messages/{_turns}_turns")(_to_openai_messages)
+
+
+@benchmark(REFERENCE)
+def _reference():
+    # Fixed work of the same kind as the benchmarks: its time follows the machine's speed
+    text = json.dumps(PLAN)
+
+    def _run():
+        for _ in range(20):
+            plan = json.loads(text)["execute"]["plan"]
+            "".join(sorted(str(value) for step in plan for value in step.values()))
+    return _run
+
+
+def _calibrate(timer, min_time):
+    """
+    Calls per sample for samples of at least min_time seconds.
+    """
+    number, elapsed = timer.autorange()
+    if elapsed < min_time:
+        number = max(int(number * min_time / max(elapsed, 1e-9)), 1)
+    return number
+
+
+def run(functions, repeat, min_time):
+    """
+    Seconds per call of every function: the best and median of repeat samples, and the best
+    relative to the reference's. The samples are taken in rounds, one of each function per
+    round, so that a slow spell of the machine slows them all down alike.
+    """
+    timers = {}
+    for name, function in functions.items():
+        function()  # Warm up caches, lazily compiled regexes and validators
+        timer = timeit.Timer(function)
+        timers[name] = (timer, _calibrate(timer, min_time))
+    samples = {name: [] for name in timers}
+    for _ in range(repeat):
+        for name, (timer, number) in timers.items():
+            samples[name].append(timer.timeit(number) / number)
+    reference = min(samples[REFERENCE])
+    return {name: {"best": min(times), "median": statistics.median(times), "relative": min(times) / reference,
+                   "number": timers[name][1], "repeat": repeat}
+            for name, times in samples.items()}
+
+
+def compare(results, baseline, threshold, key="relative"):
+    """
+    The benchmarks whose time (key: "relative" to the reference, or "best" in seconds) is more
+    than threshold (a fraction) above the baseline's: [(name, baseline, result, change)].
+    Benchmarks missing from either side are skipped.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None or name == REFERENCE:
+            continue
+        change = result[key] / before[key] - 1
+        if change > threshold:
+            regressions.append((name, before["best"], result["best"], change))
+    return regressions
+
+
+def _format(seconds):
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:9.2f} us"
+    return f"{seconds * 1e3:9.2f} ms"
+
+
+def _arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--filter", help="only the benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=15, help="samples per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.05, help="seconds per sample, at least")
+    parser.add_argument("--cpu", type=int, help="pin the process to this CPU")
+    parser.add_argument("--json", help="write the results to this file")
+    parser.add_argument("--save", help="write the results as a baseline to this file")
+    parser.add_argument("--compare", help="compare with this baseline, exit status 1 on regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="slowdown over the baseline counted as a regression, as a fraction")
+    parser.add_argument("--absolute", action="store_true",
+                        help="compare seconds rather than times relative to the reference workload")
+    return parser.parse_args()
+
+
+def main():
+    args = _arguments()
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+    # The code is measured, not the log handlers: invalid responses log an error per call
+    logging.disable(logging.CRITICAL)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    functions = {name: setup() for name, setup in BENCHMARKS.items()
+                 if name == REFERENCE or not args.filter or args.filter in name}
+    results = run(functions, args.repeat, args.min_time)
+    key = "best" if args.absolute else "relative"
+    for name, result in results.items():
+        line = f"{name:42s} {_format(result['best'])}  median {_format(result['median'])}"
+        if name in baseline and name != REFERENCE:
+            line += f"  {result[key] / baseline[name][key] - 1:+7.1%}"
+        print(line)
+
+    report = {"python": sys.version.split()[0], "platform": platform.platform(),
+              "machine": platform.machine(), "results": results}
+    for path in filter(None, [args.json, args.save]):
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold, key)
+        if regressions:
+            print(f"\n{len(regressions)} regressions over {args.threshold:.0%}:")
+            for name, before, after, change in regressions:
+                print(f"  {name}: {_format(before)} -> {_format(after)} ({change:+.1%})")
+            sys.exit(1)
+        print(f"\nno regressions over {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Microbenchmark: AI response messages validated per second, before and after
+precompiling the schema validator and adding the fast path.
+
+Run from the project root:
+    python -m benchmarks.validators
+"""
+import timeit
+
+from jsonschema import validate
+
+from saccessco.validators import ai_response_schema, ai_response_validator, validate_ai_response
+
+MESSAGE = {
+    "type": "ai_response",
+    "ai_response": {
+        "execute": {
+            "plan": [
+                {"action": "click", "selector": "[data-testid='depart-btn']", "data": None},
+                {"action": "click", "selector": "[aria-label*='October 22, 2025']", "data": None},
+                {"action": "typeInto", "selector": "#destination", "data": "destination"},
+                {"action": "enter", "selector": "#destination", "data": None},
+            ],
+            "parameters": {"destination": "Madrid"},
+        },
+        "speak": "Setting the departure date to 22 October 2025.",
+    },
+}
+
+
+def _before():
+    # What validate_ai_response did per message before: meta-schema check and a new validator
+    validate(instance=MESSAGE, schema=ai_response_schema)
+
+
+def _precompiled():
+    ai_response_validator.is_valid(MESSAGE)
+
+
+def _after():
+    validate_ai_response(MESSAGE)
+
+
+def main():
+    for name, fn in [("jsonschema.validate (before)", _before),
+                     ("precompiled Draft7Validator", _precompiled),
+                     ("validate_ai_response (after)", _after)]:
+        timer = timeit.Timer(fn)
+        number, _ = timer.autorange()
+        best = min(timer.repeat(repeat=5, number=number)) / number
+        print(f"{name:32s} {1 / best:12,.0f} msg/s  ({best * 1e6:8.1f} us/msg)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# saccessco/accounting.py
+"""
+Token and cost accounting of the LLM calls, with budgets.
+
+Every engine call reports its usage (prompt tokens, the cached part of them, completion
+tokens) and duration to its conversation's engine.on_usage, which adds them to the ledger
+here, per conversation, model, site domain and day. Costs come from SACCESSCO_MODEL_PRICES.
+A conversation past SACCESSCO_CONVERSATION_BUDGET_USD, or any once the day's calls are past
+SACCESSCO_DAILY_BUDGET_USD, goes on degraded rather than stopped: with the cheaper model of
+SACCESSCO_BUDGET_FALLBACK_MODELS and its history compacted before each call.
+
+The ledger is per process: with several worker processes, /saccessco/usage/ and the daily
+budget cover the worker that serves them.
+"""
+import datetime
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+from django.conf import settings
+
+from saccessco.tracing import conversation_ref
+
+SORT_KEYS = ("cost", "tokens", "seconds", "calls")
+
+
+def site_domain(url: Optional[str]) -> Optional[str]:
+    """
+    The host name of a page URL or an Origin header, or None.
+    """
+    if not url:
+        return None
+    host = urlsplit(url if "//" in url else f"//{url}").hostname
+    return host or None
+
+
+def price(model: Optional[str]) -> Dict[str, float]:
+    """
+    USD per million "prompt", "cached" and "completion" tokens of the model: its
+    SACCESSCO_MODEL_PRICES entry, or that of the longest model name it starts with (dated
+    versions), else the "default" entry.
+    """
+    prices = getattr(settings, "SACCESSCO_MODEL_PRICES", {})
+    model = model or ""
+    matches = [name for name in prices if name != "default" and model.startswith(name)]
+    return prices[max(matches, key=len)] if matches else prices.get("default", {})
+
+
+def cost(model: Optional[str], usage: Optional[dict]) -> float:
+    """
+    The USD cost of an engine call's usage. Cached tokens are part of the prompt tokens.
+    """
+    if not usage:
+        return 0.0
+    rates = price(model)
+    cached = usage.get("cached_tokens") or 0
+    prompt = (usage.get("prompt_tokens") or 0) - cached
+    return (prompt * rates.get("prompt", 0.0) + cached * rates.get("cached", rates.get("prompt", 0.0))
+            + (usage.get("completion_tokens") or 0) * rates.get("completion", 0.0)) / 1_000_000
+
+
+def cheaper_model(model: Optional[str]) -> Optional[str]:
+    """
+    The model a conversation over budget switches to, or None.
+    """
+    return getattr(settings, "SACCESSCO_BUDGET_FALLBACK_MODELS", {}).get(model)
+
+
+class Totals:
+    """
+    The calls, tokens, cost and LLM seconds of some group of calls.
+    """
+    __slots__ = ("calls", "prompt_tokens", "cached_tokens", "completion_tokens", "cost", "seconds")
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.seconds = 0.0
+
+    def add(self, usage: Optional[dict], call_cost: float, seconds: float):
+        usage = usage or {}
+        self.calls += 1
+        self.prompt_tokens += usage.get("prompt_tokens") or 0
+        self.cached_tokens += usage.get("cached_tokens") or 0
+        self.completion_tokens += usage.get("completion_tokens") or 0
+        self.cost += call_cost
+        self.seconds += seconds or 0.0
+
+    @property
+    def tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> dict:
+        return {"calls": self.calls, "prompt_tokens": self.prompt_tokens, "cached_tokens": self.cached_tokens,
+                "completion_tokens": self.completion_tokens, "tokens": self.tokens,
+                "cost_usd": round(self.cost, 6), "seconds": round(self.seconds, 3)}
+
+
+class ConversationUsage(Totals):
+    __slots__ = ("conversation_id", "domain", "models", "degraded", "last_call")
+
+    def __init__(self, conversation_id: str):
+        super().__init__()
+        self.conversation_id = conversation_id
+        self.domain: Optional[str] = None
+        self.models: Dict[str, int] = {}
+        self.degraded: Optional[str] = None  # "conversation" or "day": the budget it went over
+        self.last_call: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        # Not the ID, which is all a client needs to read the conversation's responses
+        return {"conversation": conversation_ref(self.conversation_id), "domain": self.domain, "models": dict(self.models),
+                "degraded": self.degraded, "last_call": self.last_call, **super().to_dict()}
+
+
+class UsageLedger:
+    """
+    Usage per conversation (the last max_conversations to make a call), model, site domain
+    and day (the last max_days, UTC). Thread safe.
+    """
+
+    def __init__(self, max_conversations: int = 1000, max_days: int = 7):
+        self.max_conversations = max_conversations
+        self.max_days = max_days
+        self.total = Totals()
+        self._conversations: "OrderedDict[str, ConversationUsage]" = OrderedDict()
+        self._models: Dict[str, Totals] = {}
+        self._domains: Dict[str, Totals] = {}
+        self._days: "OrderedDict[str, Totals]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _conversation(self, conversation_id: str) -> ConversationUsage:
+        # Called with the lock held
+        entry = self._conversations.get(conversation_id)
+        if entry is None:
+            entry = self._conversations[conversation_id] = ConversationUsage(conversation_id)
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+        else:
+            self._conversations.move_to_end(conversation_id)
+        return entry
+
+    def record(self, conversation_id: str, model: Optional[str], usage: Optional[dict], seconds: float = 0.0,
+               now: Optional[datetime.datetime] = None) -> float:
+        """
+        Adds an engine call, and returns its cost.
+        """
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        call_cost = cost(model, usage)
+        model = model or "unknown"
+        with self._lock:
+            entry = self._conversation(conversation_id)
+            entry.add(usage, call_cost, seconds)
+            entry.models[model] = entry.models.get(model, 0) + 1
+            entry.last_call = now.timestamp()
+            self.total.add(usage, call_cost, seconds)
+            self._models.setdefault(model, Totals()).add(usage, call_cost, seconds)
+            self._domains.setdefault(entry.domain or "unknown", Totals()).add(usage, call_cost, seconds)
+            day = now.date().isoformat()
+            if day not in self._days:
+                self._days[day] = Totals()
+                while len(self._days) > self.max_days:
+                    self._days.popitem(last=False)
+            self._days[day].add(usage, call_cost, seconds)
+        return call_cost
+
+    def set_domain(self, conversation_id: str, domain: Optional[str]):
+        """
+        The site the conversation is on: its next calls count for that domain.
+        """
+        if domain:
+            with self._lock:
+                self._conversation(conversation_id).domain = domain
+
+    def get(self, conversation_id: str) -> Optional[ConversationUsage]:
+        return self._conversations.get(conversation_id)
+
+    def day(self, now: Optional[datetime.datetime] = None) -> Totals:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return self._days.get(now.date().isoformat()) or Totals()
+
+    def over_budget(self, conversation_id: str, now: Optional[datetime.datetime] = None) -> Optional[str]:
+        """
+        "conversation" when the conversation has spent its budget, "day" when the day's calls
+        have spent the daily budget, else None.
+        """
+        conversation_budget = getattr(settings, "SACCESSCO_CONVERSATION_BUDGET_USD", None)
+        daily_budget = getattr(settings, "SACCESSCO_DAILY_BUDGET_USD", None)
+        entry = self._conversations.get(conversation_id)
+        if conversation_budget is not None and entry is not None and entry.cost >= conversation_budget:
+            return "conversation"
+        if daily_budget is not None and self.day(now).cost >= daily_budget:
+            return "day"
+        return None
+
+    def mark_degraded(self, conversation_id: str, budget: str):
+        with self._lock:
+            self._conversation(conversation_id).degraded = budget
+
+    def report(self, sort: str = "cost", limit: int = 100, domain: Optional[str] = None) -> dict:
+        """
+        The aggregates, and the top limit conversations by sort (one of SORT_KEYS),
+        of the domain if given.
+        """
+        with self._lock:
+            conversations: List[ConversationUsage] = [
+                entry for entry in self._conversations.values() if domain is None or entry.domain == domain]
+            conversations.sort(key=lambda entry: getattr(entry, sort), reverse=True)
+            return {
+                "total": self.total.to_dict(),
+                "today": self.day().to_dict(),
+                "by_day": {day: totals.to_dict() for day, totals in self._days.items()},
+                "by_model": {model: totals.to_dict() for model, totals in self._models.items()},
+                "by_domain": {name: totals.to_dict() for name, totals in self._domains.items()},
+                "conversations": [entry.to_dict() for entry in conversations[:limit]],
+            }
+
+    def clear(self):
+        with self._lock:
+            self.total = Totals()
+            self._conversations.clear()
+            self._models.clear()
+            self._domains.clear()
+            self._days.clear()
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+
+
+def get_ledger() -> UsageLedger:
+    global _ledger
+    with _ledger_lock:
+        if _ledger is None:
+            _ledger = UsageLedger(getattr(settings, "SACCESSCO_USAGE_CONVERSATIONS", 1000))
+        return _ledger
@@ -1,7 +1,63 @@
-from typing import Dict, Any
+"""
+The LLM engines, by name: SACCESSCO_AI_ENGINES maps each name to the dotted path of its
+class, and SACCESSCO_AI_ENGINE names the one conversations use. An engine's module, and so
+its provider's SDK (google.genai, openai), is only imported when the engine is first used,
+so that a process loads the SDK it runs with and no other.
+"""
+import threading
+from typing import Dict, Any, Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# The engines of the settings without any: "stub" is the offline one, see stub.py
+DEFAULT_ENGINES = {
+    "gemini": "saccessco.ai.gemini.AIEngine",
+    "chtgpt": "saccessco.ai.chtgpt.AIEngine",
+    "stub": "saccessco.ai.stub.AIEngine",
+}
+# The former module attributes, now imported on first access
+_LAZY_CLASSES = {"GeminiAIEngine": "gemini", "ChtgptAIEngine": "chtgpt", "StubAIEngine": "stub"}
+
+_classes: Dict[str, type] = {}
+_classes_lock = threading.Lock()
+
+
+def engine_names():
+    return list(getattr(settings, "SACCESSCO_AI_ENGINES", DEFAULT_ENGINES))
+
+
+def engine_class(name: Optional[str] = None) -> type:
+    """
+    The class of the engine named name, by default SACCESSCO_AI_ENGINE, importing its
+    module the first time.
+    """
+    name = name or getattr(settings, "SACCESSCO_AI_ENGINE", "gemini")
+    engines = getattr(settings, "SACCESSCO_AI_ENGINES", DEFAULT_ENGINES)
+    if name not in engines:
+        raise ValueError(f"Unknown engine {name!r}, expected one of {', '.join(engines)}")
+    path = engines[name]
+    cls = _classes.get(path)
+    if cls is None:
+        with _classes_lock:
+            cls = _classes.get(path)
+            if cls is None:
+                cls = _classes[path] = import_string(path)
+    return cls
+
+
+def create_engine(name: Optional[str] = None, **kwargs):
+    """
+    A new engine named name, by default SACCESSCO_AI_ENGINE. kwargs go to its class.
+    """
+    return engine_class(name)(**kwargs)
+
+
+def __getattr__(name):
+    if name in _LAZY_CLASSES:
+        return import_string(DEFAULT_ENGINES[_LAZY_CLASSES[name]])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from .gemini import AIEngine as GeminiAIEngine
-from .chtgpt import AIEngine as ChtgptAIEngine
 # ---- Roles (kept identical for drop-in compatibility) ----
 class Role:
     def __init__(self, name: str):
@@ -6,8 +6,11 @@ import logging
 from typing import List, Dict, Any, Optional
 
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import APIError, BadRequestError, OpenAI, RateLimitError
 # keep your existing imports
+from saccessco import metrics, tracing
+from saccessco.logpipeline import payload
+from saccessco.ai import history
 from saccessco.ai.instructions import SYSTEM_INSTRUCTIONS
 from saccessco.utils.singleton import Singleton  # optional, leave commented if you don't need it
 
@@ -45,6 +48,19 @@ class Message:
         return {"role": self.role, "parts": [{"text": self.content}]}
 
 
+def _usage(response) -> Optional[Dict[str, int]]:
+    """
+    The token counts of a completion or of the last chunk of a stream, or None.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None or not isinstance(getattr(usage, "prompt_tokens", None), int):
+        return None
+    # The prompt tokens read from OpenAI's prompt cache, part of prompt_tokens
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {"prompt_tokens": usage.prompt_tokens, "cached_tokens": getattr(details, "cached_tokens", None) or 0,
+            "completion_tokens": usage.completion_tokens or 0}
+
+
 # @Singleton  # Uncomment if you really want a singleton
 class AIEngine:
     """
@@ -65,6 +81,8 @@ class AIEngine:
     def __init__(self, initial_instructions: str = SYSTEM_INSTRUCTIONS):
         self._initial_instructions: str = initial_instructions or ""
         self._chat_history: List[Dict[str, Any]] = []
+        self.last_usage: Optional[Dict[str, int]] = None  # Tokens of the last respond(), see _usage
+        self.on_usage = None  # Called with (model, usage, seconds) after every call, see saccessco.accounting
 
         # OpenAI client / config
         self.model_name: str = os.getenv("OPENAI_API_MODEL", "gpt-4o")
@@ -76,7 +94,7 @@ class AIEngine:
         # Construct client; it will pick up OPENAI_API_KEY from env
         self.client = OpenAI()
 
-        print(f"Using OPENAI_API_KEY set: {bool(os.getenv('OPENAI_API_KEY'))}, model: {self.model_name}")
+        logger.info("OpenAI engine: OPENAI_API_KEY set: %s, model: %s", bool(os.getenv('OPENAI_API_KEY')), self.model_name)
 
         # For strict compatibility with your Gemini engine, we add the initial instructions
         # as a "Model" message to history (but we will *map it* to OpenAI 'system' at call time).
@@ -103,7 +121,7 @@ class AIEngine:
         self._chat_history = []
         if self._initial_instructions:
             self.add_message_to_history(Model, self._initial_instructions)
-        print("Chat session reset.")
+        logger.info("Chat session reset.")
 
     # ---------- public: respond ----------
     def respond(self, role: Role, prompt: str) -> str:
@@ -111,15 +129,27 @@ class AIEngine:
         Sends the prompt and returns assistant text. Maintains chat history.
         """
         # 1) Record user's turn in your Gemini-style history
-        self.add_message_to_history(role, prompt)
-
         # 2) Convert history to OpenAI Chat messages
-        messages = self._to_openai_messages()
+        with tracing.span("history"):
+            self.add_message_to_history(role, prompt)
+            messages = self._to_openai_messages()
 
-        # 3) Call OpenAI with retries
+        # 3) Call OpenAI with retries. Streamed, so traces tell the time to the first token from the total.
         try:
-            resp = self._call_openai(messages)
-            text = (resp.choices[0].message.content or "").strip()
+            self.last_usage = None
+            with tracing.span("llm", engine="chtgpt", model=self.model_name) as llm, \
+                    metrics.llm_call("chtgpt", self.model_name) as call:
+                parts: List[str] = []
+                for chunk in self._call_openai(messages, stream=True):
+                    # The last chunk has no choices, only the usage (stream_options include_usage)
+                    self.last_usage = _usage(chunk) or self.last_usage
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if content:
+                        if not parts and llm is not None:
+                            tracing.record_span("llm.first_token", llm.start_ns)
+                        parts.append(content)
+            text = "".join(parts).strip()
+            self._record_usage(self.last_usage, call.seconds)
         except Exception as e:
             logger.exception("Error communicating with OpenAI: %s", e)
             # On failure, mirror your Gemini engine behavior: remove the last user turn
@@ -131,9 +161,36 @@ class AIEngine:
         if text:
             self.add_message_to_history(Model, text)
 
-        logger.info("AI Response: %s", text)
+        logger.info("AI Response: %s", payload(text))
         return text
 
+    def respond_once(self, role: Role, prompt: str) -> str:
+        """
+        Sends a single prompt with the system instructions only. The chat history is
+        neither sent nor updated, so calls can run concurrently. Errors are raised.
+        """
+        messages: List[Dict[str, str]] = []
+        if self._initial_instructions:
+            messages.append({"role": "system", "content": self._initial_instructions})
+        messages.append({"role": "user", "content": prompt})
+        with metrics.llm_call("chtgpt", self.model_name) as call:
+            resp = self._call_openai(messages)
+        self._record_usage(_usage(resp), call.seconds)
+        return (resp.choices[0].message.content or "").strip()
+
+    def compact_history(self, keep_messages: int) -> int:
+        """
+        Cuts the history down to the instructions, the last page change and the last
+        keep_messages messages, see history.compact. Returns the number of messages dropped.
+        """
+        self._chat_history, dropped = history.compact(self._chat_history, keep_messages, self._initial_instructions)
+        return dropped
+
+    def _record_usage(self, usage, seconds: float):
+        metrics.record_usage("chtgpt", self.model_name, usage)
+        if self.on_usage is not None:
+            self.on_usage(self.model_name, usage, seconds)
+
     # ---------- internals ----------
     def _to_openai_messages(self) -> List[Dict[str, str]]:
         """
@@ -173,9 +230,9 @@ class AIEngine:
 
         return msgs
 
-    def _call_openai(self, messages: List[Dict[str, str]], max_retries: int = 3):
+    def _call_openai(self, messages: List[Dict[str, str]], max_retries: int = 3, stream: bool = False):
         """
-        Basic retry loop for transient errors.
+        Basic retry loop for transient errors. With stream=True, returns the stream of chunks.
         """
         attempt = 0
         last_exc: Optional[Exception] = None
@@ -190,6 +247,9 @@ class AIEngine:
                 if self.max_tokens is not None:
                     # New SDKs support max_output_tokens for responses.*; for chat.completions it's max_tokens
                     kwargs["max_tokens"] = self.max_tokens
+                if stream:
+                    kwargs["stream"] = True
+                    kwargs["stream_options"] = {"include_usage": True}
 
                 return self.client.chat.completions.create(**kwargs)
             except (RateLimitError, APIError) as e:
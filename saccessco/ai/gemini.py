@@ -7,6 +7,9 @@ from typing import List, Dict, Any
 import logging
 
 # Assuming saccessco.ai.instructions and saccessco.utils.singleton exist
+from saccessco import metrics, tracing
+from saccessco.logpipeline import payload
+from saccessco.ai import history
 from saccessco.ai.instructions import SYSTEM_INSTRUCTIONS
 from saccessco.utils.singleton import Singleton  # Keep your Singleton if you need it
 
@@ -41,6 +44,19 @@ class Message:
         return {"role": self.role, "parts": [{"text": self.content}]}
 
 
+def _usage(response):
+    """
+    The token counts of a response or stream chunk, as {"prompt_tokens": n, "cached_tokens": c,
+    "completion_tokens": m}, or None. The cached tokens, read from the context cache, are part of the prompt's.
+    """
+    metadata = getattr(response, "usage_metadata", None)
+    if metadata is None or not isinstance(getattr(metadata, "prompt_token_count", None), int):
+        return None
+    return {"prompt_tokens": metadata.prompt_token_count,
+            "cached_tokens": getattr(metadata, "cached_content_token_count", None) or 0,
+            "completion_tokens": metadata.candidates_token_count or 0}
+
+
 # @Singleton # Uncomment this decorator if you intend for AIEngine to be a singleton
 class AIEngine:
     """
@@ -49,12 +65,15 @@ class AIEngine:
     """
 
     def __init__(self, initial_instructions: str = SYSTEM_INSTRUCTIONS):
-
-        print(f"Using api_key: {os.getenv('GEMINI_API_KEY')}, model: {os.getenv('GEMINI_API_MODEL')}")
-
+        # Whether the key is set, never the key itself
+        logger.info("Gemini engine: GEMINI_API_KEY set: %s, model: %s", bool(os.getenv('GEMINI_API_KEY')),
+                    os.getenv('GEMINI_API_MODEL'))
         self.client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
         self.model_name = os.getenv('GEMINI_API_MODEL')
+        self._initial_instructions = initial_instructions
         self._chat_history: List[Dict[str, Any]] = []
+        self.last_usage = None  # Tokens of the last respond(), see _usage
+        self.on_usage = None  # Called with (model, usage, seconds) after every call, see saccessco.accounting
 
         if initial_instructions:
             self.add_message_to_history(Model, initial_instructions)
@@ -78,28 +97,71 @@ class AIEngine:
         Manually manages the chat history for the continuous conversation.
         """
         # Add user's message to history before sending
-        self.add_message_to_history(role, prompt)
+        with tracing.span("history"):
+            self.add_message_to_history(role, prompt)
 
         try:
-            # Send the entire accumulated history with the current prompt
-            response = self.client.models.generate_content(
-                model=self.model_name,
-                contents=self._chat_history
-            )
-
-            ai_response_text = response.text
-
-            logger.info(f"AI Response: {ai_response_text}")
+            # Send the entire accumulated history with the current prompt. Streamed, so traces
+            # tell the time to the first token from the total.
+            self.last_usage = None
+            with tracing.span("llm", engine="gemini", model=self.model_name) as llm, \
+                    metrics.llm_call("gemini", self.model_name) as call:
+                chunks = []
+                for chunk in self.client.models.generate_content_stream(
+                    model=self.model_name,
+                    contents=self._chat_history
+                ):
+                    if not chunks and llm is not None:
+                        tracing.record_span("llm.first_token", llm.start_ns)
+                    chunks.append(chunk.text or "")
+                    # Each chunk carries the totals so far
+                    self.last_usage = _usage(chunk) or self.last_usage
+            self._record_usage(self.last_usage, call.seconds)
+
+            ai_response_text = "".join(chunks)
+
+            logger.info("AI Response: %s", payload(ai_response_text))
 
             return ai_response_text
         except Exception as e:
-            print(f"Error communicating with Gemini: {e}")
+            logger.exception("Error communicating with Gemini: %s", e)
             # If an error occurs, remove the last user message from history
             # to avoid sending an incomplete turn in the next request.
             if self._chat_history and self._chat_history[-1]["role"] == User.name:
                 self._chat_history.pop()
             return f"Error: Could not get a response from the AI. {e}"
 
+    def respond_once(self, role: Role, prompt: str) -> str:
+        """
+        Sends a single prompt preceded only by the initial instructions.
+        The chat history is neither sent nor updated, so calls can run concurrently.
+        Errors are raised to the caller.
+        """
+        contents = []
+        if self._initial_instructions:
+            contents.append({"role": Model.name, "parts": [{"text": self._initial_instructions}]})
+        contents.append({"role": role.name, "parts": [{"text": prompt}]})
+        with metrics.llm_call("gemini", self.model_name) as call:
+            response = self.client.models.generate_content(
+                model=self.model_name,
+                contents=contents
+            )
+        self._record_usage(_usage(response), call.seconds)
+        return response.text
+
+    def _record_usage(self, usage, seconds: float):
+        metrics.record_usage("gemini", self.model_name, usage)
+        if self.on_usage is not None:
+            self.on_usage(self.model_name, usage, seconds)
+
+    def compact_history(self, keep_messages: int) -> int:
+        """
+        Cuts the history down to the instructions, the last page change and the last
+        keep_messages messages, see history.compact. Returns the number of messages dropped.
+        """
+        self._chat_history, dropped = history.compact(self._chat_history, keep_messages, self._initial_instructions)
+        return dropped
+
     def reset_chat(self):
         """
         Resets the current chat session, clearing its history.
@@ -108,5 +170,5 @@ class AIEngine:
         self._chat_history = []
         if self._initial_instructions:
             self.add_message_to_history(Model, self._initial_instructions)
-        print("Chat session reset.")
+        logger.info("Chat session reset.")
 
@@ -0,0 +1,37 @@
+"""
+Chat history helpers shared by the engines, whose histories all have the Gemini layout:
+[{"role": "user" or "model", "parts": [{"text": ...}]}, ...], the initial instructions first.
+"""
+from typing import Any, Dict, List, Tuple
+
+PAGE_CHANGE = "PAGE CHANGE"
+
+
+def _text(entry: Dict[str, Any]) -> str:
+    parts = entry.get("parts") or []
+    return parts[0].get("text") or "" if parts and isinstance(parts[0], dict) else ""
+
+
+def compact(history: List[Dict[str, Any]], keep_messages: int,
+            initial_instructions: str = "") -> Tuple[List[Dict[str, Any]], int]:
+    """
+    The history cut down to the initial instructions, the last page change and its analysis,
+    and the last keep_messages messages from a user message on, and the number of messages
+    dropped. Every call then sends that much less; the model loses the older turns only.
+    """
+    head = history[:1] if history and initial_instructions and _text(history[0]) == initial_instructions else []
+    rest = history[len(head):]
+    tail = rest[-keep_messages:] if keep_messages > 0 else []
+    while tail and tail[0].get("role") != "user":
+        tail = tail[1:]
+
+    page = []
+    for index in range(len(rest) - 1, -1, -1):
+        if rest[index].get("role") == "user" and _text(rest[index]).startswith(PAGE_CHANGE):
+            page = rest[index:index + 2]
+            break
+    if page and any(entry is page[0] for entry in tail):
+        page = []
+
+    compacted = head + page + tail
+    return compacted, len(history) - len(compacted)
@@ -1,5 +1,12 @@
 ACTIONS = ["typeInto", "click", "focusElement", "scrollTo", "checkCheckbox", "checkRadioButton",
-                             "selectOptionByValue", "selectOptionByIndex", "submitForm", "enter"]
+                             "selectOptionByValue", "selectOptionByIndex", "submitForm", "enter", "waitForElement"]
+# Actions that only bring an element into a usable state. page_manipulator.js already waits for
+# every step's element and scrolls it into view before running the step.
+PREPARATORY_ACTIONS = {"scrollTo", "waitForElement"}
+# Actions that have no further effect when repeated with the same selector and data.
+# click, enter and submitForm are not: two clicks may toggle twice or add two passengers.
+IDEMPOTENT_ACTIONS = {"typeInto", "focusElement", "scrollTo", "waitForElement", "checkCheckbox", "checkRadioButton",
+                      "selectOptionByValue", "selectOptionByIndex"}
 DOM_ELEMENT_ACTIONS = """
 Available DOM Element Actions:
 
@@ -0,0 +1,125 @@
+"""
+Offline stand-in for the LLM engines, for load tests and benchmarks. It makes no network
+call: it waits as long as a model would take and answers with a short page analysis or an
+empty plan. Its interface is that of gemini.AIEngine, so it is selected with
+SACCESSCO_AI_ENGINE = "stub".
+"""
+import copy
+import json
+import random
+import time
+from typing import Any, Dict, List, Tuple
+
+from django.conf import settings
+
+from saccessco import metrics, tracing
+from saccessco.ai import history
+from saccessco.ai.instructions import SYSTEM_INSTRUCTIONS
+
+
+class Role:
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def cap_name(self):
+        return self.name.upper()
+
+
+User = Role("user")
+Model = Role("model")
+ROLES = {"User": User, "Model": Model}
+
+
+def _tokens(text: str) -> int:
+    # About four characters per token, as the providers count English and HTML
+    return len(text) // 4 + 1
+
+
+class AIEngine:
+    """
+    Answers after SACCESSCO_STUB_LATENCY_SECONDS plus SACCESSCO_STUB_SECONDS_PER_1K_TOKENS
+    for every thousand tokens sent, give or take SACCESSCO_STUB_JITTER (a fraction).
+    The first token comes after the time to read the input, the rest stream in the remaining time.
+    """
+    # Label of its traces and metrics
+    PROVIDER = "stub"
+
+    def __init__(self, initial_instructions: str = SYSTEM_INSTRUCTIONS):
+        self.model_name = "stub"
+        self.latency = getattr(settings, "SACCESSCO_STUB_LATENCY_SECONDS", 0.5)
+        self.seconds_per_1k_tokens = getattr(settings, "SACCESSCO_STUB_SECONDS_PER_1K_TOKENS", 0.0)
+        self.jitter = getattr(settings, "SACCESSCO_STUB_JITTER", 0.2)
+        self.last_usage = None
+        self.on_usage = None  # Called with (model, usage, seconds) after every call, see saccessco.accounting
+        self._initial_instructions = initial_instructions
+        self._chat_history: List[Dict[str, Any]] = []
+
+        if initial_instructions:
+            self.add_message_to_history(Model, initial_instructions)
+
+    def add_message_to_history(self, role: Role, content: str):
+        self._chat_history.append({"role": role.name, "parts": [{"text": content}]})
+
+    def get_chat_history(self) -> List[Dict[str, Any]]:
+        return copy.deepcopy(self._chat_history)
+
+    def respond(self, role: Role, prompt: str) -> str:
+        """
+        Answers the prompt as if the whole history had been sent.
+        """
+        with tracing.span("history"):
+            self.add_message_to_history(role, prompt)
+        prompt_tokens = sum(_tokens(entry["parts"][0]["text"]) for entry in self._chat_history)
+        text, seconds = self._generate(prompt, prompt_tokens)
+        self.last_usage = {"prompt_tokens": prompt_tokens, "cached_tokens": 0, "completion_tokens": _tokens(text)}
+        self._record_usage(self.last_usage, seconds)
+        return text
+
+    def respond_once(self, role: Role, prompt: str) -> str:
+        """
+        Answers the prompt as if only the initial instructions preceded it.
+        """
+        prompt_tokens = _tokens(self._initial_instructions or "") + _tokens(prompt)
+        text, seconds = self._generate(prompt, prompt_tokens)
+        self._record_usage({"prompt_tokens": prompt_tokens, "cached_tokens": 0, "completion_tokens": _tokens(text)},
+                           seconds)
+        return text
+
+    def reset_chat(self):
+        self._chat_history = []
+        if self._initial_instructions:
+            self.add_message_to_history(Model, self._initial_instructions)
+
+    def compact_history(self, keep_messages: int) -> int:
+        self._chat_history, dropped = history.compact(self._chat_history, keep_messages, self._initial_instructions)
+        return dropped
+
+    def _record_usage(self, usage, seconds: float):
+        metrics.record_usage(self.PROVIDER, self.model_name, usage)
+        if self.on_usage is not None:
+            self.on_usage(self.model_name, usage, seconds)
+
+    def _generate(self, prompt: str, prompt_tokens: int) -> Tuple[str, float]:
+        text, duration = self._answer(prompt, prompt_tokens)
+        with tracing.span("llm", engine=self.PROVIDER, model=self.model_name) as llm, \
+                metrics.llm_call(self.PROVIDER, self.model_name) as call:
+            # Reading the input takes most of the time of a real call, see the llm.first_token spans
+            time.sleep(duration * 0.8)
+            if llm is not None:
+                tracing.record_span("llm.first_token", llm.start_ns)
+            time.sleep(duration * 0.2)
+        return text, call.seconds
+
+    def _answer(self, prompt: str, prompt_tokens: int) -> Tuple[str, float]:
+        """
+        The response to the prompt, and the seconds it takes.
+        """
+        duration = (self.latency + self.seconds_per_1k_tokens * prompt_tokens / 1000) \
+            * random.uniform(1 - self.jitter, 1 + self.jitter)
+        if prompt.startswith("PAGE CHANGE"):
+            return "PAGE ANALYSIS\nA page with a search form and a list of results.", duration
+        return json.dumps({
+            "speak": f"Stub response to: {prompt[:80]}",
+            "execute": {"plan": [], "parameters": {}},
+        }), duration
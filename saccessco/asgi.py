@@ -7,6 +7,7 @@ import logging
 # Removed AuthMiddlewareStack import for this minimal test
 from channels.routing import ProtocolTypeRouter, URLRouter
 from django.core.asgi import get_asgi_application
+from django.urls import re_path
 
 # Import your routing configuration
 # IMPORTANT: Replace 'your_project_name' with the actual name of your Django project
@@ -25,8 +26,11 @@ logger = logging.getLogger("saccessco")
 
 # Define the main ASGI application
 application = ProtocolTypeRouter({
-    # Handle standard HTTP requests using the Django WSGI application
-    "http": django_asgi_app,
+    # Handle standard HTTP requests using the Django WSGI application, except the HTTP
+    # deliveries of AI responses, which are long-lived and served by Channels consumers
+    "http": URLRouter(
+        saccessco.routing.http_urlpatterns + [re_path(r"", django_asgi_app)]
+    ),
 
     # Handle WebSocket requests
     "websocket": URLRouter( # Directly use URLRouter without any middleware for testing
@@ -40,5 +44,5 @@ application = ProtocolTypeRouter({
 # Print the loaded WebSocket URL patterns to the console when asgi.py is loaded
 logger.info("\n--- Loaded WebSocket URL Patterns ---")
 for pattern in saccessco.routing.websocket_urlpatterns:
-    print(f"  Pattern: {pattern.pattern.regex.pattern}")
+    logger.info(f"  Pattern: {pattern.pattern.regex.pattern}")
 logger.info("-------------------------------------\n")
@@ -0,0 +1,25 @@
+"""
+ASGI entry point of the production workers, with saccessco.settings.production by default:
+
+    uvicorn saccessco.asgi_production:application --workers 4
+
+The routes of saccessco.asgi, set up in order (Django first, then the consumers that import
+its models and settings) and without its debugging output.
+"""
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'saccessco.settings.production')
+
+from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+from django.core.asgi import get_asgi_application  # noqa: E402
+from django.urls import re_path  # noqa: E402
+
+django_asgi_app = get_asgi_application()
+
+from saccessco import routing  # noqa: E402
+
+application = ProtocolTypeRouter({
+    # Django serves the REST API, Channels the long-lived HTTP response streams ahead of it
+    "http": URLRouter(routing.http_urlpatterns + [re_path(r"", django_asgi_app)]),
+    "websocket": URLRouter(routing.websocket_urlpatterns),
+})
@@ -0,0 +1,5 @@
+"""
+Conversation captures: the recorder (see saccessco.capture.recorder), an engine answering with
+the recorded responses (saccessco.capture.cached) and the replayer (saccessco.capture.replayer).
+"""
+from .recorder import Recorder, RecordingEngine, open_recorder, prompt_hash, read_capture
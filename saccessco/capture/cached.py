@@ -0,0 +1,39 @@
+"""
+An engine answering with the responses recorded in a capture, for deterministic replays.
+"""
+from collections import deque
+from typing import Dict, Iterable, Tuple
+
+from saccessco.ai.stub import AIEngine as StubAIEngine
+from saccessco.capture.recorder import prompt_hash
+
+
+class CachedAIEngine(StubAIEngine):
+    """
+    Answers a prompt with the response recorded for the same prompt, after the time it took
+    divided by speed (0 for no wait). Prompts recorded several times get their responses in
+    order, the last one again once they run out. Prompts never recorded, which a change to
+    the prompts makes, get an error response as from a failed call, and are counted in misses.
+    """
+    PROVIDER = "cached"
+
+    def __init__(self, events: Iterable[dict], speed: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.model_name = "cached"
+        self.speed = speed
+        self.hits = 0
+        self.misses = 0
+        self._responses: Dict[str, deque] = {}
+        for event in events:
+            if event.get("event") == "llm":
+                self._responses.setdefault(event["prompt_hash"], deque()).append(
+                    (event["response"], event["duration"]))
+
+    def _answer(self, prompt: str, prompt_tokens: int) -> Tuple[str, float]:
+        responses = self._responses.get(prompt_hash(prompt))
+        if not responses:
+            self.misses += 1
+            return "Error: Could not get a response from the AI. No response was recorded for this prompt.", 0.0
+        self.hits += 1
+        response, duration = responses.popleft() if len(responses) > 1 else responses[0]
+        return response, duration / self.speed if self.speed else 0.0
@@ -0,0 +1,181 @@
+"""
+Opt-in recording of conversations, to replay them offline (see saccessco.capture.replayer).
+
+With SACCESSCO_CAPTURE on, every conversation writes its traffic to a gzip compressed JSONL
+file in SACCESSCO_CAPTURE_DIR, one event per line. "t" is the time of the event in seconds
+since the capture started:
+
+    {"event": "start", "t": 0, "conversation_id": ..., "started_at": <unix time>}
+    {"event": "page_change", "t": ..., "html": ..., "url": ...}   when the page change arrived
+    {"event": "user_prompt", "t": ..., "prompt": ...}        when the prompt arrived
+    {"event": "llm", "t": ..., "method": "respond" or "respond_once", "prompt_hash": ...,
+     "prompt_chars": ..., "response": ..., "duration": <seconds>}      an engine call, from its start
+    {"event": "ai_response", "t": ..., "prompt_t": ..., "seq": ..., "ai_response": ...}
+                                                             a response sent, with its prompt's t
+
+Engine calls keep a hash of their prompt rather than the prompt, which holds the page HTML
+already recorded with its page change. Events are written by the thread they happen on, so
+the file is in the order they were written rather than by "t".
+
+Only the SACCESSCO_CAPTURE_OPEN_FILES most recently written captures are kept open: the
+least recently written one is closed when another one is opened, and appended to (as a
+new gzip member, which gzip readers read on) at its next event.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+from django.conf import settings
+
+from saccessco.utils import fastjson
+
+logger = logging.getLogger("saccessco")
+
+# The recorders with an open file, least recently written first
+_open: "OrderedDict[int, Recorder]" = OrderedDict()
+_open_lock = threading.Lock()
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class Recorder:
+    """
+    Writes the events of one conversation. Thread safe.
+    """
+
+    def __init__(self, path: Path, conversation_id: str):
+        self.path = Path(path)
+        self._file = None
+        self._mode = "wt"
+        self._closed = False
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self.record("start", 0.0, conversation_id=conversation_id, started_at=time.time())
+
+    def now(self) -> float:
+        return time.monotonic() - self._started
+
+    def record(self, event: str, t: Optional[float] = None, **fields):
+        # Times of other events ("prompt_t") are rounded alike, to match their "t"
+        fields = {name: round(value, 6) if name.endswith("_t") and value is not None else value
+                  for name, value in fields.items()}
+        line = fastjson.dumps({"event": event, "t": round(self.now() if t is None else t, 6), **fields})
+        with self._lock:
+            if self._closed:
+                return
+            opened = self._file is None
+            if opened:
+                self._file = gzip.open(self.path, self._mode, encoding="utf-8")
+                self._mode = "at"
+            self._file.write(line + "\n")
+            # A sync flush per event costs some compression, but a worker that is killed keeps its capture
+            self._file.flush()
+        # Outside this recorder's lock, as closing another takes the other's lock
+        for recorder in _track(self, opened):
+            recorder._suspend()
+
+    def is_open(self) -> bool:
+        return self._file is not None
+
+    def _suspend(self):
+        """
+        Closes the file until the next event.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        self._suspend()
+        with _open_lock:
+            _open.pop(id(self), None)
+
+
+def _track(recorder: Recorder, opened: bool) -> List[Recorder]:
+    """
+    Marks the recorder as the most recently written. Returns the recorders to close for it.
+    """
+    limit = max(getattr(settings, "SACCESSCO_CAPTURE_OPEN_FILES", 64), 1)
+    with _open_lock:
+        if opened and not recorder._closed:
+            _open[id(recorder)] = recorder
+        elif id(recorder) in _open:
+            _open.move_to_end(id(recorder))
+        evicted = []
+        while len(_open) > limit:
+            evicted.append(_open.popitem(last=False)[1])
+    return evicted
+
+
+class RecordingEngine:
+    """
+    Wraps a conversation's engine to record its calls. Everything else goes to the engine.
+    """
+
+    def __init__(self, engine, recorder: Recorder):
+        self.engine = engine
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def __setattr__(self, name, value):
+        # Settings such as model_name are the engine's
+        if name in ("engine", "recorder"):
+            super().__setattr__(name, value)
+        else:
+            setattr(self.engine, name, value)
+
+    def _call(self, method: str, role, prompt: str) -> str:
+        started = self.recorder.now()
+        response = getattr(self.engine, method)(role, prompt)
+        self.recorder.record("llm", started, method=method, prompt_hash=prompt_hash(prompt),
+                             prompt_chars=len(prompt), response=response, duration=self.recorder.now() - started)
+        return response
+
+    def respond(self, role, prompt: str) -> str:
+        return self._call("respond", role, prompt)
+
+    def respond_once(self, role, prompt: str) -> str:
+        return self._call("respond_once", role, prompt)
+
+
+def open_recorder(conversation_id: str) -> Optional[Recorder]:
+    """
+    A recorder for a new conversation, or None when captures are off.
+    """
+    if not getattr(settings, "SACCESSCO_CAPTURE", False):
+        return None
+    directory = Path(getattr(settings, "SACCESSCO_CAPTURE_DIR", "captures"))
+    try:
+        directory.mkdir(parents=True, exist_ok=True)
+        safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", conversation_id)[:100]
+        return Recorder(directory / f"{safe_id}-{time.strftime('%Y%m%dT%H%M%S')}.jsonl.gz", conversation_id)
+    except OSError as e:
+        logger.error(f"Could not open a capture for conversation {conversation_id}: {e}")
+        return None
+
+
+def read_capture(path) -> Iterator[dict]:
+    """
+    The events of a capture, in file order. A capture cut short by a crash ends at its last whole event.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                if line.endswith("\n"):
+                    yield json.loads(line)
+        except EOFError:
+            return
@@ -0,0 +1,104 @@
+"""
+Feeds a capture back through a Conversation, to reproduce its latency offline.
+"""
+import itertools
+import threading
+import time
+import uuid
+from typing import List
+
+from channels.layers import InMemoryChannelLayer
+
+from saccessco.ai import create_engine as ai_create_engine, engine_names
+from saccessco.capture.recorder import read_capture
+from saccessco.tracing import percentile
+
+_replays = itertools.count(1)
+
+
+def create_engine(name: str, events: List[dict], speed: float):
+    """
+    The engine a replay runs against: "cached" (the capture's own responses), or one of
+    SACCESSCO_AI_ENGINES ("stub", "gemini", "chtgpt").
+    """
+    if name == "cached":
+        from saccessco.capture.cached import CachedAIEngine
+
+        return CachedAIEngine(events, speed=speed)
+    if name not in engine_names():
+        raise ValueError(f"Unknown engine {name!r}, expected cached, {', '.join(engine_names())}")
+    return ai_create_engine(name)
+
+
+def replay(path, engine="cached", speed: float = 1.0, channel_layer=None, delay: float = 0.0) -> dict:
+    """
+    Sends the page changes and prompts of the capture to a new Conversation, at their
+    recorded times divided by speed (0 sends each as soon as the previous one was sent),
+    after delay seconds. engine is an engine or the name of one, see create_engine. Responses
+    go to channel_layer, by default one of its own, where no one receives them.
+
+    Returns the prompts with their latency (from sending to the response being sent) next
+    to the recorded one, and a summary.
+    """
+    # Imported here: saccessco.conversation imports saccessco.capture.recorder
+    from saccessco.conversation import Conversation
+
+    events = list(read_capture(path))
+    start = next((event for event in events if event["event"] == "start"), {})
+    if isinstance(engine, str):
+        engine = create_engine(engine, events, speed)
+    recorded = {event["prompt_t"]: event["t"] - event["prompt_t"]
+                for event in events if event["event"] == "ai_response" and event.get("prompt_t") is not None}
+    inputs = sorted((event for event in events if event["event"] in ("page_change", "user_prompt")),
+                    key=lambda event: event["t"])
+
+    conversation_id = f"replay-{start.get('conversation_id', 'capture')}-{next(_replays)}-{uuid.uuid4().hex[:6]}"
+    conversation = Conversation(conversation_id=conversation_id, ai_engine=engine)
+    conversation.channel_layer = channel_layer if channel_layer is not None else InMemoryChannelLayer()
+
+    prompts = []
+    lock = threading.Lock()
+
+    def _done(prompt):
+        def _callback(future):
+            with lock:
+                prompt["latency"] = time.perf_counter() - prompt.pop("_sent")
+        return _callback
+
+    futures = []
+    began = time.monotonic() + delay
+    try:
+        for event in inputs:
+            if speed:
+                time.sleep(max(began + event["t"] / speed - time.monotonic(), 0))
+            if event["event"] == "page_change":
+                futures.append(conversation.page_change(event["html"], event.get("url")))
+                continue
+            prompt = {"t": event["t"], "prompt": event["prompt"], "recorded_latency": recorded.get(event["t"]),
+                      "_sent": time.perf_counter()}
+            prompts.append(prompt)
+            future = conversation.user_prompt(event["prompt"])
+            if future is None:
+                # Test prompts are answered on the spot
+                prompt["latency"] = time.perf_counter() - prompt.pop("_sent")
+            else:
+                future.add_done_callback(_done(prompt))
+                futures.append(future)
+        for future in futures:
+            future.result()
+    finally:
+        conversation.shutdown()
+        Conversation._instances.pop(conversation_id, None)
+
+    latencies = sorted(prompt["latency"] for prompt in prompts)
+    recorded_latencies = sorted(prompt["recorded_latency"] for prompt in prompts
+                                if prompt["recorded_latency"] is not None)
+    summary = {"capture": str(path), "conversation_id": start.get("conversation_id"),
+               "engine": getattr(engine, "PROVIDER", None) or type(engine).__module__.rsplit(".", 1)[-1],
+               "speed": speed, "page_changes": len(inputs) - len(prompts), "prompts": len(prompts)}
+    for name, values in [("latency", latencies), ("recorded_latency", recorded_latencies)]:
+        if values:
+            summary.update({f"{name}_p50": percentile(values, 0.5), f"{name}_p99": percentile(values, 0.99)})
+    if hasattr(engine, "misses"):
+        summary.update(cache_hits=engine.hits, cache_misses=engine.misses)
+    return {"summary": summary, "prompts": prompts}
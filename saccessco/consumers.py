@@ -1,21 +1,62 @@
 # saccessco/consumers.py
 import asyncio
 import json # Ensure json is imported
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from channels.generic.http import AsyncHttpConsumer
 from channels.generic.websocket import AsyncWebsocketConsumer
+from django.conf import settings
 import logging
 
-from saccessco.validators import validate_ai_response
+from saccessco import metrics, profiling, tracing
+from saccessco.logpipeline import payload
+from saccessco.serializers import PageChangeSerializer, UserPromptSerializer
+from saccessco.utils import fastjson
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is in requirements.txt
+    msgpack = None
 
 logger = logging.getLogger('saccessco')
 
+
+def _last_seq(scope, header=None):
+    """
+    The seq of the last response the client got: the header (e.g. b'last-event-id') if it was
+    sent, else ?last_seq=N. None if neither was given.
+    """
+    values = [value.decode('latin-1') for name, value in scope.get('headers', []) if name == header]
+    if not values:
+        values = parse_qs(scope.get('query_string', b'').decode('latin-1')).get('last_seq')
+    if not values:
+        return None
+    try:
+        return max(int(values[-1]), 0)
+    except ValueError:
+        return 0
+
 class AiConsumer(AsyncWebsocketConsumer):
     GROUP_NAME_PREFIX = 'WEB_SOCKET_GROUP_NAME_'
+    # Clients offering this subprotocol exchange MessagePack binary frames instead of JSON text frames
+    MSGPACK_SUBPROTOCOL = 'saccessco.msgpack'
+    # seq of the last response sent on this socket, None if the client doesn't track them
+    last_seq = None
+    # Whether the socket was accepted, and counted in metrics.WEBSOCKET_CONNECTIONS
+    accepted = False
+    # Origin header of the page that opened the socket, the site of its page changes without a URL
+    origin = None
+    # Whether the socket was opened with ?profile=1: its handlers are profiled, see saccessco.profiling
+    profile = False
+
     async def connect(self):
         self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
         self.group_name = f"{self.GROUP_NAME_PREFIX}{self.conversation_id}"
+        self.origin = dict(self.scope.get('headers') or []).get(b'origin', b'').decode('latin-1') or None
+        self.profile = profiling.requested(
+            parse_qs(self.scope.get('query_string', b'').decode('latin-1')).get('profile', [None])[-1])
 
-        print(f"--- AiConsumer: Received path in connect: {self.scope['path']} ---")
-        print(f"--- AiConsumer: Connecting to group '{self.group_name}' for conversation ID: {self.conversation_id} ---")
+        logger.info(f"--- AiConsumer: Connecting to group '{self.group_name}' for path: {self.scope['path']} ---")
 
         # Join group
         await self.channel_layer.group_add(
@@ -23,18 +64,59 @@ class AiConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
-        # ADD THIS LINE: Small delay after accepting the connection
-        await asyncio.sleep(0.05) # Sleep for 50 milliseconds
+        self.binary = msgpack is not None and self.MSGPACK_SUBPROTOCOL in self.scope.get('subprotocols', [])
+        await self.accept(subprotocol=self.MSGPACK_SUBPROTOCOL if self.binary else None)
+        self.accepted = True
+        metrics.WEBSOCKET_CONNECTIONS.inc()
+        await self._replay()
+        # group_add has completed, so every response sent to the group from now on reaches this
+        # socket: tell the client it can start sending requests
+        if self.last_seq is None:
+            await self._send_message({"type": "ready"})
+        else:
+            await self._send_message({"type": "ready", "last_seq": self.last_seq})
 
-        print(f"WebSocket connected for conversation ID: {self.conversation_id} to group: {self.group_name}")
+        logger.info(f"WebSocket connected for conversation ID: {self.conversation_id} to group: {self.group_name}")
 
     # This method handles messages received directly from the WebSocket client
-    async def receive(self, text_data):
-        text_data_json = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        with profiling.profile("ws_receive", self.conversation_id,
+                               self.profile or profiling.wanted(self.conversation_id)):
+            await self._receive(text_data, bytes_data)
+
+    async def _receive(self, text_data=None, bytes_data=None):
+        try:
+            if bytes_data is not None:
+                if msgpack is None:
+                    raise ValueError("binary frames are not supported")
+                text_data_json = msgpack.unpackb(bytes_data)
+            else:
+                text_data_json = json.loads(text_data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"--- AiConsumer: Received undecodable message from client: {e} ---")
+            await self._send_message({"type": "error", "message": "Message could not be decoded."})
+            return
+        if not isinstance(text_data_json, dict):
+            await self._send_message({"type": "error", "message": "Message must be an object."})
+            return
         message_type = text_data_json.get('type')
 
-        logger.info(f"--- AiConsumer: Received RAW message from client: {text_data_json} ---")
+        if message_type == 'page_change':
+            metrics.PAGE_CHANGE_BYTES.labels('websocket').inc(len(bytes_data if bytes_data is not None else text_data))
+        if message_type in self.REQUESTS:
+            # Page changes can be megabytes of HTML: don't log the payload
+            logger.info(f"--- AiConsumer: Received '{message_type}' request "
+                        f"{text_data_json.get('request_id')!r} from client ---")
+            await self._request(message_type, text_data_json)
+            return
+
+        if message_type == 'receipt':
+            # The client got the response of a traced prompt
+            tracing.record_receipt(str(text_data_json.get('trace_id')), transport='websocket')
+            return
+
+        logger.info("--- AiConsumer: Received RAW message from client: %s ---",
+                    payload(text_data_json, self.conversation_id))
 
         if message_type == 'client_hello':
             # Handle initial client hello (from Selenium test)
@@ -51,19 +133,269 @@ class AiConsumer(AsyncWebsocketConsumer):
             # This message doesn't need a direct response for the test, it's just for confirmation.
 
         else:
-            logger.info(f"--- AiConsumer: Received unexpected message from client: {text_data_json} ---")
+            logger.info("--- AiConsumer: Received unexpected message from client: %s ---",
+                        payload(text_data_json, self.conversation_id))
             # Fallback for unhandled message types directly from WebSocket
 
+    # Requests the client can send over the socket instead of POSTing them to the REST API:
+    # message type -> (serializer, Conversation method, its argument fields, REST success message)
+    REQUESTS = {
+        'user_prompt': (UserPromptSerializer, 'user_prompt', ('prompt',), "User prompt received successfully"),
+        'page_change': (PageChangeSerializer, 'page_change', ('html', 'url'), "Page change received successfully"),
+    }
+
+    async def _request(self, message_type, message):
+        """
+        Validates a user prompt or page change with the REST API's serializer and hands it to the
+        conversation. The 'ack' reply carries the client's request_id and the body the REST
+        endpoint would have returned, so the client handles both paths the same way.
+        """
+        serializer_class, method, fields, success_message = self.REQUESTS[message_type]
+        # Prompts are followed until the client acknowledges the response, see saccessco.tracing
+        trace = None
+        if message_type == 'user_prompt':
+            trace = tracing.new_trace("user_prompt", transport="websocket",
+                                      conversation=tracing.conversation_ref(self.conversation_id))
+        with tracing.activate(trace):
+            with tracing.span("validate_request"):
+                # The socket belongs to one conversation: its id comes from the URL, not from the message.
+                # The first field is required, the others optional.
+                data = {field: message.get(field) for field in fields if field == fields[0] or field in message}
+                serializer = serializer_class(data={'conversation_id': self.conversation_id, **data})
+                valid = serializer.is_valid()
+            if valid:
+                values = [serializer.validated_data.get(field) for field in fields]
+                if message_type == 'page_change' and not values[1]:
+                    # Pages without a URL are on the site the socket was opened from
+                    values[1] = self.origin
+                # sync_to_async runs it in a copy of this context, with the trace active
+                await sync_to_async(self._dispatch, thread_sensitive=False)(method, *values)
+                status_code, body = 200, {"message": success_message, "status": "success"}
+            else:
+                tracing.end_trace(error="invalid request")
+                status_code, body = 400, serializer.errors
+        await self._send_message({
+            "type": "ack", "request_id": message.get('request_id'), "status_code": status_code, "response": body,
+        })
+
+    def _dispatch(self, method, *values):
+        # Imported here: saccessco.conversation imports this module
+        from saccessco.conversation import Conversation
+
+        getattr(Conversation(conversation_id=self.conversation_id), method)(*values)
+
+    async def _replay(self):
+        """
+        Sends the responses the client missed. Clients pass the seq of the last response they
+        got as ?last_seq=N (0 for none yet); without it nothing is replayed. The 'ready' frame
+        then carries the seq the client is at.
+        """
+        # Imported here: saccessco.conversation imports this module
+        from saccessco.conversation.stream import replay
+
+        last_seq = _last_seq(self.scope)
+        if last_seq is None:
+            return
+        self.last_seq, frames = replay(self.conversation_id, last_seq)
+        if frames:
+            logger.info(f"Replaying responses {frames[0][0]} to {frames[-1][0]} of conversation {self.conversation_id}")
+        for seq, text in frames:
+            await self._send_message(text=text)
+            self.last_seq = seq
+
     async def disconnect(self, close_code):
         logger.info(f"WebSocket disconnected for conversation ID: {self.conversation_id} from group: {self.group_name} with code {close_code}")
+        if self.accepted:
+            self.accepted = False
+            metrics.WEBSOCKET_CONNECTIONS.dec()
         # Leave group
         await self.channel_layer.group_discard(
             self.group_name,
             self.channel_name
         )
 
+    async def _send_message(self, message=None, text=None):
+        """
+        Sends a message in the frame format negotiated on connect. text is the message already
+        encoded as JSON, which JSON clients receive as is.
+        """
+        if self.binary:
+            await self.send(bytes_data=msgpack.packb(message if text is None else fastjson.loads(text)))
+        else:
+            await self.send(text_data=fastjson.dumps(message) if text is None else text)
+
+    async def ai_response(self, event):
+        with profiling.profile("ws_ai_response", self.conversation_id,
+                               self.profile or profiling.wanted(self.conversation_id)):
+            await self._ai_response(event)
+
+    async def _ai_response(self, event):
+        seq = event.get('seq')
+        if seq is not None and self.last_seq is not None:
+            if seq <= self.last_seq:
+                # Already sent when replaying on connect
+                return
+            self.last_seq = seq
+        # Imported here: saccessco.conversation imports this module
+        from saccessco.conversation.stream import frame_text
+
+        text = frame_text(event)
+        if text is None:
+            return
+        logger.debug("--- AiConsumer: Sending AI response to client: %s ---", payload(text, self.conversation_id))
+        await self._send_message(text=text)
+
+
+class ResponseHttpConsumer(AsyncHttpConsumer):
+    """
+    Delivers a conversation's AI responses over plain HTTP, for clients whose network blocks
+    WebSockets. Joins the same group as AiConsumer and replays the responses after the
+    client's last_seq, like AiConsumer does on connect; subclasses send them.
+
+    AsyncHttpConsumer ends once handle() returns, and dispatches nothing while it runs.
+    Here handle() only starts the response: the responses sent to the group are dispatched
+    to ai_response afterwards, and the consumer ends when the client disconnects. Waiting
+    clients are only a channel and a group membership on the event loop, with no thread
+    each, which Django's ASGI handler would pin to every streaming response.
+    """
+    # Where the client tells which response it got last, besides ?last_seq=N
+    LAST_SEQ_HEADER = None
+
+    async def http_request(self, message):
+        if "body" in message:
+            self.body.append(message["body"])
+        if not message.get("more_body"):
+            await self.handle(b"".join(self.body))
+
+    async def handle(self, body):
+        # Imported here: saccessco.conversation imports this module
+        from saccessco.conversation.stream import replay
+
+        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
+        self.group_name = f"{AiConsumer.GROUP_NAME_PREFIX}{self.conversation_id}"
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        # Joined first: anything sent from now on reaches the channel, anything sent before is replayed
+        last_seq, frames = replay(self.conversation_id, _last_seq(self.scope, self.LAST_SEQ_HEADER) or 0)
+        self.last_seq = frames[-1][0] if frames else last_seq
+        await self.start(last_seq, frames)
+
+    async def start(self, last_seq, frames):
+        """
+        Starts the response of a client at last_seq, given the replayed (seq, text) frames.
+        """
+        raise NotImplementedError("Subclasses of ResponseHttpConsumer must provide a start() method")
+
+    async def respond(self, seq, text):
+        """
+        Sends a response sent to the group after start().
+        """
+        raise NotImplementedError("Subclasses of ResponseHttpConsumer must provide a respond() method")
+
     async def ai_response(self, event):
-        ai_response_data = event
-        if validate_ai_response(ai_response_data):
-            logger.info(f"--- AiConsumer: Sending AI response to client: {ai_response_data} ---")
-            await self.send(text_data=json.dumps(ai_response_data))
\ No newline at end of file
+        seq = event.get('seq')
+        if seq is not None:
+            if seq <= self.last_seq:
+                # Already replayed
+                return
+            self.last_seq = seq
+        # Imported here: saccessco.conversation imports this module
+        from saccessco.conversation.stream import frame_text
+
+        text = frame_text(event)
+        if text is not None:
+            await self.respond(seq, text)
+
+    async def disconnect(self):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    def response_headers(self, content_type):
+        headers = [(b"Content-Type", content_type), (b"Cache-Control", b"no-cache")]
+        # Routed ahead of Django, so django-cors-headers doesn't see these requests
+        if getattr(settings, "CORS_ALLOW_ALL_ORIGINS", False):
+            headers.append((b"Access-Control-Allow-Origin", b"*"))
+        else:
+            origin = dict(self.scope.get('headers', [])).get(b"origin")
+            if origin is not None and origin.decode('latin-1') in getattr(settings, "CORS_ALLOWED_ORIGINS", []):
+                headers += [(b"Access-Control-Allow-Origin", origin), (b"Vary", b"Origin")]
+        return headers
+
+
+class ResponseEventsConsumer(ResponseHttpConsumer):
+    """
+    Server-Sent Events stream of a conversation's AI responses. It starts with a 'ready'
+    event carrying the seq the client is at, then each response is an event whose id is
+    its seq, so EventSource resumes after a reconnect with Last-Event-ID; the first
+    connection passes ?last_seq=N. A comment line is sent whenever nothing else was for
+    SACCESSCO_HEARTBEAT_SECONDS, so proxies keep the connection open.
+    """
+    LAST_SEQ_HEADER = b'last-event-id'
+
+    async def start(self, last_seq, frames):
+        headers = self.response_headers(b"text/event-stream")
+        # Don't let nginx buffer the stream
+        headers.append((b"X-Accel-Buffering", b"no"))
+        await self.send_headers(headers=headers)
+        await self._send_event(f'event: ready\ndata: {{"type":"ready","last_seq":{last_seq}}}\n\n')
+        for seq, text in frames:
+            await self.respond(seq, text)
+        self._heartbeat = asyncio.ensure_future(self._send_heartbeats())
+
+    async def respond(self, seq, text):
+        data = text.replace("\n", "\ndata: ")
+        await self._send_event(f"id: {seq}\ndata: {data}\n\n" if seq is not None else f"data: {data}\n\n")
+
+    async def _send_event(self, event):
+        self._sent_at = asyncio.get_running_loop().time()
+        await self.send_body(event.encode(), more_body=True)
+
+    async def _send_heartbeats(self):
+        interval = getattr(settings, "SACCESSCO_HEARTBEAT_SECONDS", 15)
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self._sent_at + interval - loop.time())
+            if loop.time() >= self._sent_at + interval:
+                await self._send_event(": heartbeat\n\n")
+
+    async def disconnect(self):
+        if hasattr(self, '_heartbeat'):
+            self._heartbeat.cancel()
+        await super().disconnect()
+
+
+class ResponsePollConsumer(ResponseHttpConsumer):
+    """
+    Long-poll fallback for clients that can't keep a WebSocket or an event stream open.
+    GET ?last_seq=N returns the responses after N as soon as there are any, or none after
+    SACCESSCO_LONG_POLL_SECONDS: {"last_seq": M, "responses": [...]}. The client polls
+    again with last_seq=M.
+    """
+    _responded = False
+
+    async def start(self, last_seq, frames):
+        if frames:
+            await self._respond([text for _, text in frames])
+        else:
+            self._timeout = asyncio.ensure_future(self._respond_after(getattr(settings, "SACCESSCO_LONG_POLL_SECONDS", 25)))
+
+    async def respond(self, seq, text):
+        await self._respond([text])
+
+    async def _respond_after(self, timeout):
+        await asyncio.sleep(timeout)
+        await self._respond([])
+
+    async def _respond(self, texts):
+        # Responses arriving after this one are replayed by the next poll. Once the response is
+        # complete the server sends http.disconnect, which ends the consumer.
+        if self._responded:
+            return
+        self._responded = True
+        # The responses are encoded already
+        body = f'{{"last_seq":{self.last_seq},"responses":[{",".join(texts)}]}}'
+        await self.send_response(200, body.encode(), headers=self.response_headers(b"application/json"))
+
+    async def disconnect(self):
+        if hasattr(self, '_timeout'):
+            self._timeout.cancel()
+        await super().disconnect()
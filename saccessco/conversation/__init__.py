@@ -1,15 +1,28 @@
+import functools
 import json
 from concurrent.futures import ThreadPoolExecutor, Future
 from channels.layers import get_channel_layer
-from saccessco.ai import GeminiAIEngine as AIEngine, User, Model  # Assuming these are correctly defined
-# from saccessco.ai import ChtgptAIEngine as AIEngine, User, Model  # Assuming these are correctly defined
+from django.conf import settings
+from saccessco.ai import create_engine, User, Model
 import logging
 from asgiref.sync import async_to_sync
 import threading  # For logging thread info
+import time
 
 from saccessco.consumers import AiConsumer
 from saccessco.conversation.ai_response_tests import TESTS
 from saccessco.conversation.ai_response_tests.utils import parse_test_prompt
+from saccessco.conversation.snapshot import parse_snapshot, count_selector_matches, dead_selectors
+from saccessco.conversation.regions import split_regions, analyse_regions
+from saccessco.conversation.fingerprint import fingerprint_page, get_template_cache
+from saccessco.conversation.extract import extract_json_and_preamble as _extract_json_and_preamble
+from saccessco.conversation.plan_optimizer import optimize_plan
+from saccessco.conversation.slots import SlotMemory
+from saccessco.conversation.stream import get_stream
+from saccessco import accounting, logpipeline, metrics, profiling, tracing
+from saccessco.capture.recorder import RecordingEngine, open_recorder
+from saccessco.utils import fastjson
+from saccessco.validators import validate_ai_response
 import json, re
 
 logger = logging.getLogger("saccessco")
@@ -22,50 +35,27 @@ def _smart_join(a: str, b: str) -> str:
     # If a ends with sentence punctuation, just add a space; otherwise add a comma
     return f"{a} {b}" if re.search(r'[.!?]\s*$', a) else f"{a}, {b}"
 
-def _extract_json_and_preamble(raw: str):
-    """
-    Returns (preamble_text, json_obj).
-    Finds the first fenced code block ```json ... ``` (or any ``` ... ```),
-    or falls back to the first {...} block. Any text outside the JSON is 'preamble'.
-    """
-    s = raw or ""
-    # Prefer ```json ... ```
-    m = re.search(r"```json\s*([\s\S]*?)\s*```", s, flags=re.IGNORECASE)
-    if not m:
-        # Accept generic fenced block
-        m = re.search(r"```\s*([\s\S]*?)\s*```", s)
-    if m:
-        json_str = m.group(1).strip()
-        pre = (s[:m.start()] + s[m.end():]).strip()
-    else:
-        # Fallback: grab the first {...} region
-        lb = s.find("{"); rb = s.rfind("}")
-        if lb != -1 and rb != -1 and rb > lb:
-            json_str = s[lb:rb+1].strip()
-            pre = (s[:lb] + s[rb+1:]).strip()
-        else:
-            raise ValueError("No JSON block found")
-
-    obj = json.loads(json_str)  # let it raise; caller handles
-    return pre, obj
-
 def _parse_ai_response_merge_speak(ai_response: str):
     """
     Produces a dict like:
-      {"speak": "...", "execute": [...]}
+      {"speak": "...", "execute": {"plan": [...], "parameters": {...}}}
     Merges any free text into obj['speak'].
-    Ensures 'execute' exists (list).
+    Ensures 'execute' exists in the shape the ai_response schema expects.
     """
     preamble, obj = _extract_json_and_preamble(ai_response)
 
     # Normalize structure
     if not isinstance(obj, dict):
         obj = {"speak": str(obj)}
-    if "execute" not in obj:
-        obj["execute"] = []
-    # Some models might emit execute as dict; normalize to list
-    if isinstance(obj.get("execute"), dict):
-        obj["execute"] = [obj["execute"]]
+    execute = obj.get("execute")
+    if execute is None:
+        obj["execute"] = {"plan": [], "parameters": {}}
+    elif isinstance(execute, list):
+        # Some models emit the execute block wrapped in a list, others emit the bare plan
+        if len(execute) == 1 and isinstance(execute[0], dict) and "plan" in execute[0]:
+            obj["execute"] = execute[0]
+        else:
+            obj["execute"] = {"plan": execute, "parameters": {}}
 
     # Merge speak
     speak = obj.get("speak", "").strip()
@@ -76,13 +66,23 @@ def _parse_ai_response_merge_speak(ai_response: str):
 
     return obj
 
+def _engine_name(engine) -> str:
+    if isinstance(engine, RecordingEngine):
+        engine = engine.engine
+    return type(engine).__module__.rsplit(".", 1)[-1]
+
+def _plan_of(ai_response_object) -> list:
+    execute = ai_response_object.get("execute") if isinstance(ai_response_object, dict) else None
+    plan = execute.get("plan") if isinstance(execute, dict) else None
+    return plan if isinstance(plan, list) else []
+
 
 class Conversation:
     # Class-level dictionary to store instances by ID
     _instances = {}
     _lock = threading.Lock()  # Use a lock to ensure thread-safe instance management
 
-    def __new__(cls, conversation_id: str):
+    def __new__(cls, conversation_id: str, ai_engine=None):
         """
         Called before __init__. Checks if an instance with this ID already exists.
         """
@@ -93,40 +93,131 @@ class Conversation:
                 cls._instances[conversation_id] = instance
                 # Set a flag to indicate that __init__ should perform full initialization
                 instance._initialized = False
+                # Only this thread initializes it; others wait until it's ready, see __init__
+                instance._creator = threading.get_ident()
+                instance._ready = threading.Event()
             else:
                 # If an instance exists, return the existing one
                 instance = cls._instances[conversation_id]
-                # Set a flag to indicate that __init__ should skip full re-initialization
-                instance._initialized = True
             return instance
 
-    def __init__(self, conversation_id: str):
-        if self._initialized:
+    def __init__(self, conversation_id: str, ai_engine=None):
+        """
+        ai_engine answers a new conversation instead of the engine of the settings.
+        """
+        if self._initialized or self._creator != threading.get_ident():
+            # Another request's thread may still be initializing it
+            self._ready.wait()
+            if not self._initialized:
+                raise RuntimeError(f"Conversation {conversation_id} could not be initialized")
             logger.info(f"Returning existing Conversation instance for ID: {conversation_id}")
             return
 
-        self.id = conversation_id
-        self.ai_engine = AIEngine()
-        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"Conv-{conversation_id}-")
-        self.channel_layer = get_channel_layer()
+        try:
+            self.id = conversation_id
+            # The engine of SACCESSCO_AI_ENGINE, e.g. the offline stub for load tests (benchmarks/load.py)
+            self.ai_engine = ai_engine if ai_engine is not None else create_engine()
+            # Every call's tokens, cost and time are accounted to this conversation
+            self.ai_engine.on_usage = functools.partial(accounting.get_ledger().record, conversation_id)
+            # Its thread logs payloads as this conversation's, see saccessco.logpipeline
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"Conv-{conversation_id}-",
+                                               initializer=logpipeline.set_conversation, initargs=(conversation_id,))
+            self.channel_layer = get_channel_layer()
+            self._snapshot = None  # Parsed HTML of the last page change, used to check plan selectors
+            self._slots = SlotMemory()  # Values said earlier, used to fill in null plan parameters
+            self._stream = get_stream(conversation_id)  # Numbers the responses and keeps them for replay
+            self._recorder = open_recorder(conversation_id)  # Records the traffic when SACCESSCO_CAPTURE is on
+            if self._recorder is not None:
+                self.ai_engine = RecordingEngine(self.ai_engine, self._recorder)
 
-        logger.info(f"New Conversation instance created and initialized for ID: {conversation_id}")
-        self._initialized = True  # Mark as initialized
+            logger.info(f"New Conversation instance created and initialized for ID: {conversation_id}")
+            metrics.LIVE_CONVERSATIONS.inc()
+            self._initialized = True  # Mark as initialized
+        except BaseException:
+            # The next request creates it again
+            with self._lock:
+                if self._instances.get(conversation_id) is self:
+                    del self._instances[conversation_id]
+            raise
+        finally:
+            self._ready.set()
+
+    def page_change(self, new_html, url=None):
+        """
+        url is the page's, or the origin of its site: the conversation's usage is accounted to that site.
+        """
+        arrived = self._recorder.now() if self._recorder is not None else None
 
-    def page_change(self, new_html):
         def _inner():
+            metrics.EXECUTOR_QUEUE_DEPTH.dec()
+            if self._recorder is not None:
+                # Recorded here, off the request thread, with the time it arrived
+                self._recorder.record("page_change", arrived, html=new_html, url=url)
             current_thread_name = threading.current_thread().name
             logger.info(f"[{current_thread_name}] Processing page change for conversation {self.id}")
+            accounting.get_ledger().set_domain(self.id, accounting.site_domain(url))
+            self._apply_budget(current_thread_name)
             try:
-                page_analysis = self.ai_engine.respond(User, f"PAGE CHANGE\n{new_html}")
-                self.ai_engine.add_message_to_history(Model, page_analysis)
+                self._snapshot = parse_snapshot(new_html)
+            except Exception as e:
+                self._snapshot = None
+                logger.warning(f"[{current_thread_name}] Could not parse page change HTML: {e}")
+            try:
+                threshold = getattr(settings, "SACCESSCO_CHUNKED_ANALYSIS_THRESHOLD", 200_000)
+                chunked = self._snapshot is not None and len(new_html) > threshold
+                fingerprint = fingerprint_page(self._snapshot) if self._snapshot is not None else None
+                # Analyses quote their page: they are only reused within the conversation and site
+                scope = (self.id, accounting.site_domain(url))
+                page_analysis = get_template_cache().lookup(fingerprint, scope) if fingerprint else None
+                if page_analysis is not None:
+                    # Same layout as a page analysed before: skip the LLM call, the labels are already substituted
+                    logger.info(f"[{current_thread_name}] Reusing analysis of page template {fingerprint.key}.")
+                    user_turn = ("PAGE CHANGE\n(Page too large to include, same layout as an earlier page)"
+                                 if chunked else f"PAGE CHANGE\n{new_html}")
+                    self.ai_engine.add_message_to_history(User, user_turn)
+                    self.ai_engine.add_message_to_history(Model, page_analysis)
+                else:
+                    if chunked:
+                        page_analysis = self._chunked_page_change(current_thread_name)
+                    else:
+                        page_analysis = self.ai_engine.respond(User, f"PAGE CHANGE\n{new_html}")
+                        self.ai_engine.add_message_to_history(Model, page_analysis)
+                    if fingerprint and isinstance(page_analysis, str) and not page_analysis.startswith("Error:"):
+                        get_template_cache().store(fingerprint, page_analysis, scope)
                 logger.info(f"[{current_thread_name}] Page change analysis complete.")
             except Exception as e:
                 logger.error(f"[{current_thread_name}] Error during page change analysis: {e}", exc_info=True)
 
-        self.executor.submit(_inner)
+        # Decided here, where the request asking for a profile runs, see saccessco.profiling
+        profile = profiling.wanted(self.id)
+
+        def _profiled_inner():
+            with profiling.profile("page_change", self.id, profile):
+                _inner()
+
+        metrics.EXECUTOR_QUEUE_DEPTH.inc()
+        return self.executor.submit(_profiled_inner)
+
+    def _chunked_page_change(self, current_thread_name):
+        """
+        Analyses a page too large for a single PAGE CHANGE call region by region, concurrently,
+        and records the merged analysis as one page change turn in the history.
+        """
+        regions = split_regions(self._snapshot, getattr(settings, "SACCESSCO_REGION_MAX_CHARS", 60_000))
+        region_names = ", ".join(name for name, _ in regions)
+        logger.info(f"[{current_thread_name}] Analysing large page in {len(regions)} regions: {region_names}")
+        title = self._snapshot.title.get_text(strip=True) if self._snapshot.title else ""
+        page_analysis = analyse_regions(self.ai_engine, regions, title)
+        self.ai_engine.add_message_to_history(
+            User, f"PAGE CHANGE\n(Page too large to include, analysed in {len(regions)} regions: {region_names})")
+        self.ai_engine.add_message_to_history(Model, page_analysis)
+        return page_analysis
 
     def user_prompt(self, prompt) -> Future:
+        # The request's trace, if it is traced, followed on the executor thread
+        trace = tracing.current_trace()
+        arrived = self._recorder.now() if self._recorder is not None else None
+
         def _run_test():
             logger.info(f"--DEBUG-- Existing tests: {TESTS}")
             logger.info(f"--DEBUG-- Looking for test: {prompt}")
@@ -139,18 +230,37 @@ class Conversation:
                 logger.info(f"--DEBUG-- Test: {test_name} Found!!!")
                 _send(test.get_test_response(**kwargs), "test_thread")
 
+        # Decided here, where the request asking for a profile runs, see saccessco.profiling
+        profile = profiling.wanted(self.id)
+
+        def _traced_inner():
+            metrics.EXECUTOR_QUEUE_DEPTH.dec()
+            if self._recorder is not None:
+                self._recorder.record("user_prompt", arrived, prompt=prompt)
+            with tracing.activate(trace), profiling.profile("user_prompt", self.id, profile):
+                tracing.record_span("queue_wait", submitted_ns)
+                try:
+                    _inner()
+                finally:
+                    tracing.end_trace()
+
         def _inner():
             current_thread_name = threading.current_thread().name
             logger.info(f"[{current_thread_name}] Processing user prompt for conversation {self.id}")
+            self._apply_budget(current_thread_name)
+            tracing.set_attributes(engine=_engine_name(self.ai_engine),
+                                   model=getattr(self.ai_engine, "model_name", None))
             try:
                 ai_response = self.ai_engine.respond(User, prompt)
                 self.ai_engine.add_message_to_history(Model, ai_response)
+                self._slots.observe_prompt(prompt)
 
                 # IMPORTANT: Safely parse JSON
                 # IMPORTANT: Safely parse & merge any preamble text into JSON.speak
                 try:
-                    logger.info(f"--DEBUG--: _inner thread: raw ai_engine.response (first 500): {ai_response[:500]!r}")
-                    ai_response_object = _parse_ai_response_merge_speak(ai_response)
+                    logger.info("--DEBUG--: _inner thread: raw ai_engine.response: %s", logpipeline.payload(ai_response))
+                    with tracing.span("parse"):
+                        ai_response_object = _parse_ai_response_merge_speak(ai_response)
                 except Exception as e:
                     logger.error(
                         f"[{current_thread_name}] Failed to parse AI response as JSON: {e}. "
@@ -158,7 +268,14 @@ class Conversation:
                         exc_info=True
                     )
                     # sensible fallback
-                    ai_response_object = {"speak": ai_response.strip(), "execute": []}
+                    ai_response_object = {"speak": ai_response.strip(), "execute": {"plan": [], "parameters": {}}}
+
+                with tracing.span("check_selectors"):
+                    ai_response_object = self._check_selectors(ai_response_object, current_thread_name)
+                with tracing.span("optimize_plan"):
+                    ai_response_object = self._optimize_plan(ai_response_object, current_thread_name)
+                with tracing.span("resolve_parameters"):
+                    ai_response_object = self._resolve_parameters(ai_response_object, current_thread_name)
 
                 # --- CRUCIAL LOGIC FOR SENDING VIA CHANNEL LAYER ---
                 _send(ai_response_object, current_thread_name)
@@ -166,28 +283,167 @@ class Conversation:
 
             except Exception as e:
                 logger.error(f"[{current_thread_name}] Error during user prompt processing: {e}", exc_info=True)
+                tracing.end_trace(error=repr(e))
 
         def _send(ai_response_object, current_thread_name):
             if self.channel_layer:
                 conversation_group_name = f"{AiConsumer.GROUP_NAME_PREFIX}{self.id}"
 
-                # This is the line that was missing before!
-                async_to_sync(self.channel_layer.group_send)(
-                    conversation_group_name,
-                    {
-                        'type': 'ai_response',
-                        'ai_response': ai_response_object,
-                    }
-                )
+                # Validated and encoded once here; every subscribed socket just forwards the text
+                message = {'type': 'ai_response', 'ai_response': ai_response_object}
+                trace_id = tracing.current_trace_id()
+                if trace_id is not None:
+                    # Clients acknowledge the response with it, see AiConsumer.receive
+                    message['trace_id'] = trace_id
+                with tracing.span("validate_response"):
+                    valid = validate_ai_response(message)
+                if not valid:
+                    metrics.PLAN_VALIDATION_FAILURES.labels("schema").inc()
+                    speak = ai_response_object.get("speak") if isinstance(ai_response_object, dict) else None
+                    if not isinstance(speak, str) or not speak:
+                        logger.error("[%s] Invalid AI response dropped: %s", current_thread_name,
+                                     logpipeline.payload(ai_response_object))
+                        return
+                    logger.error(f"[{current_thread_name}] Invalid AI response, sending its speech only.")
+                    message = {'type': 'ai_response', 'ai_response': {'speak': speak}}
+                    if trace_id is not None:
+                        message['trace_id'] = trace_id
+
+                def _group_send(seq, text):
+                    started = time.perf_counter()
+                    with tracing.span("group_send", seq=seq):
+                        async_to_sync(self.channel_layer.group_send)(
+                            conversation_group_name,
+                            {
+                                'type': 'ai_response',
+                                'seq': seq,
+                                'text': text,
+                            }
+                        )
+                    metrics.CHANNEL_SEND_SECONDS.observe(time.perf_counter() - started)
+
+                # Kept for replay too: a socket that wasn't subscribed yet gets it when it connects
+                seq = self._stream.publish(message, _group_send)
+                if self._recorder is not None:
+                    self._recorder.record("ai_response", prompt_t=arrived, seq=seq, ai_response=message['ai_response'])
                 logger.info(
-                    f"[{current_thread_name}] Sent structured AI response to group '{conversation_group_name}'.")
+                    f"[{current_thread_name}] Sent structured AI response {seq} to group '{conversation_group_name}'.")
             else:
                 logger.error(f"[{current_thread_name}] Channel layer was not available to send AI response.")
         if prompt.startswith("Test") or prompt.startswith("test"):
+            if self._recorder is not None:
+                self._recorder.record("user_prompt", arrived, prompt=prompt)
             _run_test()
+            tracing.end_trace()
         else:
-            return self.executor.submit(_inner)
+            submitted_ns = time.time_ns()
+            metrics.EXECUTOR_QUEUE_DEPTH.inc()
+            return self.executor.submit(_traced_inner)
+
+    def _check_selectors(self, ai_response_object, current_thread_name):
+        """
+        Matches the plan selectors against the last page change before the plan is sent.
+        A plan with selectors that match nothing would only time out on the client, so the
+        model gets one chance to repair them, after which the user is asked to clarify.
+        """
+        plan = _plan_of(ai_response_object)
+        if not plan or self._snapshot is None:
+            return ai_response_object
+
+        counts = count_selector_matches(self._snapshot, plan)
+        logger.info(f"[{current_thread_name}] Selector matches per plan step: {counts}")
+        dead = dead_selectors(plan, counts)
+        if not dead:
+            return ai_response_object
+
+        metrics.PLAN_VALIDATION_FAILURES.labels("dead_selectors").inc()
+        logger.info(f"[{current_thread_name}] Plan has dead selectors {dead}, asking the model to repair them.")
+        repair_prompt = (
+            "SELECTOR REPAIR\n"
+            "These selectors from your last plan match no element on the current page:\n"
+            + "\n".join(f"* {selector}" for selector in dead)
+            + "\nRespond again with the same JSON structure, using only selectors that exist in the last page change."
+        )
+        try:
+            ai_response = self.ai_engine.respond(User, repair_prompt)
+            self.ai_engine.add_message_to_history(Model, ai_response)
+            repaired = _parse_ai_response_merge_speak(ai_response)
+            repaired_plan = _plan_of(repaired)
+            still_dead = dead_selectors(repaired_plan, count_selector_matches(self._snapshot, repaired_plan))
+            if not still_dead:
+                logger.info(f"[{current_thread_name}] Selector repair succeeded.")
+                return repaired
+            dead = still_dead
+        except Exception as e:
+            logger.error(f"[{current_thread_name}] Selector repair failed: {e}", exc_info=True)
+
+        logger.info(f"[{current_thread_name}] Selectors still dead after repair {dead}, asking the user to clarify.")
+        return {
+            "speak": _smart_join(
+                ai_response_object.get("speak", ""),
+                "I couldn't find the elements needed for this on the current page. "
+                "Could you tell me more about what you'd like to do?"
+            ),
+            "execute": {"plan": [], "parameters": {}},
+        }
+
+    def _apply_budget(self, current_thread_name):
+        """
+        Past its budget or the day's, the conversation goes on with a cheaper model and a
+        compacted history rather than stop, see saccessco.accounting.
+        """
+        ledger = accounting.get_ledger()
+        exceeded = ledger.over_budget(self.id)
+        if exceeded is None:
+            return
+        model = getattr(self.ai_engine, "model_name", None)
+        cheaper = accounting.cheaper_model(model)
+        if cheaper:
+            logger.warning(f"[{current_thread_name}] Conversation {self.id} is over the {exceeded} budget, "
+                           f"switching from {model} to {cheaper}.")
+            self.ai_engine.model_name = cheaper
+        if hasattr(self.ai_engine, "compact_history"):
+            dropped = self.ai_engine.compact_history(getattr(settings, "SACCESSCO_BUDGET_HISTORY_MESSAGES", 12))
+            if dropped:
+                logger.info(f"[{current_thread_name}] Over the {exceeded} budget: dropped {dropped} history messages.")
+        ledger.mark_degraded(self.id, exceeded)
+
+    def _optimize_plan(self, ai_response_object, current_thread_name):
+        """
+        Drops the plan steps that can't change the outcome on the client, see optimize_plan.
+        """
+        plan = _plan_of(ai_response_object)
+        if not plan:
+            return ai_response_object
+        optimized, removed = optimize_plan(plan)
+        if removed:
+            logger.info(f"[{current_thread_name}] Plan optimizer removed {len(removed)} of {len(plan)} steps: "
+                        + "; ".join(f"#{r.index} {r.step.get('action')} {r.step.get('selector')!r} ({r.reason})"
+                                    for r in removed))
+            ai_response_object["execute"]["plan"] = optimized
+        return ai_response_object
+
+    def _resolve_parameters(self, ai_response_object, current_thread_name):
+        """
+        Fills in the plan parameters the model left null from values said earlier in the
+        conversation, so the client only asks the user for what is really missing.
+        """
+        execute = ai_response_object.get("execute") if isinstance(ai_response_object, dict) else None
+        parameters = execute.get("parameters") if isinstance(execute, dict) else None
+        if not isinstance(parameters, dict):
+            return ai_response_object
+        resolved = self._slots.resolve(parameters)
+        if resolved:
+            logger.info(f"[{current_thread_name}] Resolved parameters from conversation memory: {sorted(resolved)}")
+        missing = [name for name, value in parameters.items() if value is None]
+        if missing:
+            logger.info(f"[{current_thread_name}] Parameters left for the user: {missing}")
+        self._slots.observe_parameters(parameters)
+        return ai_response_object
 
     def shutdown(self):
         logger.info(f"Shutting down ThreadPoolExecutor for Conversation ID: {self.id}")
         self.executor.shutdown(wait=True)
+        metrics.LIVE_CONVERSATIONS.dec()
+        if self._recorder is not None:
+            self._recorder.close()
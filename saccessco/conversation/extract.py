@@ -0,0 +1,247 @@
+import json
+import re
+from typing import List, Optional, Tuple
+
+FENCE = "```"
+
+# One token of a JSON-ish text: a whole double or single quoted string (the closing quote
+# group is empty when the string is cut off), a bracket, or a code fence. Everything
+# between tokens is skipped by the regex engine, so a scan is linear and runs in C.
+_TOKEN_RE = re.compile(r'"(?:[^"\\]|\\.)*(?P<dq>")?|\'(?:[^\'\\]|\\.)*(?P<sq>\')?|[{}\[\]]|```', re.DOTALL)
+_JSON_TAG_RE = re.compile(r"json\b", re.IGNORECASE)
+_CLOSERS = {"{": "}", "[": "]"}
+_DECODER = json.JSONDecoder()
+
+
+def _find_object(s: str, start: int = 0) -> Optional[Tuple[int, int, bool]]:
+    """
+    Finds the first balanced {...} region at or after start, skipping over strings.
+    Returns (start, end, complete); an object still open at the end of the text or at a
+    code fence is returned with complete=False.
+    """
+    lb = s.find("{", start)
+    if lb == -1:
+        return None
+    depth = 0
+    for m in _TOKEN_RE.finditer(s, lb):
+        token = m.group(0)
+        if token == FENCE:
+            return lb, m.start(), False
+        if token in ("{", "["):
+            depth += 1
+        elif token in ("}", "]"):
+            depth -= 1
+            if depth == 0:
+                return lb, m.end(), True
+    return lb, len(s), False
+
+
+def _strip_trailing_comma(out: List[str]):
+    i = len(out) - 1
+    while i >= 0:
+        stripped = out[i].rstrip()
+        if stripped:
+            if stripped.endswith(","):
+                out[i] = stripped[:-1]
+            return
+        out[i] = ""
+        i -= 1
+
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1]
+    return text + "".join(_CLOSERS[opener] for opener in reversed(stack))
+
+
+def _last_member_end(text: str) -> int:
+    """
+    Returns the offset of the last comma outside strings between members of the outermost
+    object or array, or -1 if it has none.
+    """
+    last = -1
+    depth = 0
+    pos = 0
+    for m in _TOKEN_RE.finditer(text):
+        if depth == 1:
+            last = max(last, text.rfind(",", pos, m.start()))
+        pos = m.end()
+        token = m.group(0)
+        if token in ("{", "["):
+            depth += 1
+        elif token in ("}", "]"):
+            depth -= 1
+    if depth == 1:
+        last = max(last, text.rfind(",", pos))
+    return last
+
+
+def _loads_ok(text: str) -> bool:
+    try:
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
+
+
+def repair_json(text: str) -> str:
+    """
+    Fixes the mistakes models commonly make in JSON: single quoted strings, trailing commas
+    and a truncated tail. A truncated text is cut back to the last complete member of the
+    outermost object or array, and that is closed: a member cut off half way, at any depth,
+    is dropped whole rather than kept half written (e.g. a plan step with part of its action).
+    A truncated text without a complete member is returned unclosed.
+    """
+    out: List[str] = []
+    stack: List[str] = []
+    pos = 0
+    last = None
+    for m in _TOKEN_RE.finditer(text):
+        out.append(text[pos:m.start()])
+        pos = m.end()
+        token = m.group(0)
+        last = m
+        if token[0] == '"':
+            out.append(token if m.group("dq") else token + '"')
+        elif token[0] == "'":
+            body = token[1:-1] if m.group("sq") else token[1:]
+            out.append('"' + body.replace("\\'", "'").replace('"', '\\"') + '"')
+        elif token in ("{", "["):
+            stack.append(token)
+            out.append(token)
+        elif token in ("}", "]"):
+            _strip_trailing_comma(out)
+            if stack:
+                stack.pop()
+            out.append(token)
+    out.append(text[pos:])
+    repaired = "".join(out)
+    if not stack:
+        return repaired
+
+    # The outermost value's last member ends the text, whole: a closed string, a closed
+    # object or array, or a comma after one. A number or literal may have been cut short.
+    candidate = _close(repaired, stack)
+    if (len(stack) == 1 and text[pos:].strip() in ("", ",") and last is not None
+            and (last.group("dq") or last.group("sq") or last.group(0) in ("}", "]", "{", "["))
+            and _loads_ok(candidate)):
+        return candidate
+    cut = _last_member_end(repaired)
+    if cut == -1:
+        # Not one complete member: nothing worth keeping, the text stays unparseable
+        return repaired
+    shorter = _close(repaired[:cut], stack[:1])
+    return shorter if _loads_ok(shorter) else candidate
+
+
+def _loads(text: str):
+    """
+    json.loads, retried once on the repaired text. Raises the original error if both fail.
+    """
+    try:
+        return json.loads(text)
+    except ValueError as e:
+        try:
+            return json.loads(repair_json(text))
+        except ValueError:
+            raise e
+
+
+def _find_marker(s: str, start: int) -> int:
+    """
+    str.find(FENCE, start), searching for a single backtick first: single character
+    searches run as memchr, which is several times faster over long prose.
+    """
+    i = s.find("`", start)
+    while i != -1 and not s.startswith(FENCE, i):
+        i = s.find("`", i + 1)
+    return i
+
+
+def _find_fence(s: str) -> Optional[Tuple[int, int, int, int]]:
+    """
+    Pairs up code fences in one pass. Returns (fence start, content start, content end, fence end)
+    for the first ```json fence, else for the first fence of any kind. A fence left open by a
+    truncated response runs to the end of the text.
+    """
+    first = None
+    open_at = _find_marker(s, 0)
+    while open_at != -1:
+        content_start = open_at + len(FENCE)
+        close_at = _find_marker(s, content_start)
+        content_end = close_at if close_at != -1 else len(s)
+        fence_end = close_at + len(FENCE) if close_at != -1 else len(s)
+        tag = _JSON_TAG_RE.match(s, content_start)
+        if tag:
+            return open_at, tag.end(), content_end, fence_end
+        if first is None:
+            first = (open_at, content_start, content_end, fence_end)
+        if close_at == -1:
+            break
+        open_at = _find_marker(s, fence_end)
+    return first
+
+
+def extract_json_and_preamble(raw: str):
+    """
+    Returns (preamble_text, json_obj).
+    Looks for the first fenced code block ```json ... ``` (or any ``` ... ```), falling back to
+    the first complete top level {...} object, in a single scan of the text. Single quotes,
+    trailing commas and a truncated tail are repaired. Any text outside the JSON is 'preamble'.
+    Raises ValueError if no JSON can be found.
+    """
+    s = raw or ""
+    fence = _find_fence(s)
+    if fence:
+        fence_start, content_start, content_end, fence_end = fence
+        preamble = (s[:fence_start] + s[fence_end:]).strip()
+        content = s[content_start:content_end].strip()
+        try:
+            return preamble, _loads(content)
+        except ValueError:
+            if content_end == len(s):
+                # A lone fence, e.g. inside a string of a bare object: first the text as if it had none
+                try:
+                    return _extract_bare(s)
+                except ValueError:
+                    pass
+            # A fence around something other than bare JSON, e.g. ```javascript
+            found = _find_object(s, content_start)
+            if found is None or found[1] > content_end:
+                raise
+            return preamble, _loads(s[found[0]:found[1]])
+    return _extract_bare(s)
+
+
+def _extract_bare(s: str):
+    """
+    (preamble, json_obj) of the first top level {...} object of a text without code fences.
+    """
+    lb = s.find("{")
+    if lb != -1:
+        # Fast path: a well formed object is decoded, and its end found, by the C decoder
+        try:
+            obj, rb = _DECODER.raw_decode(s, lb)
+            return (s[:lb] + s[rb:]).strip(), obj
+        except ValueError:
+            pass
+
+    start = 0
+    error = None
+    while True:
+        found = _find_object(s, start)
+        if found is None:
+            break
+        lb, rb, complete = found
+        try:
+            return (s[:lb] + s[rb:]).strip(), _loads(s[lb:rb])
+        except ValueError as e:
+            # Not JSON (e.g. a "{name}" placeholder in the preamble): try the next object
+            error = error or e
+            if not complete:
+                break
+            start = rb
+    if error:
+        raise error
+    raise ValueError("No JSON block found")
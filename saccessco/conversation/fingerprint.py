@@ -0,0 +1,179 @@
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from bs4 import BeautifulSoup, NavigableString, Tag
+from django.conf import settings
+
+logger = logging.getLogger("saccessco")
+
+# Attributes whose presence changes with page state rather than with the page layout
+VOLATILE_ATTRIBUTES = {"style", "nonce", "value", "checked", "selected", "disabled", "hidden", "tabindex",
+                       "aria-expanded", "aria-selected", "aria-checked", "aria-pressed", "aria-current",
+                       "aria-hidden", "aria-busy", "data-reactid"}
+# Attributes plan selectors are built on: their values are part of the layout
+SELECTOR_ATTRIBUTES = ("id", "name", "data-testid", "for", "type", "role")
+# Attributes holding user visible labels, which the analysis refers to and which change between pages
+LABEL_ATTRIBUTES = ("aria-label", "placeholder", "title", "alt")
+MAX_LABEL_LENGTH = 120
+MIN_LABEL_LENGTH = 3
+
+_PLACEHOLDER_RE = re.compile(r"\{\{L(\d+)\}\}")
+
+_template_cache = None
+
+
+class PageFingerprint(NamedTuple):
+    key: str
+    # Structural path of a label -> its text on this page
+    labels: Dict[str, str]
+
+
+def _hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def fingerprint_page(snapshot: BeautifulSoup) -> PageFingerprint:
+    """
+    Computes a structural fingerprint of a distilled page: a hash of tag names, attribute
+    names and the values of the attributes selectors use (SELECTOR_ATTRIBUTES), ignoring
+    text, other attribute values and volatile attributes, so an analysis is only reused on a
+    page its selectors match. Runs of identical
+    siblings count once, so a results list hashes the same whatever its length.
+    Labels (text and label attributes) are returned keyed by their structural path, which
+    is stable between pages that share a fingerprint.
+    """
+    def walk(tag: Tag, path: str, labels: Dict[str, str]) -> str:
+        for name in LABEL_ATTRIBUTES:
+            value = tag.get(name)
+            if isinstance(value, str) and MIN_LABEL_LENGTH <= len(value.strip()) <= MAX_LABEL_LENGTH:
+                labels[f"{path}@{name}"] = value.strip()
+
+        child_hashes: List[str] = []
+        previous = None
+        text_index = 0
+        for child in tag.children:
+            if isinstance(child, Tag):
+                child_labels: Dict[str, str] = {}
+                child_hash = walk(child, f"{path}/{len(child_hashes)}", child_labels)
+                if child_hash == previous:
+                    # Repeated sibling: neither its shape nor its labels are kept
+                    continue
+                previous = child_hash
+                child_hashes.append(child_hash)
+                labels.update(child_labels)
+            elif isinstance(child, NavigableString):
+                text = child.strip()
+                if not text:
+                    continue
+                if MIN_LABEL_LENGTH <= len(text) <= MAX_LABEL_LENGTH:
+                    labels[f"{path}#{text_index}"] = text
+                text_index += 1
+
+        attributes = ",".join(sorted(f"{name}={tag.get(name)}" if name in SELECTOR_ATTRIBUTES else name
+                                     for name in tag.attrs if name not in VOLATILE_ATTRIBUTES))
+        return _hash(f"{tag.name}[{attributes}]({''.join(child_hashes)})")
+
+    page_labels: Dict[str, str] = {}
+    key = walk(snapshot.body or snapshot, "", page_labels)
+    return PageFingerprint(key, page_labels)
+
+
+def parameterise(analysis: str, labels: Dict[str, str]) -> Tuple[str, List[Tuple[str, str]]]:
+    """
+    Replaces the page labels quoted in an analysis with {{L<n>}} placeholders: only where a
+    quote mark is on either side, as in a selector or a quoted name, not in the prose, where
+    a short label like "Search" may be an ordinary word.
+    Returns the template and, per placeholder, the label path and its original text.
+    """
+    by_text: Dict[str, str] = {}
+    for path, text in labels.items():
+        by_text.setdefault(text, path)
+    if not by_text:
+        return analysis, []
+
+    # Longest first so a label that contains another one is replaced whole
+    pattern = re.compile("(?<=['\"\u2018\u201c])(?:"
+                         + "|".join(re.escape(text) for text in sorted(by_text, key=len, reverse=True))
+                         + ")(?=['\"\u2019\u201d])")
+    slots: List[Tuple[str, str]] = []
+    index: Dict[str, int] = {}
+
+    def _replace(match):
+        text = match.group(0)
+        if text not in index:
+            index[text] = len(slots)
+            slots.append((by_text[text], text))
+        return f"{{{{L{index[text]}}}}}"
+
+    return pattern.sub(_replace, analysis), slots
+
+
+class PageTemplateCache:
+    """
+    LRU map from page fingerprints to parameterised page analyses. Entries are scoped, to the
+    site and the conversation that stored them, and only looked up in the same scope: an
+    analysis quotes the page it was made from, which may hold another user's data.
+    A lookup only hits when every label of the template is found on the new page, and
+    analyses that quote no label of their page are not stored: nothing would tell that the
+    new page is the one they describe.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[Hashable, str], Tuple[str, List[Tuple[str, str]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, fingerprint: PageFingerprint, scope: Hashable = None) -> Optional[str]:
+        """
+        Returns the analysis cached in scope with the current page's labels substituted, or None.
+        """
+        with self._lock:
+            entry = self._entries.get((scope, fingerprint.key))
+            if entry is not None:
+                self._entries.move_to_end((scope, fingerprint.key))
+                template, slots = entry
+                resolved = [fingerprint.labels.get(path) for path, _ in slots]
+                if None in resolved:
+                    entry = None
+                    logger.info(f"Page template {fingerprint.key} matched {len(resolved) - resolved.count(None)} "
+                                f"of its {len(slots)} labels; not reused.")
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        return _PLACEHOLDER_RE.sub(lambda match: resolved[int(match.group(1))], template)
+
+    def store(self, fingerprint: PageFingerprint, analysis: str, scope: Hashable = None):
+        template, slots = parameterise(analysis, fingerprint.labels)
+        if not slots:
+            return
+        with self._lock:
+            self._entries[(scope, fingerprint.key)] = (template, slots)
+            self._entries.move_to_end((scope, fingerprint.key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_template_cache_lock = threading.Lock()
+
+
+def get_template_cache() -> PageTemplateCache:
+    global _template_cache
+    with _template_cache_lock:
+        if _template_cache is None:
+            _template_cache = PageTemplateCache(getattr(settings, "SACCESSCO_TEMPLATE_CACHE_SIZE", 256))
+        return _template_cache
@@ -0,0 +1,43 @@
+from typing import List, NamedTuple, Tuple
+
+from saccessco.ai.instructions.dom_element_actions import IDEMPOTENT_ACTIONS, PREPARATORY_ACTIONS
+
+
+class RemovedStep(NamedTuple):
+    # Index of the step in the plan as the model sent it
+    index: int
+    step: dict
+    reason: str
+
+
+def _same_step(a: dict, b: dict) -> bool:
+    return a.get("action") == b.get("action") and a.get("selector") == b.get("selector") and a.get("data") == b.get("data")
+
+
+def optimize_plan(plan: list) -> Tuple[list, List[RemovedStep]]:
+    """
+    Removes plan steps that can't change the outcome on the client, so each of them doesn't
+    cost an element poll and a 50ms pause in page_manipulator.js:
+    * a preparatory step (scrollTo, waitForElement) directly followed by a step on the same
+      selector, which waits for the element and scrolls it into view itself;
+    * an idempotent step directly followed by an identical step.
+    Returns the optimized plan and the removed steps.
+    """
+    if not isinstance(plan, list):
+        return plan, []
+
+    kept = []
+    removed: List[RemovedStep] = []
+    for i, step in enumerate(plan):
+        following = plan[i + 1] if i + 1 < len(plan) else None
+        if isinstance(step, dict) and isinstance(following, dict):
+            action = step.get("action")
+            if action in IDEMPOTENT_ACTIONS and _same_step(step, following):
+                removed.append(RemovedStep(i, step, "repeated by the next step"))
+                continue
+            if action in PREPARATORY_ACTIONS and step.get("selector") == following.get("selector"):
+                removed.append(RemovedStep(i, step, f"the next step ({following.get('action')}) waits for "
+                                                    f"and scrolls to the same element"))
+                continue
+        kept.append(step)
+    return kept, removed
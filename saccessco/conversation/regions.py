@@ -0,0 +1,138 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from bs4 import BeautifulSoup, Tag
+from django.conf import settings
+
+from saccessco.ai import User
+
+logger = logging.getLogger("saccessco")
+
+# Landmarks a page is split on. Anything outside them is collected into "content" regions.
+REGION_SELECTOR = ("header, nav, main, form, dialog, footer, [role=banner], [role=navigation], "
+                   "[role=main], [role=search], [role=dialog], [role=alertdialog], [role=contentinfo]")
+_ROLE_NAMES = {"banner": "header", "navigation": "nav", "main": "main", "search": "form",
+               "dialog": "dialog", "alertdialog": "dialog", "contentinfo": "footer"}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _region_name(tag: Tag) -> str:
+    role = tag.get("role")
+    if isinstance(role, str) and role in _ROLE_NAMES:
+        return _ROLE_NAMES[role]
+    return tag.name
+
+
+def _is_region(tag: Tag) -> bool:
+    role = tag.get("role")
+    return tag.name in ("header", "nav", "main", "form", "dialog", "footer") or (
+        isinstance(role, str) and role in _ROLE_NAMES)
+
+
+def _pack(name: str, nodes: list, max_chars: int, out: List[Tuple[str, str]]):
+    """
+    Packs consecutive nodes into chunks of at most max_chars. A single node larger than
+    max_chars is split on its children.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+    for node in nodes:
+        html = str(node)
+        if len(html) > max_chars and isinstance(node, Tag) and node.contents:
+            if current:
+                chunks.append("".join(current))
+                current, size = [], 0
+            nested: List[Tuple[str, str]] = []
+            _pack(name, list(node.contents), max_chars, nested)
+            chunks.extend(html for _, html in nested)
+            continue
+        if current and size + len(html) > max_chars:
+            chunks.append("".join(current))
+            current, size = [], 0
+        current.append(html)
+        size += len(html)
+    if current:
+        chunks.append("".join(current))
+
+    chunks = [chunk for chunk in chunks if chunk.strip()]
+    if len(chunks) == 1:
+        out.append((name, chunks[0]))
+    else:
+        out.extend((f"{name} (part {i}/{len(chunks)})", chunk) for i, chunk in enumerate(chunks, 1))
+
+
+def split_regions(snapshot: BeautifulSoup, max_chars: int) -> List[Tuple[str, str]]:
+    """
+    Splits a distilled page snapshot into semantic regions (header, nav, main, forms, dialogs...)
+    in document order. Returns a list of (region name, region html), with no region above
+    max_chars unless a single element can't be split further.
+    """
+    landmarks: List[Tuple[str, Tag]] = []
+    other: List = []
+
+    def walk(node):
+        for child in node.children:
+            if isinstance(child, Tag):
+                if _is_region(child):
+                    landmarks.append((_region_name(child), child))
+                elif child.select_one(REGION_SELECTOR):
+                    walk(child)
+                else:
+                    other.append(child)
+            elif str(child).strip():
+                other.append(child)
+
+    walk(snapshot.body or snapshot)
+
+    regions: List[Tuple[str, str]] = []
+    for name, tag in landmarks:
+        _pack(name, [tag], max_chars, regions)
+    if other:
+        _pack("content", other, max_chars, regions)
+    return regions
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    """
+    Region analysis shares one bounded pool of SACCESSCO_ANALYSIS_POOL_SIZE threads across all
+    conversations, so a burst of large pages can't open an unbounded number of concurrent LLM calls.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=getattr(settings, "SACCESSCO_ANALYSIS_POOL_SIZE", 4),
+                                           thread_name_prefix="PageRegion-")
+    return _pool
+
+
+def analyse_regions(ai_engine, regions: List[Tuple[str, str]], title: str = "") -> str:
+    """
+    Analyses every region concurrently with AIEngine.respond_once and merges the per-region
+    function catalogs into a single page analysis. Regions that fail are left out.
+    """
+    page = f" of the page '{title}'" if title else ""
+
+    def _analyse(index, name, html):
+        prompt = (f"PAGE CHANGE\n"
+                  f"This is the '{name}' region ({index}/{len(regions)}){page}, which is too large to send at once. "
+                  f"Analyse only the functions available in this region.\n{html}")
+        return ai_engine.respond_once(User, prompt)
+
+    pool = _get_pool()
+    futures = [(name, pool.submit(_analyse, i, name, html)) for i, (name, html) in enumerate(regions, 1)]
+
+    sections = []
+    for name, future in futures:
+        try:
+            sections.append(f"## Region: {name}\n{future.result()}")
+        except Exception as e:
+            logger.error(f"Analysis of page region '{name}' failed: {e}", exc_info=True)
+    if not sections:
+        raise RuntimeError("Analysis failed for all page regions")
+    return "PAGE ANALYSIS (merged from page regions)\n\n" + "\n\n".join(sections)
@@ -0,0 +1,143 @@
+import re
+import threading
+from collections import deque
+from typing import Deque, Dict, List, NamedTuple, Optional
+
+# Parameter name keywords -> slot type, checked in order
+_TYPE_KEYWORDS = [
+    ("email", ("email", "e-mail", "mail")),
+    ("phone", ("phone", "telephone", "mobile", "tel")),
+    ("date", ("date", "day", "when", "depart", "return", "checkin", "checkout", "arrival")),
+    ("location", ("city", "destination", "origin", "from", "to", "airport", "location", "place", "address")),
+    ("name", ("name",)),
+    ("number", ("count", "number", "adults", "children", "passengers", "guests", "quantity", "rooms")),
+]
+# Parameters that are never remembered nor filled in: the user has to say them each time
+_SENSITIVE_KEYWORDS = ("password", "passcode", "pin", "cvv", "cvc", "card", "otp", "secret", "token", "iban")
+
+_MONTHS = ("jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|"
+           "sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?")
+_DATE_RE = re.compile(
+    rf"\b(?:\d{{1,2}}(?:st|nd|rd|th)?(?:\s+of)?\s+(?:{_MONTHS})\.?(?:,?\s+\d{{4}})?"
+    rf"|(?:{_MONTHS})\.?\s+\d{{1,2}}(?:st|nd|rd|th)?(?:,?\s+\d{{4}})?"
+    rf"|\d{{4}}-\d{{2}}-\d{{2}}|\d{{1,2}}/\d{{1,2}}/\d{{2,4}})\b",
+    re.IGNORECASE,
+)
+_EMAIL_RE = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+
+# Values found in user prompts are only reused from this many of the latest prompts,
+# and at most this many from each prompt
+RECENT_PROMPTS = 3
+MAX_SLOTS_PER_PROMPT = 8
+
+# Words of snake_case, kebab-case and camelCase names
+_WORD_RE = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+
+
+class Slot(NamedTuple):
+    # Parameter name the value was given for, or None for a value found in a user prompt
+    name: Optional[str]
+    type: Optional[str]
+    value: object
+
+
+def _words(parameter_name: str) -> List[str]:
+    words = [word.lower() for word in _WORD_RE.findall(parameter_name)]
+    # The words run together too, so 'check_in' matches 'checkin'
+    return words + ["".join(words)] if len(words) > 1 else words
+
+
+def _matches(words: List[str], keywords) -> bool:
+    # Short keywords must be whole words ('to', not 'total'); longer ones may prefix a word ('departure')
+    return any(word == keyword or (len(keyword) > 3 and word.startswith(keyword))
+               for keyword in keywords for word in words)
+
+
+def slot_type(parameter_name: str) -> Optional[str]:
+    """
+    Infers the type of a plan parameter from its name, e.g. 'departure_date' -> 'date'.
+    """
+    words = _words(parameter_name)
+    for type_, keywords in _TYPE_KEYWORDS:
+        if _matches(words, keywords):
+            return type_
+    return None
+
+
+def is_sensitive(parameter_name: str) -> bool:
+    return _matches(_words(parameter_name), _SENSITIVE_KEYWORDS)
+
+
+class SlotMemory:
+    """
+    Typed values said or resolved earlier in a conversation, used to fill in the plan
+    parameters the model left null instead of asking the user for them again.
+    Values given for a parameter are reused for a parameter of the same name. Values found
+    in the latest user prompts (dates, emails) are reused for a parameter of their type, but
+    only when there is a single candidate, as two dates could be the departure or the return,
+    and when no other parameter of the plan has a value of that type, as the date said may
+    be the departure's already given. A value another parameter of the plan has is never
+    filled in.
+    """
+
+    def __init__(self, recent_prompts: int = RECENT_PROMPTS):
+        self._named: Dict[str, Slot] = {}
+        self._said: Deque[List[Slot]] = deque(maxlen=recent_prompts)
+        self._lock = threading.Lock()
+
+    def observe_prompt(self, prompt: str):
+        found = [Slot(None, "date", m.group(0)) for m in _DATE_RE.finditer(prompt or "")]
+        found += [Slot(None, "email", m.group(0)) for m in _EMAIL_RE.finditer(prompt or "")]
+        with self._lock:
+            self._said.append(found[:MAX_SLOTS_PER_PROMPT])
+
+    def observe_parameters(self, parameters: dict):
+        if not isinstance(parameters, dict):
+            return
+        with self._lock:
+            for name, value in parameters.items():
+                if value is None or value == "" or not isinstance(name, str) or is_sensitive(name):
+                    continue
+                self._named[name] = Slot(name, slot_type(name), value)
+
+    def lookup(self, parameter_name: str) -> Optional[Slot]:
+        """
+        Returns the remembered slot for a parameter, or None when it is unknown or ambiguous.
+        """
+        if is_sensitive(parameter_name):
+            return None
+        with self._lock:
+            slot = self._named.get(parameter_name)
+            if slot is not None:
+                return slot
+            type_ = slot_type(parameter_name)
+            if type_ is None:
+                return None
+            candidates = {slot.value: slot for said in self._said for slot in said if slot.type == type_}
+        return next(iter(candidates.values())) if len(candidates) == 1 else None
+
+    def resolve(self, parameters: dict) -> Dict[str, object]:
+        """
+        Fills in the null parameters that can be resolved from memory, in place.
+        Returns the parameters that were filled in.
+        """
+        resolved = {}
+        if not isinstance(parameters, dict):
+            return resolved
+        used = [value for value in parameters.values() if value is not None]
+        given_types = {slot_type(name) for name, value in parameters.items()
+                       if value is not None and isinstance(name, str)}
+        for name, value in parameters.items():
+            if value is None and isinstance(name, str):
+                slot = self.lookup(name)
+                if slot is None or slot.value in used or (slot.name is None and slot.type in given_types):
+                    continue
+                resolved[name] = slot.value
+                used.append(slot.value)
+        parameters.update(resolved)
+        return resolved
+
+    def clear(self):
+        with self._lock:
+            self._named.clear()
+            self._said.clear()
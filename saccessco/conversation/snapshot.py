@@ -0,0 +1,77 @@
+import logging
+import re
+from functools import lru_cache
+from typing import List, Optional
+
+import soupsieve
+from bs4 import BeautifulSoup, Comment
+
+logger = logging.getLogger("saccessco")
+
+# Actions that can change the DOM. Once a plan step performs one of these, the
+# snapshot no longer describes the page the following steps will run against,
+# so their selectors can't be checked server side.
+DOM_CHANGING_ACTIONS = {"typeInto", "click", "enter", "submitForm", "checkCheckbox", "checkRadioButton",
+                        "selectOptionByValue", "selectOptionByIndex"}
+
+# Mirrors skyscannerDates.isDateSelector in skyscanner_dates.js: date cells are located by
+# scrolling the calendar on the client, so they don't have to exist in the snapshot.
+_DATE_SELECTOR_RE = re.compile(
+    r"""^\[aria-label\*=(["'“”‘’])(?:(?:[A-Za-z]+)\s+\d{1,2}|\d{1,2}\s+[A-Za-z]+)(?:,\s*|\s+)\d{4}\.?\1\]$""",
+    re.IGNORECASE,
+)
+_MULTI_ARIA_LABEL_RE = re.compile(r"\[aria-label\*\=.*?\]\[aria-label\*\=.*?\]", re.IGNORECASE)
+
+# Elements that carry no user facing functionality and are dropped from the snapshot
+NON_CONTENT_TAGS = ["script", "style", "noscript", "template"]
+
+
+def parse_snapshot(html: str) -> BeautifulSoup:
+    """
+    Parses a page change HTML into a distilled tree that plan selectors can be matched against
+    and that page regions are cut from. Scripts, styles and comments are removed.
+    """
+    snapshot = BeautifulSoup(html, "html.parser")
+    for tag in snapshot.find_all(NON_CONTENT_TAGS):
+        tag.decompose()
+    for comment in snapshot.find_all(string=lambda text: isinstance(text, Comment)):
+        comment.extract()
+    return snapshot
+
+
+def is_date_selector(selector: str) -> bool:
+    return bool(_DATE_SELECTOR_RE.match(selector) or _MULTI_ARIA_LABEL_RE.search(selector))
+
+
+@lru_cache(maxsize=512)
+def _compile(selector: str):
+    return soupsieve.compile(selector)
+
+
+def count_selector_matches(snapshot: Optional[BeautifulSoup], plan: list) -> List[Optional[int]]:
+    """
+    Returns, per plan step, how many elements of the snapshot its selector matches.
+    None means the step can't be checked: there is no snapshot, the selector is a
+    calendar date, it could not be compiled, or an earlier step may have changed the page.
+    """
+    counts: List[Optional[int]] = []
+    checkable = snapshot is not None
+    for step in plan or []:
+        selector = step.get("selector") if isinstance(step, dict) else None
+        count = None
+        if checkable and isinstance(selector, str) and selector and not is_date_selector(selector):
+            try:
+                count = len(_compile(selector).select(snapshot))
+            except Exception as e:
+                logger.debug("Selector %r could not be checked against the snapshot: %s", selector, e)
+        counts.append(count)
+        if isinstance(step, dict) and step.get("action") in DOM_CHANGING_ACTIONS:
+            checkable = False
+    return counts
+
+
+def dead_selectors(plan: list, counts: List[Optional[int]]) -> List[str]:
+    """
+    Returns the selectors of the steps that are certain to time out on the client.
+    """
+    return [step["selector"] for step, count in zip(plan, counts) if count == 0]
@@ -0,0 +1,95 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+
+from saccessco.utils import fastjson
+from saccessco.validators import validate_ai_response
+
+logger = logging.getLogger("saccessco")
+
+_streams: Dict[str, "ResponseStream"] = {}
+_streams_lock = threading.Lock()
+
+
+class ResponseStream:
+    """
+    The AI responses of one conversation, numbered 1, 2, 3... in the order they are sent.
+    The last max_frames encoded frames are kept, so a socket that (re)connects after a
+    response was sent can be given the frames it missed.
+    """
+
+    def __init__(self, max_frames: int = 32):
+        self.max_frames = max_frames
+        self.last_seq = 0
+        self._frames: "deque[Tuple[int, str]]" = deque(maxlen=max_frames)
+        self._lock = threading.Lock()
+
+    def publish(self, message: dict, send: Callable[[int, str], None]) -> int:
+        """
+        Numbers the message (its "seq" key), encodes it, keeps it for replay and calls
+        send(seq, text). Publishing is serialised, so frames are sent in sequence order.
+        """
+        with self._lock:
+            seq = self.last_seq + 1
+            text = fastjson.dumps({**message, "seq": seq})
+            self.last_seq = seq
+            if self.max_frames > 0:
+                self._frames.append((seq, text))
+            send(seq, text)
+        return seq
+
+    def since(self, last_seq: int) -> List[Tuple[int, str]]:
+        """
+        Returns the kept (seq, text) frames numbered after last_seq, oldest first.
+        """
+        with self._lock:
+            frames = [frame for frame in self._frames if frame[0] > last_seq]
+            oldest = self._frames[0][0] if self._frames else self.last_seq + 1
+        if last_seq + 1 < oldest:
+            logger.warning(f"Frames {last_seq + 1} to {oldest - 1} are no longer kept and can't be replayed.")
+        return frames
+
+
+def get_stream(conversation_id: str) -> ResponseStream:
+    with _streams_lock:
+        stream = _streams.get(conversation_id)
+        if stream is None:
+            stream = _streams[conversation_id] = ResponseStream(getattr(settings, "SACCESSCO_REPLAY_FRAMES", 32))
+        return stream
+
+
+def find_stream(conversation_id: str) -> Optional[ResponseStream]:
+    """
+    Returns the conversation's stream if it has sent anything in this process.
+    """
+    return _streams.get(conversation_id)
+
+
+def replay(conversation_id: str, last_seq: int) -> Tuple[int, List[Tuple[int, str]]]:
+    """
+    Returns the seq a client that got responses up to last_seq is actually at, and the kept
+    frames after it. A client ahead of the stream saw responses numbered by a server process
+    that has since restarted: it is at 0 again.
+    """
+    stream = find_stream(conversation_id)
+    if last_seq > (stream.last_seq if stream is not None else 0):
+        logger.info(f"Client of conversation {conversation_id} is ahead of its responses, starting again.")
+        last_seq = 0
+    return last_seq, stream.since(last_seq) if stream is not None else []
+
+
+def frame_text(event: dict) -> Optional[str]:
+    """
+    The JSON frame of an 'ai_response' channel layer event, or None if it isn't valid.
+    Conversation validates and encodes the frame once for all subscribers.
+    """
+    text = event.get("text")
+    if text is None:
+        # Events carrying the response object itself (tests, manual clients)
+        if not validate_ai_response(event):
+            return None
+        text = fastjson.dumps(event)
+    return text
@@ -0,0 +1,224 @@
+# saccessco/layers.py
+import asyncio
+import logging
+import threading
+import time
+
+from channels.exceptions import ChannelFull
+from channels_redis.core import RedisChannelLayer
+from redis.asyncio import BlockingConnectionPool
+
+logger = logging.getLogger('saccessco')
+
+
+class LocalFirstRedisChannelLayer(RedisChannelLayer):
+    """
+    RedisChannelLayer that hands messages for channels owned by this process straight to the
+    receiving event loop, and only goes through Redis for channels owned by other processes.
+
+    Group membership is still kept in Redis, so groups spanning several workers keep working:
+    group_send reads the members, delivers to the local ones in process and sends to the
+    remote ones through Redis, in one batched script call per Redis connection as
+    RedisChannelLayer does. Local messages are queued in an inbox that receive_single races
+    against the pending Redis pop, which is left running rather than cancelled so no Redis
+    message can be lost. They are held to the layer's capacity, per channel, and expiry,
+    as messages queued in Redis are.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # redis-py times reads out after 5 seconds by default, as long as receive_single's blocking
+        # pop waits for a message: idle receivers failed with TimeoutError
+        self.hosts = [{"socket_timeout": self.brpop_timeout + 5, **host} for host in self.hosts]
+        self.local_deliveries = 0
+        self.remote_deliveries = 0
+        # Event loop the consumers of this process receive on, and its inbox of
+        # (channel, message) tuples delivered in process
+        self._local_loop = None
+        self._local_inbox = None
+        self._redis_receives = {}
+        # Channel -> its messages in the inbox, for the capacity; updated from the senders' threads
+        self._local_pending = {}
+        self._local_pending_lock = threading.Lock()
+
+    def create_pool(self, index):
+        # redis-py's ConnectionPool raises MaxConnectionsError when all its connections are in use:
+        # a burst of clients joining groups at once failed. This one waits for a free connection.
+        host = dict(self.hosts[index])
+        if "master_name" in host:
+            return super().create_pool(index)
+        address = host.pop("address", None)
+        if address is not None:
+            return BlockingConnectionPool.from_url(address, **host)
+        return BlockingConnectionPool(**host)
+
+    def _is_local(self, channel):
+        return "!" in channel and self.non_local_name(channel).endswith(self.client_prefix + "!")
+
+    def _deliver_local(self, channel, message):
+        """
+        Queues the message for a channel of this process. Returns False when no event loop
+        receives here (yet), so the caller falls back to Redis. Raises ChannelFull when the
+        channel has its capacity of messages waiting.
+        """
+        loop, inbox = self._local_loop, self._local_inbox
+        if loop is None or loop.is_closed():
+            return False
+        with self._local_pending_lock:
+            pending = self._local_pending.get(channel, 0)
+            if pending >= self.get_capacity(channel):
+                raise ChannelFull()
+            self._local_pending[channel] = pending + 1
+        item = (channel, dict(message), time.time() + self.expiry)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            inbox.put_nowait(item)
+        else:
+            try:
+                loop.call_soon_threadsafe(inbox.put_nowait, item)
+            except RuntimeError:
+                # The loop closed in the meantime
+                self._taken_local(channel)
+                return False
+        self.local_deliveries += 1
+        return True
+
+    def _taken_local(self, channel):
+        with self._local_pending_lock:
+            pending = self._local_pending.pop(channel, 0) - 1
+            if pending > 0:
+                self._local_pending[channel] = pending
+
+    def _take_local(self, item):
+        """
+        The (channel, message) of an inbox item, or None when it expired.
+        """
+        channel, message, expires = item
+        self._taken_local(channel)
+        if time.time() > expires:
+            logger.info("Message for %s expired in the local inbox", channel)
+            return None
+        return channel, message
+
+    async def send(self, channel, message):
+        if self._is_local(channel) and self._deliver_local(channel, message):
+            return
+        self.remote_deliveries += 1
+        await super().send(channel, message)
+
+    async def group_send(self, group, message):
+        assert self.require_valid_group_name(group), "Group name not valid"
+        key = self._group_key(group)
+        connection = self.connection(self.consistent_hash(group))
+        # Discard old channels and read the members in one round trip
+        async with connection.pipeline(transaction=False) as pipe:
+            pipe.zremrangebyscore(key, min=0, max=int(time.time()) - self.group_expiry)
+            pipe.zrange(key, 0, -1)
+            _, members = await pipe.execute()
+
+        remote = []
+        for member in members:
+            channel = member.decode("utf8")
+            try:
+                if self._is_local(channel) and self._deliver_local(channel, message):
+                    continue
+            except ChannelFull:
+                # Dropped, as RedisChannelLayer.group_send does for channels over capacity
+                logger.info("%s of group %s over capacity", channel, group)
+                continue
+            remote.append(channel)
+        if remote:
+            self.remote_deliveries += len(remote)
+            await self._group_send_remote(group, remote, message)
+
+    # RedisChannelLayer.group_send's script: adds the message to each channel under its capacity
+    GROUP_SEND_LUA = """
+        local over_capacity = 0
+        local current_time = ARGV[#ARGV - 1]
+        local expiry = ARGV[#ARGV]
+        for i=1,#KEYS do
+            if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+                redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+                redis.call('EXPIRE', KEYS[i], expiry)
+            else
+                over_capacity = over_capacity + 1
+            end
+        end
+        return over_capacity
+    """
+
+    async def _group_send_remote(self, group, channels, message):
+        """
+        Sends the message to channels of other processes as RedisChannelLayer.group_send does:
+        per Redis connection, expired messages are discarded and the message added to every
+        channel in one round trip.
+        """
+        connection_to_keys, key_to_message, key_to_capacity = self._map_channel_keys_to_connection(channels, message)
+        for index, keys in connection_to_keys.items():
+            async with self.connection(index).pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.zremrangebyscore(key, min=0, max=int(time.time()) - int(self.expiry))
+                pipe.eval(self.GROUP_SEND_LUA, len(keys), *keys, *[key_to_message[key] for key in keys],
+                          *[key_to_capacity[key] for key in keys], time.time(), self.expiry)
+                over_capacity = (await pipe.execute())[-1]
+            if over_capacity > 0:
+                logger.info("%s of %s channels over capacity in group %s", over_capacity, len(channels), group)
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if loop is not self._local_loop:
+            self._local_loop = loop
+            self._local_inbox = asyncio.Queue()
+            self._redis_receives = {}
+
+    async def new_channel(self, prefix="specific"):
+        # Consumers create their channel on the loop they receive on, so messages sent to it
+        # from now on can be queued locally even before its first receive()
+        self._bind_loop()
+        return await super().new_channel(prefix)
+
+    async def receive_single(self, channel):
+        if "!" not in channel:
+            return await super().receive_single(channel)
+
+        self._bind_loop()
+        inbox = self._local_inbox
+        while not inbox.empty():
+            received = self._take_local(inbox.get_nowait())
+            if received is not None:
+                return received
+
+        redis_receive = self._redis_receives.get(channel)
+        if redis_receive is None:
+            redis_receive = asyncio.ensure_future(super().receive_single(channel))
+            self._redis_receives[channel] = redis_receive
+        while True:
+            local_receive = asyncio.ensure_future(inbox.get())
+            try:
+                await asyncio.wait([redis_receive, local_receive], return_when=asyncio.FIRST_COMPLETED)
+            except asyncio.CancelledError:
+                if local_receive.done() and not local_receive.cancelled():
+                    # Keep the message for the next receiver
+                    inbox.put_nowait(local_receive.result())
+                raise
+            finally:
+                local_receive.cancel()
+
+            if local_receive.done() and not local_receive.cancelled():
+                received = self._take_local(local_receive.result())
+                if received is not None:
+                    # A finished Redis pop stays stored and is returned by the next call
+                    return received
+                if not redis_receive.done():
+                    continue
+            del self._redis_receives[channel]
+            return redis_receive.result()
+
+    async def flush(self):
+        for redis_receive in self._redis_receives.values():
+            redis_receive.cancel()
+        self._redis_receives = {}
+        await super().flush()
@@ -0,0 +1,143 @@
+# saccessco/logpipeline.py
+"""
+Non-blocking logging, and payloads that are cheap to log.
+
+configure() is Django's LOGGING_CONFIG: it applies the LOGGING dict as usual, then moves the
+handlers of every logger behind a queue. The logging thread only formats the record and puts
+it on the queue; a listener thread per set of handlers writes the files and the console, so a
+slow disk never holds up a request or a conversation. A full queue drops records rather than
+block, and counts them in dropped_records(). Listeners stop, writing what is queued, at exit.
+
+payload() wraps a page, prompt or response for logging. It is only turned into text when a
+record is emitted, and then truncated to SACCESSCO_LOG_PAYLOAD_CHARS with its length and a
+hash, unless its conversation is sampled: a SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE fraction of
+conversations, picked by their ID, so a sampled conversation logs all its payloads in full.
+"""
+import atexit
+import hashlib
+import logging
+import logging.config
+import queue
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import List, Optional
+
+from django.conf import settings
+
+_conversation: ContextVar[Optional[str]] = ContextVar("saccessco_log_conversation", default=None)
+_listeners: List[QueueListener] = []
+_queue_handlers: List["DroppingQueueHandler"] = []
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    A QueueHandler that drops records when its queue is full, rather than block or complain.
+    """
+
+    def __init__(self, queue_):
+        super().__init__(queue_)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure(config: dict):
+    """
+    Applies the logging config, then puts a queue in front of the handlers of each logger.
+    """
+    stop()
+    logging.config.dictConfig(config)
+    maxsize = getattr(settings, "SACCESSCO_LOG_QUEUE_SIZE", 10000)
+    names = [None] + list(config.get("loggers", {}))
+    queued = {}  # One queue and listener per set of handlers, shared by the loggers using it
+    for name in names:
+        logger = logging.getLogger(name)
+        handlers = [handler for handler in logger.handlers if not isinstance(handler, QueueHandler)]
+        if not handlers:
+            continue
+        key = tuple(id(handler) for handler in handlers)
+        if key not in queued:
+            queue_handler = DroppingQueueHandler(queue.Queue(maxsize))
+            # Records no handler would write are dropped before they're formatted
+            queue_handler.setLevel(min(handler.level for handler in handlers))
+            listener = QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+            listener.start()
+            _listeners.append(listener)
+            _queue_handlers.append(queue_handler)
+            queued[key] = queue_handler
+        for handler in handlers:
+            logger.removeHandler(handler)
+        logger.addHandler(queued[key])
+
+
+def stop():
+    """
+    Stops the listeners, once they've written the records queued so far.
+    """
+    while _listeners:
+        _listeners.pop().stop()
+    _queue_handlers.clear()
+
+
+atexit.register(stop)
+
+
+def dropped_records() -> int:
+    return sum(handler.dropped for handler in _queue_handlers)
+
+
+def set_conversation(conversation_id: Optional[str]):
+    """
+    Makes conversation_id the default of payload() on this thread: conversations call it
+    when their worker thread starts.
+    """
+    _conversation.set(conversation_id)
+
+
+def is_sampled(conversation_id: Optional[str]) -> bool:
+    """
+    Whether the conversation logs its payloads in full. The same for every process.
+    """
+    rate = getattr(settings, "SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE", 0.0)
+    if rate <= 0 or conversation_id is None:
+        return rate >= 1
+    digest = hashlib.blake2b(str(conversation_id).encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") < rate * 2 ** 64
+
+
+class Payload:
+    """
+    A value to log, see payload().
+    """
+    __slots__ = ("value", "conversation_id")
+
+    def __init__(self, value, conversation_id: Optional[str]):
+        self.value = value
+        self.conversation_id = conversation_id
+
+    def __str__(self):
+        text = self.value if isinstance(self.value, str) else repr(self.value)
+        limit = getattr(settings, "SACCESSCO_LOG_PAYLOAD_CHARS", 200)
+        if len(text) <= limit or is_sampled(self.conversation_id):
+            return text
+        digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=8).hexdigest()
+        return f"{text[:limit]}... [{len(text)} chars, blake2b {digest}]"
+
+    __repr__ = __str__
+
+
+def payload(value, conversation_id: Optional[str] = None) -> Payload:
+    """
+    value for a log record argument, truncated and hashed unless its conversation is sampled.
+    The conversation is conversation_id, else value's "conversation_id" if it is a request,
+    else that of the conversation thread logging it.
+    """
+    if conversation_id is None and isinstance(value, dict):
+        conversation_id = value.get("conversation_id")
+    if conversation_id is None:
+        conversation_id = _conversation.get()
+    return Payload(value, conversation_id)
@@ -0,0 +1,143 @@
+# saccessco/metrics.py
+"""
+Prometheus metrics of the conversation engine, exposed on /metrics.
+
+Updating a metric is a lock and an add, so the conversation's hot paths only ever do that:
+anything costlier (reading queues, aggregating) happens when Prometheus scrapes. With
+several worker processes, set the PROMETHEUS_MULTIPROC_DIR environment variable to an
+empty directory before they start: each process then writes its values to memory mapped
+files there, and /metrics adds them up. Gauges of live things count only the processes
+still running: a scrape drops the gauge files of the others.
+"""
+import glob
+import os
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+try:
+    import prometheus_client
+    from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+except ImportError:  # pragma: no cover - prometheus_client is in requirements.txt
+    prometheus_client = None
+
+
+class _NullMetric:
+    """Stands in for every metric when prometheus_client isn't installed."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount=1):
+        pass
+
+    def dec(self, amount=1):
+        pass
+
+    def observe(self, amount):
+        pass
+
+
+if prometheus_client is None:  # pragma: no cover
+    Counter = Gauge = Histogram = _NullMetric
+
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if prometheus_client is not None else "text/plain; charset=utf-8"
+
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+SEND_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+LIVE_CONVERSATIONS = Gauge(
+    "saccessco_live_conversations", "Conversations held in memory.",
+    multiprocess_mode="livesum")
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "saccessco_executor_queue_depth", "Prompts and page changes waiting for their conversation's executor.",
+    multiprocess_mode="livesum")
+LLM_IN_FLIGHT = Gauge(
+    "saccessco_llm_in_flight", "LLM calls in progress.", ["provider"],
+    multiprocess_mode="livesum")
+LLM_SECONDS = Histogram(
+    "saccessco_llm_seconds", "Duration of LLM calls.", ["provider", "model"], buckets=LLM_BUCKETS)
+LLM_PROMPT_TOKENS = Counter(
+    "saccessco_llm_prompt_tokens", "Prompt tokens sent to LLMs.", ["provider", "model"])
+LLM_COMPLETION_TOKENS = Counter(
+    "saccessco_llm_completion_tokens", "Completion tokens received from LLMs.", ["provider", "model"])
+PLAN_VALIDATION_FAILURES = Counter(
+    "saccessco_plan_validation_failures",
+    "AI responses failing validation: 'schema' (not sent as is) or 'dead_selectors' (selectors matching nothing).",
+    ["reason"])
+WEBSOCKET_CONNECTIONS = Gauge(
+    "saccessco_websocket_connections", "Open AI WebSocket connections.",
+    multiprocess_mode="livesum")
+CHANNEL_SEND_SECONDS = Histogram(
+    "saccessco_channel_send_seconds", "Duration of group_send calls delivering AI responses.",
+    buckets=SEND_BUCKETS)
+PAGE_CHANGE_BYTES = Counter(
+    "saccessco_page_change_bytes", "Size of the page changes received (characters for WebSocket text frames).",
+    ["transport"])
+
+
+@contextmanager
+def llm_call(provider: str, model: str):
+    """
+    Counts an LLM call in progress and observes its duration, which is the seconds
+    attribute of the value it yields afterwards.
+    """
+    in_flight = LLM_IN_FLIGHT.labels(provider)
+    in_flight.inc()
+    call = SimpleNamespace(seconds=0.0)
+    started = time.perf_counter()
+    try:
+        yield call
+    finally:
+        in_flight.dec()
+        call.seconds = time.perf_counter() - started
+        LLM_SECONDS.labels(provider, model or "").observe(call.seconds)
+
+
+def record_usage(provider: str, model: str, usage):
+    """
+    Counts the tokens of an engine's last_usage: {"prompt_tokens": n, "cached_tokens": c, "completion_tokens": m},
+    or None.
+    """
+    if not usage:
+        return
+    LLM_PROMPT_TOKENS.labels(provider, model or "").inc(usage.get("prompt_tokens") or 0)
+    LLM_COMPLETION_TOKENS.labels(provider, model or "").inc(usage.get("completion_tokens") or 0)
+
+
+def _forget_dead_processes(path: str):
+    """
+    Removes the live gauge files of the worker processes that are gone, since no process
+    manager reports their exit to multiprocess.mark_process_dead.
+    """
+    pids = set()
+    for name in glob.glob(os.path.join(path, "gauge_live*_*.db")):
+        pid = os.path.basename(name)[:-len(".db")].rsplit("_", 1)[1]
+        if pid.isdigit():
+            pids.add(int(pid))
+    for pid in pids:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            multiprocess.mark_process_dead(pid, path)
+        except PermissionError:
+            pass  # Running as another user
+
+
+def exposition() -> bytes:
+    """
+    The metrics in the Prometheus text format, of all processes in multiprocess mode.
+    """
+    if prometheus_client is None:
+        return b"# prometheus_client is not installed\n"
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        _forget_dead_processes(path)
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry)
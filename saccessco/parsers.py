@@ -0,0 +1,27 @@
+# saccessco/parsers.py
+import codecs
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from saccessco.utils import fastjson
+
+
+class FastJSONParser(JSONParser):
+    """
+    JSONParser decoding with orjson when it is installed. Page changes POST megabytes of
+    HTML: the body is decoded in one call on its bytes instead of through the json module
+    and a decoding stream reader.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        data = stream.read()
+        if codecs.lookup(encoding).name != 'utf-8':
+            data = data.decode(encoding)
+        try:
+            return fastjson.loads(data)
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
@@ -0,0 +1,26 @@
+# saccessco/permissions.py
+import hmac
+
+from django.conf import settings
+from rest_framework.permissions import BasePermission
+
+
+def has_ops_token(request) -> bool:
+    """
+    Whether the request may use the operator endpoints (traces, usage, profiles, metrics): it
+    carries "Authorization: Bearer <SACCESSCO_OPS_TOKEN>", or no token is set.
+    """
+    token = getattr(settings, "SACCESSCO_OPS_TOKEN", None)
+    if not token:
+        return True
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}")
+
+
+class HasOpsToken(BasePermission):
+    """
+    The operator endpoints' permission, see has_ops_token().
+    """
+    message = "The operator endpoints need the SACCESSCO_OPS_TOKEN bearer token."
+
+    def has_permission(self, request, view):
+        return has_ops_token(request)
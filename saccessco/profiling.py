@@ -0,0 +1,308 @@
+# saccessco/profiling.py
+"""
+On-demand sampling profiles of page changes, conversation work and WebSocket handlers.
+
+A profile is wanted for a request with the X-Saccessco-Profile: 1 header (?profile=1 on a
+WebSocket URL), or for every request of a conversation switched on with POST
+/saccessco/profile/ or SACCESSCO_PROFILE_CONVERSATIONS. It covers the code wrapped in
+profile(), which sets a context variable so that the conversation work the request submits
+is profiled too. While a profile runs, a sampler thread reads the stack of the profiled
+thread every SACCESSCO_PROFILE_INTERVAL seconds; when it ends, the samples are handed to a
+writer thread, which writes them to SACCESSCO_PROFILE_DIR as collapsed stacks (.folded, for
+flamegraph.pl or speedscope) and as an SVG flamegraph, keeping the last
+SACCESSCO_PROFILE_MAX_FILES profiles. The profiled request doesn't wait for the files, and
+an error writing them is logged, never raised to it.
+
+When no profile is wanted, profile() returns a shared no-op context manager: no thread, no
+sampling, one lookup per request.
+
+A WebSocket handler runs on the event loop thread, so its profile also samples the other
+coroutines the loop runs while the handler awaits.
+"""
+import html
+import logging
+import os
+import queue
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from contextlib import nullcontext
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from django.conf import settings
+
+logger = logging.getLogger("saccessco")
+
+HEADER = "X-Saccessco-Profile"
+
+_requested: ContextVar[bool] = ContextVar("saccessco_profile", default=False)
+_conversations: Optional[Set[str]] = None
+_active: Dict[int, "Profile"] = {}  # Thread ident -> its profile
+_lock = threading.Lock()
+_sampler: Optional[threading.Thread] = None
+_writer: Optional[threading.Thread] = None
+# Profiles waiting to be written; more are dropped rather than held in memory
+_pending: "queue.Queue[Profile]" = queue.Queue(maxsize=64)
+_DISABLED = nullcontext()
+
+
+def _profiled_conversations() -> Set[str]:
+    global _conversations
+    if _conversations is None:
+        _conversations = set(getattr(settings, "SACCESSCO_PROFILE_CONVERSATIONS", ()))
+    return _conversations
+
+
+def enable_conversation(conversation_id: str, enabled: bool = True):
+    """
+    Profiles every request of the conversation from now on, or no longer.
+    """
+    with _lock:
+        if enabled:
+            _profiled_conversations().add(conversation_id)
+        else:
+            _profiled_conversations().discard(conversation_id)
+
+
+def profiled_conversations() -> List[str]:
+    return sorted(_profiled_conversations())
+
+
+def requested(value) -> bool:
+    """
+    Whether a header or query parameter value asks for a profile.
+    """
+    return bool(value) and value not in ("0", "false") and getattr(settings, "SACCESSCO_PROFILING", False)
+
+
+def wanted(conversation_id: Optional[str] = None) -> bool:
+    """
+    Whether work of the conversation started now is to be profiled: the request asked for
+    it (in this context) or the conversation is switched on.
+    """
+    if _requested.get():
+        return True
+    return conversation_id is not None and conversation_id in _profiled_conversations() \
+        and getattr(settings, "SACCESSCO_PROFILING", False)
+
+
+def profile(name: str, conversation_id: Optional[str] = None, enabled: bool = False):
+    """
+    A context manager profiling the code it wraps when enabled, else a no-op.
+    """
+    return Profile(name, conversation_id) if enabled else _DISABLED
+
+
+class Profile:
+    """
+    Samples the stack of the thread that enters it, until it exits, and then has them written.
+    A thread already being profiled isn't profiled twice: the inner profile does nothing.
+    samples counts the stacks, innermost frame first, as tuples of code objects. path is the
+    flamegraph's, once written (see flush()), or None when it took no sample.
+    """
+
+    def __init__(self, name: str, conversation_id: Optional[str] = None):
+        self.name = name
+        self.conversation_id = conversation_id
+        self.samples: Counter = Counter()
+        self.path: Optional[Path] = None
+        self._thread: Optional[int] = None
+        self._token = None
+
+    def __enter__(self):
+        self._token = _requested.set(True)
+        ident = threading.get_ident()
+        with _lock:
+            if ident not in _active:
+                _active[ident] = self
+                self._thread = ident
+                self.started = time.time()
+                _start_sampler()
+        return self
+
+    def __exit__(self, *exc_info):
+        _requested.reset(self._token)
+        if self._thread is None:
+            return False
+        with _lock:
+            _active.pop(self._thread, None)
+        self.seconds = time.time() - self.started
+        try:
+            self.path = _path(self) if self.samples else None
+            _pending.put_nowait(self)
+            with _lock:
+                _start_writer()
+        except queue.Full:
+            logger.warning(f"Profile of {self.name} dropped: {_pending.maxsize} profiles are waiting to be written.")
+        except Exception as e:
+            logger.error(f"Could not write the profile of {self.name}: {e}", exc_info=True)
+        return False
+
+
+def _start_writer():
+    # Called with the lock held
+    global _writer
+    if _writer is None or not _writer.is_alive():
+        _writer = threading.Thread(target=_write_pending, name="ProfileWriter", daemon=True)
+        _writer.start()
+
+
+def _write_pending():
+    """
+    Writes the profiles handed over by the profiled requests, one at a time.
+    """
+    while True:
+        running = _pending.get()
+        try:
+            write(running)
+        except Exception as e:
+            logger.error(f"Could not write the profile of {running.name}: {e}", exc_info=True)
+        finally:
+            _pending.task_done()
+
+
+def flush():
+    """
+    Waits until the profiles ended so far are written.
+    """
+    _pending.join()
+
+
+def _start_sampler():
+    # Called with the lock held
+    global _sampler
+    if _sampler is None:
+        _sampler = threading.Thread(target=_sample, name="ProfileSampler", daemon=True)
+        _sampler.start()
+
+
+def _label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+
+def _sample():
+    """
+    Samples the profiled threads until there are none.
+    """
+    global _sampler
+    interval = getattr(settings, "SACCESSCO_PROFILE_INTERVAL", 0.005)
+    while True:
+        with _lock:
+            if not _active:
+                # Under the lock, so the next profile started finds no sampler and starts one
+                _sampler = None
+                return
+            active = dict(_active)
+        frames = sys._current_frames()
+        for ident, running in active.items():
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                # Code objects, labelled when the profile is written: it holds the GIL for less
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            if stack:
+                running.samples[tuple(stack)] += 1
+        del frames
+        time.sleep(interval)
+
+
+def collapse(samples: Counter) -> Counter:
+    """
+    Sampled stacks as collapsed stacks: "outer;...;inner" -> samples.
+    """
+    labels = {}
+    collapsed = Counter()
+    for stack, count in samples.items():
+        for code in stack:
+            if code not in labels:
+                labels[code] = _label(code)
+        collapsed[";".join(labels[code] for code in reversed(stack))] += count
+    return collapsed
+
+
+def write(running: Profile) -> Optional[Path]:
+    """
+    Writes the profile's collapsed stacks and flamegraph, and returns the SVG's path, or
+    None when it took no sample.
+    """
+    if not running.samples:
+        logger.info(f"Profile of {running.name} took no sample in {running.seconds * 1000:.1f} ms.")
+        return None
+    svg = _path(running)
+    directory = svg.parent
+    directory.mkdir(parents=True, exist_ok=True)
+    samples = collapse(running.samples)
+    folded = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+    svg.with_suffix(".folded").write_text(folded, encoding="utf-8")
+    title = (f"{running.name} of conversation {running.conversation_id}: {sum(running.samples.values())} samples "
+             f"in {running.seconds * 1000:.0f} ms")
+    svg.write_text(flamegraph(samples, title), encoding="utf-8")
+    _prune(directory, getattr(settings, "SACCESSCO_PROFILE_MAX_FILES", 200))
+    logger.info(f"Profile of {running.name} written to {svg}")
+    return svg
+
+
+def _path(running: Profile) -> Path:
+    """
+    The path of the profile's flamegraph; its collapsed stacks are next to it, as .folded.
+    """
+    directory = Path(getattr(settings, "SACCESSCO_PROFILE_DIR", "profiles"))
+    label = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{running.name}-{running.conversation_id or 'none'}")[:100]
+    return directory / (f"{time.strftime('%Y%m%dT%H%M%S', time.localtime(running.started))}-{label}-"
+                        f"{os.getpid()}-{int(running.started * 1000) % 1000:03d}.svg")
+
+
+def _prune(directory: Path, max_profiles: int):
+    profiles = sorted(directory.glob("*.svg"), key=lambda path: path.stat().st_mtime)
+    for path in profiles[:max(len(profiles) - max_profiles, 0)]:
+        path.unlink(missing_ok=True)
+        path.with_suffix(".folded").unlink(missing_ok=True)
+
+
+def flamegraph(samples: Counter, title: str = "", width: int = 1200, row: int = 16) -> str:
+    """
+    An SVG flamegraph of collapsed stacks: callers below their callees, widths in proportion
+    to the samples. Hover a frame for its name and share.
+    """
+    tree: dict = {}
+    for stack, count in samples.items():
+        node = tree
+        for name in stack.split(";"):
+            entry = node.setdefault(name, [0, {}])
+            entry[0] += count
+            node = entry[1]
+    total = sum(samples.values())
+
+    def _depth(node):
+        return 1 + max((_depth(children) for _, children in node.values()), default=0)
+
+    height = (_depth(tree) + 1) * row + 10
+    scale = (width - 20) / total
+    boxes = []
+
+    def _draw(node, x, depth):
+        for name, (count, children) in sorted(node.items()):
+            w = count * scale
+            if w >= 0.3:
+                y = height - (depth + 1) * row - 5
+                hue = zlib.crc32(name.encode("utf-8")) % 60
+                tooltip = html.escape(f"{name}: {count} samples ({count / total:.1%})")
+                text = html.escape(name[:int(w / 7)]) if w > 21 else ""
+                boxes.append(
+                    f'<g><title>{tooltip}</title><rect x="{x:.1f}" y="{y}" width="{w:.1f}" height="{row - 1}" '
+                    f'fill="hsl({hue},85%,{55 + hue % 10}%)" rx="2"/>'
+                    f'<text x="{x + 3:.1f}" y="{y + row - 4}">{text}</text></g>')
+                _draw(children, x, depth + 1)
+            x += w
+
+    _draw(tree, 10.0, 0)
+    return (f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height + row}" '
+            f'font-family="monospace" font-size="11">'
+            f'<text x="10" y="{row}" font-size="13">{html.escape(title)}</text>'
+            + "".join(boxes) + "</svg>\n")
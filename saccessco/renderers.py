@@ -0,0 +1,26 @@
+# saccessco/renderers.py
+from rest_framework.renderers import JSONRenderer
+
+from saccessco.utils import fastjson
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson when it is installed. Indented output (the browsable
+    API), ASCII-only output (UNICODE_JSON off) and data orjson can't encode (e.g. integers
+    over 64 bits) are left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = fastjson.dumps_bytes(data, default=self.encoder_class().default)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Escaped like JSONRenderer does, so the output is a strict JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -6,3 +6,9 @@ websocket_urlpatterns = [
     re_path(r'^ws/saccessco/ai/(?P<conversation_id>[^/]+)/$', consumers.AiConsumer.as_asgi()),
 ]
 
+
+# Served by Channels ahead of Django: see ResponseHttpConsumer
+http_urlpatterns = [
+    path('saccessco/events/<str:conversation_id>/', consumers.ResponseEventsConsumer.as_asgi()),
+    path('saccessco/poll/<str:conversation_id>/', consumers.ResponsePollConsumer.as_asgi()),
+]
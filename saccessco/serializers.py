@@ -1,5 +1,44 @@
 # serializers.py
+import re
+
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.validators import ProhibitSurrogateCharactersValidator
+
+_SURROGATE = re.compile('[\ud800-\udfff]')
+
+
+class LargeTextField(serializers.CharField):
+    """
+    CharField for megabytes of text, such as page HTML. It checks the same things without
+    copying the text or walking it in Python: CharField strips it twice and looks for
+    surrogate characters one character at a time. The text is kept as sent, surrounding
+    whitespace included.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['trim_whitespace'] = False
+        super().__init__(**kwargs)
+        self.validators = [validator for validator in self.validators
+                           if not isinstance(validator, ProhibitSurrogateCharactersValidator)]
+
+    def run_validation(self, data=empty):
+        if isinstance(data, str) and (data == '' or data.isspace()):
+            if not self.allow_blank:
+                self.fail('blank')
+            return ''
+        # CharField.run_validation would strip the text to test for blanks
+        return serializers.Field.run_validation(self, data)
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        surrogate = _SURROGATE.search(value)
+        if surrogate is not None:
+            raise serializers.ValidationError(
+                ProhibitSurrogateCharactersValidator.message.format(code_point=ord(surrogate.group())),
+                code=ProhibitSurrogateCharactersValidator.code)
+        return value
+
 
 class ConversationIdSerializer(serializers.Serializer):
     conversation_id = serializers.CharField(max_length=40)
@@ -11,18 +50,27 @@ class ConversationIdSerializer(serializers.Serializer):
         return value
 
 class PageChangeSerializer(ConversationIdSerializer):
-    html = serializers.CharField(
+    html = LargeTextField(
         help_text="The HTML content of the page change."
     )
+    url = serializers.CharField(
+        required=False, allow_blank=True, max_length=2048,
+        help_text="The URL of the page, to account the conversation's usage to its site."
+    )
 
     def validate_html(self, value):
         # print(f"html value: {value} type: {type(value)}")
-        if not value or not value.strip():
+        if not value or value.isspace():
             raise serializers.ValidationError("Html content cannot be empty.")
         if not isinstance(value, str):
             raise serializers.ValidationError("Html content must be a string.")
         return value
 
+class ProfileToggleSerializer(ConversationIdSerializer):
+    enabled = serializers.BooleanField(
+        default=True, help_text="Whether every request of the conversation is profiled."
+    )
+
 class UserPromptSerializer(ConversationIdSerializer):
     prompt = serializers.CharField(
         help_text="The user prompt."
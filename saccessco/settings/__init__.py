@@ -60,6 +60,19 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# orjson for the REST API's JSON request and response bodies
+REST_FRAMEWORK = {
+    'DEFAULT_PARSER_CLASSES': [
+        'saccessco.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'saccessco.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
 ROOT_URLCONF = 'saccessco.urls'
 
 TEMPLATES = [
@@ -84,7 +97,7 @@ ASGI_APPLICATION = 'saccessco.asgi.application'
 # Channels Channel Layer Configuration
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "saccessco.layers.LocalFirstRedisChannelLayer",
         "CONFIG": {
             # This address should be accessible from where your Django app is running.
             # '127.0.0.1' or 'localhost' is usually fine for dev.
@@ -151,7 +164,6 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     str(BASE_DIR / 'static'),
 ]
-print(f"DEBUG_STATIC_DIRS_RUNTIME: {STATICFILES_DIRS}")
 # STATIC_ROOT is typically only set for deployment
 # STATIC_ROOT = BASE_DIR / 'staticfiles'
 
@@ -165,6 +177,97 @@ STATICFILES_FINDERS = [
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Page change analysis
+# Pages larger than this (in characters) are split into regions that are analysed concurrently
+SACCESSCO_CHUNKED_ANALYSIS_THRESHOLD = 200_000
+SACCESSCO_REGION_MAX_CHARS = 60_000
+SACCESSCO_ANALYSIS_POOL_SIZE = 4
+# Analyses are reused for pages of a conversation with the same layout, when all the labels they
+# quote are found on the new page; 0 disables the cache
+SACCESSCO_TEMPLATE_CACHE_SIZE = 256
+
+# AI responses kept per conversation, replayed to sockets that (re)connect after they were sent
+SACCESSCO_REPLAY_FRAMES = 32
+# Responses over HTTP, for networks that block WebSockets: idle Server-Sent Events streams get a
+# heartbeat comment this often, long polls return empty after this long
+SACCESSCO_HEARTBEAT_SECONDS = 15
+SACCESSCO_LONG_POLL_SECONDS = 25
+# Traced user prompts kept for /saccessco/traces/ and its OpenTelemetry export and percentiles
+SACCESSCO_TRACE_BUFFER = 500
+# The engines by name, as dotted paths: a module, and its provider's SDK, is imported when its
+# engine is first used, see saccessco.ai.engine_class
+SACCESSCO_AI_ENGINES = {
+    "gemini": "saccessco.ai.gemini.AIEngine",
+    "chtgpt": "saccessco.ai.chtgpt.AIEngine",
+    "stub": "saccessco.ai.stub.AIEngine",
+}
+# The engine of the conversations. "stub" answers every conversation with the offline engine of
+# saccessco.ai.stub, for load tests: no network call, a response after the latency below (plus
+# per 1000 tokens sent), give or take the jitter
+SACCESSCO_AI_ENGINE = os.getenv("SACCESSCO_AI_ENGINE", "gemini")
+SACCESSCO_STUB_LATENCY_SECONDS = float(os.getenv("SACCESSCO_STUB_LATENCY_SECONDS", "0.5"))
+SACCESSCO_STUB_SECONDS_PER_1K_TOKENS = float(os.getenv("SACCESSCO_STUB_SECONDS_PER_1K_TOKENS", "0"))
+SACCESSCO_STUB_JITTER = 0.2
+# Records every conversation's page changes, prompts, model calls and responses to gzipped JSONL
+# in this directory, to replay them offline with benchmarks/replay.py, see saccessco.capture
+SACCESSCO_CAPTURE = os.getenv("SACCESSCO_CAPTURE") == "1"
+SACCESSCO_CAPTURE_DIR = LOG_DIR / "captures"
+# Captures kept open at once; the least recently written one is closed, and reopened at its next event
+SACCESSCO_CAPTURE_OPEN_FILES = 64
+# USD per million prompt, cached prompt and completion tokens, to account the cost of the LLM calls
+# (see saccessco.accounting and /saccessco/usage/). Models match the longest name they start with,
+# else "default". List prices at the time of writing: check the providers' pages.
+SACCESSCO_MODEL_PRICES = {
+    "gemini-2.5-pro": {"prompt": 1.25, "cached": 0.31, "completion": 10.0},
+    "gemini-2.5-flash-lite": {"prompt": 0.10, "cached": 0.025, "completion": 0.40},
+    "gemini-2.5-flash": {"prompt": 0.30, "cached": 0.075, "completion": 2.50},
+    "gemini-2.0-flash": {"prompt": 0.10, "cached": 0.025, "completion": 0.40},
+    "gpt-4o-mini": {"prompt": 0.15, "cached": 0.075, "completion": 0.60},
+    "gpt-4o": {"prompt": 2.50, "cached": 1.25, "completion": 10.0},
+    "o3-mini": {"prompt": 1.10, "cached": 0.55, "completion": 4.40},
+    "stub": {"prompt": 0.0, "cached": 0.0, "completion": 0.0},
+    "default": {"prompt": 1.0, "cached": 0.25, "completion": 4.0},
+}
+# Budgets in USD, None for none. A conversation past its budget, or every conversation once the day's
+# (UTC) calls are past the daily one, switches to the cheaper model below and keeps only the last
+# page change and SACCESSCO_BUDGET_HISTORY_MESSAGES messages of its history before each call.
+SACCESSCO_CONVERSATION_BUDGET_USD = float(os.getenv("SACCESSCO_CONVERSATION_BUDGET_USD")) \
+    if os.getenv("SACCESSCO_CONVERSATION_BUDGET_USD") else None
+SACCESSCO_DAILY_BUDGET_USD = float(os.getenv("SACCESSCO_DAILY_BUDGET_USD")) \
+    if os.getenv("SACCESSCO_DAILY_BUDGET_USD") else None
+SACCESSCO_BUDGET_FALLBACK_MODELS = {
+    "gemini-2.5-pro": "gemini-2.5-flash",
+    "gemini-2.5-flash": "gemini-2.5-flash-lite",
+    "gpt-4o": "gpt-4o-mini",
+    "o3-mini": "gpt-4o-mini",
+}
+SACCESSCO_BUDGET_HISTORY_MESSAGES = 12
+# Conversations kept by the usage ledger, the last ones to call a model
+SACCESSCO_USAGE_CONVERSATIONS = 1000
+# Sampling profiles of the requests with the X-Saccessco-Profile: 1 header (?profile=1 on WebSockets), and of
+# every request of the conversations listed here or switched on with POST /saccessco/profile/. Written as
+# flamegraphs to SACCESSCO_PROFILE_DIR, keeping the last SACCESSCO_PROFILE_MAX_FILES. Off unless
+# SACCESSCO_PROFILING=1. See saccessco.profiling
+SACCESSCO_PROFILING = os.getenv("SACCESSCO_PROFILING") == "1"
+SACCESSCO_PROFILE_CONVERSATIONS = [c for c in os.getenv("SACCESSCO_PROFILE_CONVERSATIONS", "").split(",") if c]
+SACCESSCO_PROFILE_INTERVAL = 0.005
+SACCESSCO_PROFILE_DIR = LOG_DIR / "profiles"
+SACCESSCO_PROFILE_MAX_FILES = 200
+# Pages, prompts and responses are logged truncated to this many characters, with their length and
+# a hash, except in this fraction of conversations (picked by ID), which log them in full. See saccessco.logpipeline
+SACCESSCO_LOG_PAYLOAD_CHARS = 200
+SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv("SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE", "0"))
+# Log records waiting for the logging thread; more are dropped
+SACCESSCO_LOG_QUEUE_SIZE = 10000
+# The pages the extension is tried on by hand (/test-page/ and the others), see saccessco.urls
+SACCESSCO_TEST_PAGES = True
+# The operator endpoints: traces, usage, profiles and /metrics, see saccessco.urls. When a token is
+# set, they need an "Authorization: Bearer <token>" header, see saccessco.permissions
+SACCESSCO_OPS_ENDPOINTS = True
+SACCESSCO_OPS_TOKEN = os.getenv("SACCESSCO_OPS_TOKEN") or None
+# Prometheus metrics are served on /metrics, see saccessco.metrics. With several worker processes,
+# set the PROMETHEUS_MULTIPROC_DIR environment variable to an empty directory before they start.
+
 OPEN_API_KEY = os.getenv("OPEN_API_KEY")
 OPEN_API_MODEL = "o3-mini"
 
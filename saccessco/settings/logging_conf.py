@@ -41,6 +41,13 @@ temp_logger.debug(f"LOG_DIR resolved to: {LOG_DIR}")
 temp_logger.debug(f"django.log filename resolved to: {os.path.join(LOG_DIR, 'django.log')}")
 # -----------------------------------------------------------------
 
+# Log files rotate at this size, keeping LOG_BACKUP_COUNT old ones, so logs can't fill the disk.
+# With several worker processes, give each its own LOG_DIR: rotation isn't coordinated between them.
+LOG_MAX_BYTES = int(os.getenv("SACCESSCO_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv("SACCESSCO_LOG_BACKUP_COUNT", "5"))
+
+# Handlers write from a background thread, see saccessco.logpipeline
+LOGGING_CONFIG = "saccessco.logpipeline.configure"
 
 LOGGING = {
     'version': 1,
@@ -58,14 +65,18 @@ LOGGING = {
     'handlers': {
         f'{APP_NAME}_file': {
             'level': 'DEBUG', # Set handler level to DEBUG to capture all messages
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(LOG_DIR, 'django.log'), # Path to your main Django log file
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'verbose',
         },
         'q_file': { # NEW: Handler for Django-Q specific logs
             'level': 'INFO', # Start with INFO, can be WARNING/ERROR to reduce polling logs
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': os.path.join(LOG_DIR, 'django_q.log'), # Separate file for Q logs
+            'maxBytes': LOG_MAX_BYTES,
+            'backupCount': LOG_BACKUP_COUNT,
             'formatter': 'verbose',
         },
         'console': { # Add a console handler for immediate feedback
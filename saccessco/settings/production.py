@@ -0,0 +1,76 @@
+"""
+Production settings of the API workers: the settings of saccessco.settings, with only what the
+REST API, the WebSocket and the HTTP response streams need.
+
+    DJANGO_SETTINGS_MODULE=saccessco.settings.production DJANGO_SECRET_KEY=... \
+        uvicorn saccessco.asgi_production:application
+
+No sessions, users, messages or CSRF: the API and the sockets are keyed by conversation ID,
+and the browser extension calls them cross-origin. The operator endpoints (traces, usage,
+profiles, /metrics) are served only when SACCESSCO_OPS_TOKEN is set, and then need it. No static files, templates or test pages,
+no database, no debug mode (which keeps every SQL query and the settings in error pages).
+"""
+import copy
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from saccessco.settings import *  # noqa: F401,F403
+from saccessco.settings import APP_NAME, LOGGING, REST_FRAMEWORK, SACCESSCO_OPS_TOKEN
+
+DEBUG = os.getenv("DJANGO_DEBUG") == "1"
+
+SECRET_KEY = os.getenv("DJANGO_SECRET_KEY")
+if not SECRET_KEY:
+    raise ImproperlyConfigured("Set DJANGO_SECRET_KEY for the production settings.")
+
+ALLOWED_HOSTS = [host for host in os.getenv("DJANGO_ALLOWED_HOSTS", "localhost,127.0.0.1").split(",") if host]
+
+INSTALLED_APPS = [
+    'channels',
+    'corsheaders',
+    'rest_framework',
+    'saccessco',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+]
+
+# JSON only, and no authentication: request.user would need django.contrib.auth
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_PARSER_CLASSES': ['saccessco.parsers.FastJSONParser'],
+    'DEFAULT_RENDERER_CLASSES': ['saccessco.renderers.FastJSONRenderer'],
+    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.AllowAny'],
+    'UNAUTHENTICATED_USER': None,
+}
+
+TEMPLATES = []
+DATABASES = {}
+USE_I18N = False
+
+ASGI_APPLICATION = 'saccessco.asgi_production.application'
+
+# The test pages of saccessco.urls need the templates and static files
+SACCESSCO_TEST_PAGES = False
+# Nothing authenticates the API: the operator endpoints, which switch profiling on and list the
+# conversations, are only served with a token to ask for
+SACCESSCO_OPS_ENDPOINTS = bool(SACCESSCO_OPS_TOKEN)
+
+# Django's, Channels' and the app's loggers log from INFO up rather than DEBUG
+LOGGING = copy.deepcopy(LOGGING)
+for _logger in ("django", "django.channels", APP_NAME):
+    LOGGING["loggers"][_logger]["level"] = os.getenv("SACCESSCO_LOG_LEVEL", "INFO")
+
+# Redis of the channel layer, e.g. redis://redis:6379/0
+if os.getenv("REDIS_URL"):
+    CHANNEL_LAYERS = {
+        "default": {
+            "BACKEND": "saccessco.layers.LocalFirstRedisChannelLayer",
+            "CONFIG": {"hosts": [os.getenv("REDIS_URL")]},
+        },
+    }
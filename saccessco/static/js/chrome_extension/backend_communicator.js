@@ -68,6 +68,36 @@ async function send(url, data) {
 }
 
 
+/**
+ * Sends a request over the conversation's WebSocket when it is open, which saves an HTTP
+ * round trip per message and keeps prompts and page changes in order. Falls back to
+ * POSTing to the REST endpoint when the socket is not available.
+ * @param {string} type - The WebSocket message type ('user_prompt' or 'page_change').
+ * @param {string} url - The REST endpoint URL used as fallback.
+ * @param {Object} payload - The REST payload, including conversation_id.
+ * @returns {Promise<Object|undefined>} Promise resolving with the backend response data.
+ */
+async function sendRequest(type, url, payload) {
+    const socket = window.aiWebSocketReceiver;
+    if (socket && typeof socket.whenReady === 'function') {
+        try {
+            // A socket still connecting is worth a short wait: its 'ready' frame is one round trip away
+            await socket.whenReady();
+            // The socket's URL identifies the conversation
+            const {conversation_id, ...fields} = payload;
+            return await socket.request(type, fields);
+        } catch (error) {
+            if (error.delivered) {
+                // The server may already be processing it: resending would run it twice
+                console.error(`ERROR: ${type} request sent over WebSocket was not acknowledged:`, error);
+                return undefined;
+            }
+            console.warn(`WARNING: Could not send ${type} over WebSocket, falling back to HTTP:`, error);
+        }
+    }
+    return await send(url, payload);
+}
+
 /**
  * Sends a user prompt to the backend.
  * @param {string} text - The user's text prompt.
@@ -81,7 +111,7 @@ async function sendUserPrompt(text) {
         'prompt': text,
     };
     console.log("DEBUG: sendUserPrompt payload:", payload);
-    return await send(window.configuration.SACCESSCO_USER_PROMPT_URL, payload);
+    return await sendRequest('user_prompt', window.configuration.SACCESSCO_USER_PROMPT_URL, payload);
 }
 
 /**
@@ -97,13 +127,14 @@ async function sendPageChange(html) {
         'html' : html
     };
     console.log("DEBUG: sendPageChange payload:", payload);
-    return await send(window.configuration.SACCESSCO_PAGE_CHANGE_URL, payload);
+    return await sendRequest('page_change', window.configuration.SACCESSCO_PAGE_CHANGE_URL, payload);
 }
 
 
 // Expose functions globally.
 window.backendCommunicatorModule = {
     send, // Expose the base send function if needed
+    sendRequest,
     sendUserPrompt,
     sendPageChange,
 };
@@ -1,7 +1,12 @@
 const SACCESSCO_WEBSOCKET_URL = "ws://localhost:8000/ws/saccessco/ai/"
 const SACCESSCO_USER_PROMPT_URL = "http://localhost:8000/saccessco/user_prompt/";
 const SACCESSCO_PAGE_CHANGE_URL = "http://localhost:8000/saccessco/page_change/";
+// Responses over HTTP when WebSockets are blocked: Server-Sent Events, else long polling
+const SACCESSCO_EVENTS_URL = "http://localhost:8000/saccessco/events/";
+const SACCESSCO_POLL_URL = "http://localhost:8000/saccessco/poll/";
 const TEST_PAGE_URL = "http://localhost:8000/test-page/";
+// "json" text frames, or "msgpack" binary frames (smaller, used if the server accepts the subprotocol)
+const SACCESSCO_WEBSOCKET_FORMAT = "json";
 
 const DEBUG = false;
 const LANGUAGE = "en-US";
@@ -14,6 +19,9 @@ window.configuration = {
     SACCESSCO_WEBSOCKET_URL,
     SACCESSCO_USER_PROMPT_URL,
     SACCESSCO_PAGE_CHANGE_URL,
+    SACCESSCO_EVENTS_URL,
+    SACCESSCO_POLL_URL,
+    SACCESSCO_WEBSOCKET_FORMAT,
     TEST_PAGE_URL,
     DEBUG,
     ROLE,
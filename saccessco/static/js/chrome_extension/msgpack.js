@@ -0,0 +1,197 @@
+// saccessco/static/js/chrome_extension/msgpack.js - Minimal MessagePack codec for the AI WebSocket.
+// Covers the types JSON frames use: nil, booleans, integers, floats, strings, arrays and maps
+// (plus bin, decoded to Uint8Array). Used when the socket negotiates the "saccessco.msgpack" subprotocol.
+
+(function(window) {
+
+    const textEncoder = new TextEncoder();
+    const textDecoder = new TextDecoder();
+
+    class Writer {
+        constructor() {
+            this.buffer = new Uint8Array(256);
+            this.view = new DataView(this.buffer.buffer);
+            this.length = 0;
+        }
+
+        ensure(size) {
+            if (this.length + size <= this.buffer.length) {
+                return;
+            }
+            let capacity = this.buffer.length * 2;
+            while (capacity < this.length + size) {
+                capacity *= 2;
+            }
+            const grown = new Uint8Array(capacity);
+            grown.set(this.buffer.subarray(0, this.length));
+            this.buffer = grown;
+            this.view = new DataView(grown.buffer);
+        }
+
+        byte(value) { this.ensure(1); this.view.setUint8(this.length, value); this.length += 1; }
+        uint16(value) { this.ensure(2); this.view.setUint16(this.length, value); this.length += 2; }
+        uint32(value) { this.ensure(4); this.view.setUint32(this.length, value); this.length += 4; }
+        float64(value) { this.ensure(8); this.view.setFloat64(this.length, value); this.length += 8; }
+        bytes(value) { this.ensure(value.length); this.buffer.set(value, this.length); this.length += value.length; }
+
+        result() {
+            return this.buffer.slice(0, this.length);
+        }
+    }
+
+    function encodeValue(writer, value) {
+        if (value === null || value === undefined) {
+            writer.byte(0xc0);
+        } else if (value === false) {
+            writer.byte(0xc2);
+        } else if (value === true) {
+            writer.byte(0xc3);
+        } else if (typeof value === 'number') {
+            if (Number.isInteger(value) && value >= -0x80000000 && value <= 0xffffffff) {
+                if (value >= 0 && value < 0x80) {
+                    writer.byte(value);
+                } else if (value < 0 && value >= -32) {
+                    writer.byte(value & 0xff);
+                } else if (value >= 0) {
+                    writer.byte(0xce); writer.uint32(value);
+                } else {
+                    writer.byte(0xd2); writer.ensure(4); writer.view.setInt32(writer.length, value); writer.length += 4;
+                }
+            } else {
+                writer.byte(0xcb); writer.float64(value);
+            }
+        } else if (typeof value === 'string') {
+            const encoded = textEncoder.encode(value);
+            if (encoded.length < 32) {
+                writer.byte(0xa0 | encoded.length);
+            } else if (encoded.length < 0x10000) {
+                writer.byte(0xda); writer.uint16(encoded.length);
+            } else {
+                writer.byte(0xdb); writer.uint32(encoded.length);
+            }
+            writer.bytes(encoded);
+        } else if (value instanceof Uint8Array) {
+            writer.byte(0xc6); writer.uint32(value.length); writer.bytes(value);
+        } else if (Array.isArray(value)) {
+            if (value.length < 16) {
+                writer.byte(0x90 | value.length);
+            } else {
+                writer.byte(0xdd); writer.uint32(value.length);
+            }
+            for (const item of value) {
+                encodeValue(writer, item);
+            }
+        } else if (typeof value === 'object') {
+            const keys = Object.keys(value).filter(key => value[key] !== undefined);
+            if (keys.length < 16) {
+                writer.byte(0x80 | keys.length);
+            } else {
+                writer.byte(0xdf); writer.uint32(keys.length);
+            }
+            for (const key of keys) {
+                encodeValue(writer, key);
+                encodeValue(writer, value[key]);
+            }
+        } else {
+            throw new TypeError(`msgpack: cannot encode ${typeof value}`);
+        }
+    }
+
+    /**
+     * Encodes a JSON compatible value.
+     * @param {any} value
+     * @returns {Uint8Array}
+     */
+    function encode(value) {
+        const writer = new Writer();
+        encodeValue(writer, value);
+        return writer.result();
+    }
+
+    /**
+     * Decodes one MessagePack value.
+     * @param {Uint8Array|ArrayBuffer} data
+     * @returns {any}
+     */
+    function decode(data) {
+        const bytes = data instanceof Uint8Array ? data : new Uint8Array(data);
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        let offset = 0;
+
+        const string = (length) => {
+            const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+            offset += length;
+            return value;
+        };
+        const array = (length) => {
+            const value = new Array(length);
+            for (let i = 0; i < length; i++) {
+                value[i] = read();
+            }
+            return value;
+        };
+        const map = (length) => {
+            const value = {};
+            for (let i = 0; i < length; i++) {
+                const key = read();
+                value[key] = read();
+            }
+            return value;
+        };
+        const bin = (length) => {
+            const value = bytes.slice(offset, offset + length);
+            offset += length;
+            return value;
+        };
+        const next = (size, getter) => {
+            const value = getter.call(view, offset);
+            offset += size;
+            return value;
+        };
+
+        function read() {
+            const type = bytes[offset++];
+            if (type < 0x80) return type;
+            if (type < 0x90) return map(type & 0x0f);
+            if (type < 0xa0) return array(type & 0x0f);
+            if (type < 0xc0) return string(type & 0x1f);
+            if (type >= 0xe0) return type - 0x100;
+            switch (type) {
+                case 0xc0: return null;
+                case 0xc2: return false;
+                case 0xc3: return true;
+                case 0xc4: return bin(next(1, view.getUint8));
+                case 0xc5: return bin(next(2, view.getUint16));
+                case 0xc6: return bin(next(4, view.getUint32));
+                case 0xca: return next(4, view.getFloat32);
+                case 0xcb: return next(8, view.getFloat64);
+                case 0xcc: return next(1, view.getUint8);
+                case 0xcd: return next(2, view.getUint16);
+                case 0xce: return next(4, view.getUint32);
+                case 0xcf: return Number(next(8, view.getBigUint64));
+                case 0xd0: return next(1, view.getInt8);
+                case 0xd1: return next(2, view.getInt16);
+                case 0xd2: return next(4, view.getInt32);
+                case 0xd3: return Number(next(8, view.getBigInt64));
+                case 0xd9: return string(next(1, view.getUint8));
+                case 0xda: return string(next(2, view.getUint16));
+                case 0xdb: return string(next(4, view.getUint32));
+                case 0xdc: return array(next(2, view.getUint16));
+                case 0xdd: return array(next(4, view.getUint32));
+                case 0xde: return map(next(2, view.getUint16));
+                case 0xdf: return map(next(4, view.getUint32));
+                default: throw new Error(`msgpack: unsupported type 0x${type.toString(16)}`);
+            }
+        }
+
+        return read();
+    }
+
+    window.msgpack = {
+        encode,
+        decode
+    };
+
+    console.log("MessagePack module loaded.");
+
+})(window);
@@ -39,7 +39,7 @@
           return null;
       }
 
-      if (key in this._parameters) {
+      if (key in this._parameters && this._parameters[key] !== null && this._parameters[key] !== undefined) {
         console.log(`ParameterManager: Found '${key}' in internal parameters.`);
         return this._parameters[key];
       }
@@ -17,6 +17,10 @@ function initializeAIWebSocket() {
     window.aiWebSocketReceiver = aiWebSocketReceiver;
 }
 
+// Subprotocol for MessagePack binary frames, see AiConsumer.MSGPACK_SUBPROTOCOL.
+// Compression (permessage-deflate) is negotiated by the browser and the ASGI server for both formats.
+const MSGPACK_SUBPROTOCOL = "saccessco.msgpack";
+
 class WebSocketAIReceiver {
     constructor() {
         // Ensure window.configuration and SACCESSCO_WEBSOCKET_URL exist
@@ -39,11 +43,147 @@ class WebSocketAIReceiver {
         this.maxReconnectAttempts = 10;
         this.reconnectDelay = 1000;
         this.isClosingIntentionally = false;
+        this.nextRequestId = 1;
+        this.pendingRequests = new Map(); // request_id -> {resolve, reject, timer}
+        this.requestTimeoutMs = 10000;
+        this.isReady = false; // Set by the server's 'ready' frame, once this socket is subscribed to the conversation
+        this.readyWaiters = [];
+        this.lastSeq = 0; // seq of the last AI response handled; the server replays later ones on (re)connect
+        this.hasOpened = false;
+        // WebSocket attempts that never opened after which responses are received over HTTP instead
+        this.httpFallbackAfter = 2;
+        this.eventSource = null;
+        this.eventStreamTimer = null;
+        this.eventStreamTimeoutMs = 10000;
+        this.isPolling = false;
 
         // Automatically try to connect when the instance is created
         this.connect();
     }
 
+    isBinary() {
+        return this.socket !== null && this.socket.protocol === MSGPACK_SUBPROTOCOL;
+    }
+
+    /**
+     * Sends a message in the frame format the server accepted on connect.
+     * @param {Object} message
+     */
+    sendMessage(message) {
+        this.socket.send(this.isBinary() ? window.msgpack.encode(message) : JSON.stringify(message));
+    }
+
+    /**
+     * Tells the server a traced response arrived, which ends the client_receipt span of its
+     * trace. Only over the WebSocket: responses received over HTTP aren't acknowledged.
+     * @param {string} traceId
+     * @param {number} [seq]
+     */
+    sendReceipt(traceId, seq) {
+        if (this.socket !== null && this.socket.readyState === WebSocket.OPEN) {
+            this.sendMessage({type: 'receipt', trace_id: traceId, seq: seq});
+        }
+    }
+
+    /**
+     * Decodes a received frame: JSON text, or MessagePack in a binary frame.
+     * @param {string|ArrayBuffer} frame
+     * @returns {Object}
+     */
+    decodeMessage(frame) {
+        return typeof frame === 'string' ? JSON.parse(frame) : window.msgpack.decode(new Uint8Array(frame));
+    }
+
+    isOpen() {
+        return this.socket !== null && this.socket.readyState === WebSocket.OPEN && this.isReady;
+    }
+
+    /**
+     * Resolves once the server has sent its 'ready' frame: from then on, responses to requests
+     * sent on this socket can't be missed. Rejects if the socket is closed or not ready in time.
+     * @param {number} [timeoutMs=2000]
+     * @returns {Promise<void>}
+     */
+    whenReady(timeoutMs = 2000) {
+        if (this.isOpen()) {
+            return Promise.resolve();
+        }
+        if (!this.socket || this.socket.readyState === WebSocket.CLOSING || this.socket.readyState === WebSocket.CLOSED) {
+            return Promise.reject(new Error("WebSocket is closed."));
+        }
+        return new Promise((resolve, reject) => {
+            const waiter = {resolve, reject};
+            waiter.timer = setTimeout(() => {
+                this.readyWaiters = this.readyWaiters.filter(w => w !== waiter);
+                reject(new Error(`WebSocket not ready after ${timeoutMs}ms.`));
+            }, timeoutMs);
+            this.readyWaiters.push(waiter);
+        });
+    }
+
+    settleReadyWaiters(error) {
+        for (const waiter of this.readyWaiters) {
+            clearTimeout(waiter.timer);
+            error ? waiter.reject(error) : waiter.resolve();
+        }
+        this.readyWaiters = [];
+    }
+
+    /**
+     * Sends a 'user_prompt' or 'page_change' request over the socket.
+     * Resolves with the same body the REST endpoint returns, once the server acknowledges it.
+     * Rejects with error.delivered === false if the request could not be sent at all, in which
+     * case the caller can safely fall back to the REST endpoint.
+     * @param {string} type - The message type.
+     * @param {Object} payload - The request fields, e.g. {prompt: "..."}.
+     * @returns {Promise<Object>}
+     */
+    request(type, payload) {
+        return new Promise((resolve, reject) => {
+            const fail = (message, delivered) => {
+                const error = new Error(message);
+                error.delivered = delivered;
+                reject(error);
+            };
+            if (!this.isOpen()) {
+                fail("WebSocket is not open.", false);
+                return;
+            }
+            const requestId = String(this.nextRequestId++);
+            try {
+                this.sendMessage({...payload, type: type, request_id: requestId});
+            } catch (e) {
+                fail("WebSocket send failed: " + e.message, false);
+                return;
+            }
+            const timer = setTimeout(() => {
+                this.pendingRequests.delete(requestId);
+                fail(`No acknowledgement for ${type} request ${requestId}.`, true);
+            }, this.requestTimeoutMs);
+            this.pendingRequests.set(requestId, {resolve, fail, timer});
+        });
+    }
+
+    handleAck(data) {
+        const pending = this.pendingRequests.get(data.request_id);
+        if (!pending) {
+            console.warn("WebSocketAIReceiver: Acknowledgement for unknown request:", data.request_id);
+            return;
+        }
+        this.pendingRequests.delete(data.request_id);
+        clearTimeout(pending.timer);
+        pending.resolve(data.response);
+    }
+
+    failPendingRequests(reason) {
+        for (const pending of this.pendingRequests.values()) {
+            clearTimeout(pending.timer);
+            // Sent but not acknowledged: the server may have it, so it must not be resent
+            pending.fail(reason, true);
+        }
+        this.pendingRequests.clear();
+    }
+
     handleAiMessage(message) {
         console.log("DEBUG: handleAiMessage called with parsed data:", JSON.stringify(message));
         window.debug.message("handleAiMessage called with parsed data:" + JSON.stringify(message));
@@ -111,6 +251,131 @@ class WebSocketAIReceiver {
         }
       }
     }
+    /**
+     * Handles a decoded message from the server, received over the WebSocket, the event stream
+     * or a long poll.
+     * @param {Object} data - The message.
+     * @param {string} raw - The message as JSON text.
+     */
+    handleFrame(data, raw) {
+        const messageType = data.type;
+        // Control frames
+        if (messageType === 'ready') {
+            console.log('WebSocketAIReceiver: Server ready.');
+            if (typeof data.last_seq === 'number') {
+                // Lower than ours if the server restarted and numbers its responses from 1 again
+                this.lastSeq = data.last_seq;
+            }
+            this.isReady = true;
+            this.settleReadyWaiters(null);
+            return;
+        }
+        if (messageType === 'ack') {
+            this.handleAck(data);
+            return;
+        }
+        if (typeof data.seq === 'number') {
+            if (data.seq <= this.lastSeq) {
+                console.log(`WebSocketAIReceiver: Skipping AI response ${data.seq}, already handled.`);
+                return;
+            }
+            this.lastSeq = data.seq;
+        }
+        if (typeof data.trace_id === 'string') {
+            this.sendReceipt(data.trace_id, data.seq);
+        }
+
+        window.__receivedWebSocketMessages.push(raw);
+        window.debug.message("Websocket received ai response: " + JSON.stringify(raw));
+
+        if (data.speak !== undefined || data.execute !== undefined) {
+             console.log('WebSocketAIReceiver: Received AI response message (structured, no explicit type).');
+             this.handleAiMessage(data);
+        } else if (messageType === 'ai_response' && data.ai_response) {
+            console.log('WebSocketAIReceiver: Received AI response message (structured, with explicit type).');
+            this.handleAiMessage(data.ai_response);
+        } else if (messageType === 'error' && data.message) {
+             console.error('WebSocketAIReceiver: Received error message from backend:', data.message);
+        } else {
+            console.warn('WebSocketAIReceiver: Received unexpected message type or format:', data);
+        }
+    }
+
+    /**
+     * Receives the responses over HTTP instead, for networks that block WebSockets: a
+     * Server-Sent Events stream, or long polls if the stream can't be used either.
+     * Requests are then POSTed to the REST endpoints.
+     */
+    fallBackToHttp() {
+        if (this.eventSource || this.isPolling) {
+            return;
+        }
+        const baseUrl = window.configuration.SACCESSCO_EVENTS_URL;
+        if (!baseUrl || typeof EventSource === 'undefined') {
+            this.startLongPoll();
+            return;
+        }
+        console.warn("WebSocketAIReceiver: WebSocket unavailable, receiving responses as Server-Sent Events.");
+        // EventSource sends Last-Event-ID itself when it reconnects
+        this.eventSource = new EventSource(`${baseUrl}${window.conversation_id}/?last_seq=${this.lastSeq}`);
+        const onEvent = (event) => {
+            clearTimeout(this.eventStreamTimer);
+            try {
+                this.handleFrame(JSON.parse(event.data), event.data);
+            } catch (error) {
+                console.error('WebSocketAIReceiver: Error processing event:', error, event.data);
+            }
+        };
+        this.eventSource.addEventListener('ready', onEvent);
+        this.eventSource.onmessage = onEvent;
+        const giveUp = () => {
+            clearTimeout(this.eventStreamTimer);
+            if (!this.eventSource) {
+                return;
+            }
+            this.eventSource.close();
+            this.eventSource = null;
+            this.startLongPoll();
+        };
+        this.eventSource.onerror = () => {
+            if (this.eventSource && this.eventSource.readyState === EventSource.CLOSED) {
+                giveUp();
+            }
+        };
+        // A proxy that buffers the stream never lets the 'ready' event through
+        this.eventStreamTimer = setTimeout(giveUp, this.eventStreamTimeoutMs);
+    }
+
+    async startLongPoll() {
+        const baseUrl = window.configuration.SACCESSCO_POLL_URL;
+        if (!baseUrl || this.isPolling) {
+            return;
+        }
+        console.warn("WebSocketAIReceiver: Receiving responses by long polling.");
+        this.isPolling = true;
+        while (this.isPolling) {
+            try {
+                const response = await fetch(`${baseUrl}${window.conversation_id}/?last_seq=${this.lastSeq}`,
+                                             {cache: 'no-store'});
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                const body = await response.json();
+                if (body.last_seq < this.lastSeq) {
+                    // The server restarted and numbers its responses from 1 again
+                    this.lastSeq = 0;
+                }
+                for (const message of body.responses) {
+                    this.handleFrame(message, JSON.stringify(message));
+                }
+                this.lastSeq = body.last_seq;
+            } catch (error) {
+                console.error("WebSocketAIReceiver: Long poll failed:", error);
+                await new Promise(resolve => setTimeout(resolve, this.reconnectDelay));
+            }
+        }
+    }
+
     /**
      * Establishes the WebSocket connection.
      */
@@ -123,20 +388,24 @@ class WebSocketAIReceiver {
 
         this.isClosingIntentionally = false;
         console.log(`--- CRITICAL DEBUG: WebSocketAIReceiver: Attempting to connect to ${this.websocketUrl}`);
-        this.socket = new WebSocket(this.websocketUrl);
+        const wantsMsgpack = window.configuration.SACCESSCO_WEBSOCKET_FORMAT === "msgpack" && window.msgpack;
+        const url = `${this.websocketUrl}?last_seq=${this.lastSeq}`;
+        this.socket = wantsMsgpack ? new WebSocket(url, [MSGPACK_SUBPROTOCOL]) : new WebSocket(url);
+        this.socket.binaryType = "arraybuffer";
         console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: Socket created');
 
         // Assign Event Handlers
         this.socket.onopen = (event) => {
             console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: Connection opened. ReadyState:', this.socket.readyState, event);
             this.reconnectAttempts = 0; // Reset reconnect attempts on successful connection
+            this.hasOpened = true;
 
             // --- NEW: Send a message immediately upon connection ---
             const clientHelloMessage = {
                 type: 'client_hello',
                 message: 'Hello from browser client!'
             };
-            this.socket.send(JSON.stringify(clientHelloMessage));
+            this.sendMessage(clientHelloMessage);
             console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: Sent client_hello message.');
             // --- END NEW ---
         };
@@ -144,24 +413,10 @@ class WebSocketAIReceiver {
         console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: Assigning onmessage handler');
         this.socket.onmessage = (event) => {
             console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: RAW message received (onMessage handler FIRED!):', event.data);
-            window.__receivedWebSocketMessages.push(event.data); // Store the raw message for Python to inspect
-            window.debug.message("Websocket received ai response: " + JSON.stringify(event.data));
             try {
-                const data = JSON.parse(event.data);
-                const messageType = data.type;
-
-                if (data.speak !== undefined || data.execute !== undefined) {
-                     console.log('WebSocketAIReceiver: Received AI response message (structured, no explicit type).');
-                     this.handleAiMessage(data);
-                } else if (messageType === 'ai_response' && data.ai_response) {
-                    console.log('WebSocketAIReceiver: Received AI response message (structured, with explicit type).');
-                    this.handleAiMessage(data.ai_response);
-                } else if (messageType === 'error' && data.message) {
-                     console.error('WebSocketAIReceiver: Received error message from backend:', data.message);
-                } else {
-                    console.warn('WebSocketAIReceiver: Received unexpected message type or format:', data);
-                }
-
+                const data = this.decodeMessage(event.data);
+                // Store the message as JSON text, whatever the frame format, for Python to inspect
+                this.handleFrame(data, typeof event.data === 'string' ? event.data : JSON.stringify(data));
             } catch (error) {
                 console.error('--- CRITICAL DEBUG: WebSocketAIReceiver: Error in onMessage handler parsing/processing:', error, event.data);
             }
@@ -171,7 +426,13 @@ class WebSocketAIReceiver {
         this.socket.onclose = (event) => {
             console.log('--- CRITICAL DEBUG: WebSocketAIReceiver: Connection closed. Code:', event.code, 'Reason:', event.reason, 'Was Clean:', event.wasClean);
             window.debug.message("WebSocketAIReceiver: Connection closed. Code: " + event.code + " reason: " + event.reason)
-            if (!this.isClosingIntentionally && event.code !== 1000 && this.reconnectAttempts < this.maxReconnectAttempts) {
+            this.isReady = false;
+            this.settleReadyWaiters(new Error("WebSocket closed before it was ready."));
+            this.failPendingRequests("WebSocket closed before the request was acknowledged.");
+            if (!this.isClosingIntentionally && !this.hasOpened && this.reconnectAttempts + 1 >= this.httpFallbackAfter) {
+                // Never got through: likely a proxy that blocks WebSockets
+                this.fallBackToHttp();
+            } else if (!this.isClosingIntentionally && event.code !== 1000 && this.reconnectAttempts < this.maxReconnectAttempts) {
                 console.log(`--- CRITICAL DEBUG: WebSocketAIReceiver Attempting to reconnect in ${this.reconnectDelay}ms (Attempt ${this.reconnectAttempts + 1}/${this.maxReconnectAttempts})...`);
                 setTimeout(() => {
                     this.reconnectAttempts++;
@@ -179,6 +440,7 @@ class WebSocketAIReceiver {
                 }, this.reconnectDelay);
             } else if (!this.isClosingIntentionally && event.code !== 1000) {
                 console.error(`--- CRITICAL DEBUG: WebSocketAIReceiver Max reconnection attempts (${this.maxReconnectAttempts}) reached. Connection failed.`);
+                this.fallBackToHttp();
             }
         };
         this.socket.onerror = (event) => {
@@ -191,6 +453,12 @@ class WebSocketAIReceiver {
 
     close() {
         this.isClosingIntentionally = true;
+        this.isPolling = false;
+        clearTimeout(this.eventStreamTimer);
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
+        }
         if (this.socket && this.socket.readyState !== WebSocket.CLOSED) {
             console.log("WebSocketAIReceiver: Closing connection intentionally.");
             this.socket.close(1000, 'Client closing connection');
@@ -25,6 +25,7 @@ class AbstractExtensionPageTest(CustomChannelsLiveServerTestCase):
     JS_FILES = [
         os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'configuration.js'),
         os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'speech.js'),
+        os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'msgpack.js'),
         os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'websocket.js'),
         os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'backend_communicator.js'),
         os.path.join(settings.BASE_DIR, 'static', 'js', 'chrome_extension', 'page_change_observer.js'),
@@ -170,12 +171,16 @@ class AbstractExtensionPageTest(CustomChannelsLiveServerTestCase):
         websocket_url_base = f"ws://{self.live_server_url.split('://')[1]}/ws/saccessco/ai"
         backend_page_change_url = f"http://{self.live_server_url.split('://')[1]}/saccessco/page_change/"
         backend_user_prompt_url = f"http://{self.live_server_url.split('://')[1]}/saccessco/user_prompt/"
+        backend_events_url = f"http://{self.live_server_url.split('://')[1]}/saccessco/events/"
+        backend_poll_url = f"http://{self.live_server_url.split('://')[1]}/saccessco/poll/"
 
         self.driver.execute_script(f"""
             window.configuration = window.configuration || {{}};
             window.configuration.SACCESSCO_WEBSOCKET_URL = "{websocket_url_base}";
             window.configuration.SACCESSCO_USER_PROMPT_URL = "{backend_user_prompt_url}";
             window.configuration.SACCESSCO_PAGE_CHANGE_URL = "{backend_page_change_url}";
+            window.configuration.SACCESSCO_EVENTS_URL = "{backend_events_url}";
+            window.configuration.SACCESSCO_POLL_URL = "{backend_poll_url}";
             window.conversation_id = "{self.conversation_id}";
 
             window.speechModule = window.speechModule || {{
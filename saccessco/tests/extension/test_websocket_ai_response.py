@@ -1,5 +1,4 @@
 # saccessco/tests/extension/test_websocket_ai_response.py
-import time
 import json
 import urllib.parse
 from selenium import webdriver
@@ -54,20 +53,16 @@ class WebSocketAIResponseTest(AbstractExtensionPageTest):
         self.driver.execute_script("window.websocket.initializeAIWebSocket();")
         print("INFO: window.websocket.initializeAIWebSocket() called.")
 
-        # 3. Wait for the WebSocket to connect by directly checking its readyState.
-        # WebSocket.OPEN state is 1.
+        # 3. Wait for the server's 'ready' frame: the consumer has joined the conversation's group,
+        # so the response triggered below can't be missed.
         try:
             WebDriverWait(self.driver, 10).until(
-                lambda d: d.execute_script("return window.aiWebSocketReceiver && window.aiWebSocketReceiver.socket && window.aiWebSocketReceiver.socket.readyState === 1;")
+                lambda d: d.execute_script("return window.aiWebSocketReceiver && window.aiWebSocketReceiver.isOpen();")
             )
-            print("INFO: WebSocket connection established (verified via readyState).")
+            print("INFO: WebSocket connection established (verified via the server's ready frame).")
         except TimeoutException:
             self._get_browser_console_logs()
-            self.fail("Timed out waiting for WebSocket to connect. Check browser logs above and WebSocket readyState.")
-
-        # Give the WebSocket a *tiny* moment for any initial messages (like client_hello) to be sent,
-        # though readyState is usually sufficient.
-        time.sleep(0.1)
+            self.fail("Timed out waiting for WebSocket to be ready. Check browser logs above and WebSocket readyState.")
 
         # 4. Prepare the structured AI response payload
         ai_response_payload = {
@@ -132,3 +127,31 @@ class WebSocketAIResponseTest(AbstractExtensionPageTest):
         except TimeoutException:
             print("WARNING: Timed out waiting for WebSocket disconnect confirmation log.")
 
+
+    def test_event_stream_error_before_timeout_falls_back_once(self):
+        # The stream fails for good before its 'ready' timeout: the timeout mustn't give up again
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const errors = [];
+            window.addEventListener('error', (event) => errors.push(String(event.message)));
+            class FakeEventSource {
+                static CLOSED = 2;
+                constructor(url) { this.readyState = 0; window.__fakeEventSource = this; }
+                addEventListener() {}
+                close() { this.readyState = FakeEventSource.CLOSED; }
+            }
+            window.EventSource = FakeEventSource;
+            window.websocket.initializeAIWebSocket();
+            const receiver = window.aiWebSocketReceiver;
+            let longPolls = 0;
+            receiver.startLongPoll = () => { longPolls++; };
+            receiver.eventStreamTimeoutMs = 50;
+            receiver.fallBackToHttp();
+            window.__fakeEventSource.readyState = FakeEventSource.CLOSED;
+            window.__fakeEventSource.onerror();
+            setTimeout(() => {
+                receiver.close();
+                done({longPolls: longPolls, eventSource: receiver.eventSource, errors: errors});
+            }, 200);
+        """)
+        self.assertEqual(result, {"longPolls": 1, "eventSource": None, "errors": []})
@@ -0,0 +1,187 @@
+# saccessco/tests/test_accounting.py
+
+import datetime
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from saccessco import accounting
+from saccessco.accounting import UsageLedger, cost, site_domain
+from saccessco.ai import StubAIEngine, User, Model
+from saccessco.ai import chtgpt, gemini
+from saccessco.ai.history import compact
+from saccessco.conversation import Conversation
+from saccessco.tracing import conversation_ref
+
+PRICES = {
+    "big-model": {"prompt": 10.0, "cached": 1.0, "completion": 20.0},
+    "default": {"prompt": 1.0, "completion": 2.0},
+}
+USAGE = {"prompt_tokens": 1000, "cached_tokens": 400, "completion_tokens": 100}
+NOW = datetime.datetime(2025, 10, 22, 12, tzinfo=datetime.timezone.utc)
+
+
+def _message(role, text):
+    return {"role": role, "parts": [{"text": text}]}
+
+
+@override_settings(SACCESSCO_MODEL_PRICES=PRICES)
+class AccountingTests(SimpleTestCase):
+
+    def test_cost_counts_cached_tokens_at_their_price(self):
+        self.assertAlmostEqual(cost("big-model", USAGE), (600 * 10 + 400 * 1 + 100 * 20) / 1e6)
+        # Dated versions are priced as their model, unknown models at the default
+        self.assertAlmostEqual(cost("big-model-2025-10-01", USAGE), cost("big-model", USAGE))
+        self.assertAlmostEqual(cost("other", USAGE), (1000 * 1 + 100 * 2) / 1e6)
+        self.assertEqual(cost("big-model", None), 0.0)
+
+    def test_site_domain(self):
+        self.assertEqual(site_domain("https://www.example.com:8443/flights?to=MAD"), "www.example.com")
+        self.assertEqual(site_domain("https://shop.example.org"), "shop.example.org")
+        self.assertEqual(site_domain("example.net/path"), "example.net")
+        self.assertIsNone(site_domain(None))
+        self.assertIsNone(site_domain(""))
+
+    def test_usage_is_aggregated_per_conversation_model_domain_and_day(self):
+        ledger = UsageLedger()
+        ledger.set_domain("a", "example.com")
+        ledger.record("a", "big-model", USAGE, 1.5, now=NOW)
+        ledger.record("a", "other", USAGE, 0.5, now=NOW)
+        ledger.record("b", "big-model", {"prompt_tokens": 10, "completion_tokens": 1}, 0.1, now=NOW)
+
+        conversation = ledger.get("a")
+        self.assertEqual((conversation.calls, conversation.prompt_tokens, conversation.cached_tokens),
+                         (2, 2000, 800))
+        self.assertEqual(conversation.models, {"big-model": 1, "other": 1})
+        self.assertAlmostEqual(conversation.seconds, 2.0)
+
+        report = ledger.report()
+        self.assertEqual(report["total"]["calls"], 3)
+        self.assertEqual(report["by_model"]["big-model"]["calls"], 2)
+        self.assertEqual(report["by_domain"]["example.com"]["calls"], 2)
+        self.assertEqual(report["by_domain"]["unknown"]["calls"], 1)
+        self.assertEqual(report["by_day"]["2025-10-22"]["tokens"], 2 * 1100 + 11)
+        self.assertEqual([entry["conversation"] for entry in report["conversations"]],
+                         [conversation_ref("a"), conversation_ref("b")])
+        self.assertEqual([entry["conversation"] for entry in ledger.report(domain="example.com")["conversations"]],
+                         [conversation_ref("a")])
+
+    def test_oldest_conversations_are_forgotten_not_their_totals(self):
+        ledger = UsageLedger(max_conversations=2)
+        for conversation_id in "abc":
+            ledger.record(conversation_id, "big-model", USAGE, now=NOW)
+        self.assertIsNone(ledger.get("a"))
+        self.assertEqual(ledger.report()["total"]["calls"], 3)
+
+    def test_budgets(self):
+        ledger = UsageLedger()
+        ledger.record("a", "big-model", USAGE, now=NOW)
+        with override_settings(SACCESSCO_CONVERSATION_BUDGET_USD=0.001, SACCESSCO_DAILY_BUDGET_USD=None):
+            self.assertEqual(ledger.over_budget("a", now=NOW), "conversation")
+            self.assertIsNone(ledger.over_budget("b", now=NOW))
+        with override_settings(SACCESSCO_CONVERSATION_BUDGET_USD=None, SACCESSCO_DAILY_BUDGET_USD=0.001):
+            self.assertEqual(ledger.over_budget("b", now=NOW), "day")
+            self.assertIsNone(ledger.over_budget("b", now=NOW + datetime.timedelta(days=1)))
+        with override_settings(SACCESSCO_CONVERSATION_BUDGET_USD=None, SACCESSCO_DAILY_BUDGET_USD=None):
+            self.assertIsNone(ledger.over_budget("a", now=NOW))
+
+    def test_providers_cached_tokens(self):
+        gemini_chunk = SimpleNamespace(usage_metadata=SimpleNamespace(
+            prompt_token_count=1000, cached_content_token_count=400, candidates_token_count=100))
+        self.assertEqual(gemini._usage(gemini_chunk), USAGE)
+        openai_chunk = SimpleNamespace(usage=SimpleNamespace(
+            prompt_tokens=1000, prompt_tokens_details=SimpleNamespace(cached_tokens=400), completion_tokens=100))
+        self.assertEqual(chtgpt._usage(openai_chunk), USAGE)
+        openai_chunk.usage.prompt_tokens_details = None
+        self.assertEqual(chtgpt._usage(openai_chunk)["cached_tokens"], 0)
+
+    def test_compact_keeps_instructions_last_page_and_recent_messages(self):
+        history = [_message("model", "INSTRUCTIONS"),
+                   _message("user", "PAGE CHANGE\n<p>1</p>"), _message("model", "Analysis 1"),
+                   _message("user", "PAGE CHANGE\n<p>2</p>"), _message("model", "Analysis 2")]
+        for turn in range(10):
+            history += [_message("user", f"Prompt {turn}"), _message("model", f"Response {turn}")]
+
+        compacted, dropped = compact(history, 5, "INSTRUCTIONS")
+        texts = [entry["parts"][0]["text"] for entry in compacted]
+        self.assertEqual(texts, ["INSTRUCTIONS", "PAGE CHANGE\n<p>2</p>", "Analysis 2",
+                                 "Prompt 8", "Response 8", "Prompt 9", "Response 9"])
+        self.assertEqual(dropped, len(history) - len(compacted))
+        self.assertEqual(compact(compacted, 5, "INSTRUCTIONS"), (compacted, 0))
+
+
+@override_settings(SACCESSCO_MODEL_PRICES={"default": {"prompt": 1.0, "completion": 1.0}},
+                   SACCESSCO_STUB_LATENCY_SECONDS=0.0, SACCESSCO_CAPTURE=False)
+class ConversationAccountingTests(SimpleTestCase):
+
+    def setUp(self):
+        accounting.get_ledger().clear()
+        self.addCleanup(accounting.get_ledger().clear)
+
+    def _conversation(self, conversation_id):
+        conversation = Conversation(conversation_id=conversation_id, ai_engine=StubAIEngine())
+        conversation.channel_layer = InMemoryChannelLayer()
+        self.addCleanup(Conversation._instances.pop, conversation_id, None)
+        self.addCleanup(conversation.shutdown)
+        return conversation
+
+    @override_settings(SACCESSCO_CONVERSATION_BUDGET_USD=None, SACCESSCO_DAILY_BUDGET_USD=None)
+    def test_calls_are_accounted_to_the_conversation_and_its_site(self):
+        conversation = self._conversation("accounted_conv")
+        conversation.page_change("<html><body><p>Hi</p></body></html>", "https://example.com/page").result()
+        conversation.user_prompt("Search").result()
+        usage = accounting.get_ledger().get("accounted_conv")
+        self.assertEqual((usage.calls, usage.domain, usage.degraded), (2, "example.com", None))
+        self.assertGreater(usage.prompt_tokens, usage.completion_tokens)
+        self.assertGreater(usage.cost, 0)
+
+    @override_settings(SACCESSCO_CONVERSATION_BUDGET_USD=0.0, SACCESSCO_DAILY_BUDGET_USD=None,
+                       SACCESSCO_BUDGET_FALLBACK_MODELS={"stub": "stub-lite"}, SACCESSCO_BUDGET_HISTORY_MESSAGES=2)
+    def test_conversation_over_budget_is_degraded(self):
+        conversation = self._conversation("budget_conv")
+        for turn in range(3):
+            conversation.ai_engine.add_message_to_history(User, f"Prompt {turn}")
+            conversation.ai_engine.add_message_to_history(Model, f"Response {turn}")
+        accounting.get_ledger().record("budget_conv", "stub", {"prompt_tokens": 10, "completion_tokens": 1})
+        conversation.user_prompt("Search").result()
+
+        self.assertEqual(conversation.ai_engine.model_name, "stub-lite")
+        texts = [entry["parts"][0]["text"] for entry in conversation.ai_engine.get_chat_history()]
+        self.assertNotIn("Prompt 0", texts)
+        self.assertIn("Search", texts)
+        usage = accounting.get_ledger().get("budget_conv")
+        self.assertEqual(usage.degraded, "conversation")
+        self.assertIn("stub-lite", usage.models)
+
+
+class UsageAPIViewTests(APITestCase):
+
+    def setUp(self):
+        accounting.get_ledger().clear()
+        self.addCleanup(accounting.get_ledger().clear)
+
+    def test_report(self):
+        ledger = accounting.get_ledger()
+        ledger.record("cheap", "gpt-4o-mini", {"prompt_tokens": 100, "completion_tokens": 10}, 0.5)
+        ledger.record("costly", "gpt-4o", {"prompt_tokens": 1000, "completion_tokens": 10}, 0.2)
+        response = self.client.get(reverse('usage'), {"sort": "seconds", "limit": 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([entry["conversation"] for entry in response.data["conversations"]],
+                         [conversation_ref("cheap")])
+        self.assertNotIn(b'"cheap"', response.content)
+        self.assertEqual(set(response.data["by_model"]), {"gpt-4o-mini", "gpt-4o"})
+        self.assertIn("daily_usd", response.data["budgets"])
+        self.assertEqual(self.client.get(reverse('usage'), {"sort": "nope"}).status_code, 400)
+
+    @patch('saccessco.views.Conversation')
+    def test_page_change_site_from_url_or_origin(self, MockConversation):
+        self.client.post(reverse('page_change'), {"conversation_id": "c", "html": "<p>Hi</p>",
+                                                  "url": "https://example.com/a"}, format='json')
+        MockConversation.return_value.page_change.assert_called_with("<p>Hi</p>", "https://example.com/a")
+        self.client.post(reverse('page_change'), {"conversation_id": "c", "html": "<p>Hi</p>"}, format='json',
+                         HTTP_ORIGIN="https://shop.example.org")
+        MockConversation.return_value.page_change.assert_called_with("<p>Hi</p>", "https://shop.example.org")
@@ -0,0 +1,105 @@
+# saccessco/tests/test_capture.py
+
+import json
+import tempfile
+from pathlib import Path
+
+from channels.layers import InMemoryChannelLayer
+from django.test import SimpleTestCase, override_settings
+
+from saccessco.ai import StubAIEngine, User
+from saccessco.capture import Recorder, open_recorder, prompt_hash, read_capture
+from saccessco.capture.cached import CachedAIEngine
+from saccessco.capture.replayer import replay
+from saccessco.conversation import Conversation
+from saccessco.conversation.fingerprint import get_template_cache
+
+PAGE = "<html><body><main><button id='search'>Search</button></main></body></html>"
+
+
+@override_settings(SACCESSCO_STUB_LATENCY_SECONDS=0.0)
+class CaptureTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        get_template_cache().clear()
+
+    def _record_conversation(self):
+        with override_settings(SACCESSCO_CAPTURE=True, SACCESSCO_CAPTURE_DIR=self.directory.name):
+            conversation = Conversation(conversation_id="capture_conv", ai_engine=StubAIEngine())
+        conversation.channel_layer = InMemoryChannelLayer()
+        try:
+            conversation.page_change(PAGE).result()
+            conversation.user_prompt("Search for flights").result()
+        finally:
+            conversation.shutdown()
+            Conversation._instances.pop("capture_conv", None)
+        captures = list(Path(self.directory.name).glob("capture_conv-*.jsonl.gz"))
+        self.assertEqual(len(captures), 1)
+        return captures[0]
+
+    def test_off_by_default(self):
+        with override_settings(SACCESSCO_CAPTURE=False, SACCESSCO_CAPTURE_DIR=self.directory.name):
+            self.assertIsNone(open_recorder("conv"))
+        self.assertEqual(list(Path(self.directory.name).iterdir()), [])
+
+    def test_recorder_round_trip_and_truncated_capture(self):
+        path = Path(self.directory.name) / "capture.jsonl.gz"
+        recorder = Recorder(path, "conv")
+        recorder.record("user_prompt", prompt="Hello")
+        recorder.close()
+        recorder.record("user_prompt", prompt="After close")
+        events = list(read_capture(path))
+        self.assertEqual([event["event"] for event in events], ["start", "user_prompt"])
+        self.assertEqual(events[0]["conversation_id"], "conv")
+
+        # A killed worker leaves the events it flushed, without the gzip trailer
+        path.write_bytes(path.read_bytes()[:-8])
+        self.assertEqual([event["event"] for event in read_capture(path)], ["start", "user_prompt"])
+
+    def test_least_recently_written_captures_are_closed(self):
+        with override_settings(SACCESSCO_CAPTURE_OPEN_FILES=2):
+            recorders = [Recorder(Path(self.directory.name) / f"{i}.jsonl.gz", f"conv{i}") for i in range(4)]
+            self.assertEqual([recorder.is_open() for recorder in recorders], [False, False, True, True])
+            recorders[0].record("user_prompt", prompt="Hello again")
+            self.assertEqual([recorder.is_open() for recorder in recorders], [True, False, False, True])
+        for recorder in recorders:
+            recorder.close()
+        events = list(read_capture(recorders[0].path))
+        self.assertEqual([event["event"] for event in events], ["start", "user_prompt"])
+        self.assertEqual(events[1]["prompt"], "Hello again")
+
+    def test_conversation_recorded(self):
+        events = list(read_capture(self._record_conversation()))
+        kinds = [event["event"] for event in events]
+        for kind in ["start", "page_change", "user_prompt", "llm", "ai_response"]:
+            self.assertIn(kind, kinds)
+        prompt = next(event for event in events if event["event"] == "user_prompt")
+        response = next(event for event in events if event["event"] == "ai_response")
+        self.assertEqual(response["prompt_t"], prompt["t"])
+        self.assertGreaterEqual(response["t"], prompt["t"])
+        self.assertEqual(next(event for event in events if event["event"] == "page_change")["html"], PAGE)
+        self.assertTrue(all("prompt" not in event for event in events if event["event"] == "llm"))
+
+    def test_cached_engine_answers_recorded_prompts(self):
+        events = [{"event": "llm", "prompt_hash": prompt_hash("Hello"), "response": "Hi", "duration": 5.0},
+                  {"event": "llm", "prompt_hash": prompt_hash("Hello"), "response": "Hi again", "duration": 5.0}]
+        engine = CachedAIEngine(events, speed=0)
+        self.assertEqual(engine.respond_once(User, "Hello"), "Hi")
+        self.assertEqual(engine.respond_once(User, "Hello"), "Hi again")
+        self.assertEqual(engine.respond_once(User, "Hello"), "Hi again")
+        self.assertTrue(engine.respond_once(User, "Unknown").startswith("Error:"))
+        self.assertEqual((engine.hits, engine.misses), (3, 1))
+
+    def test_replay_with_cached_responses(self):
+        path = self._record_conversation()
+        report = replay(path, engine="cached", speed=0)
+        summary = report["summary"]
+        self.assertEqual((summary["prompts"], summary["page_changes"]), (1, 1))
+        self.assertEqual(summary["cache_misses"], 0)
+        self.assertGreater(summary["cache_hits"], 0)
+        self.assertEqual(report["prompts"][0]["prompt"], "Search for flights")
+        self.assertIsNotNone(report["prompts"][0]["recorded_latency"])
+        self.assertGreaterEqual(report["prompts"][0]["latency"], 0)
+        self.assertFalse(any(key.startswith("replay-") for key in Conversation._instances))
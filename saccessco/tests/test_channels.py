@@ -6,15 +6,19 @@ import sys # ADD THIS IMPORT
 import channels # ADD THIS IMPORT
 import asgiref # ADD THIS IMPORT
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from unittest import IsolatedAsyncioTestCase
+from unittest.mock import patch
 
-from channels.testing import WebsocketCommunicator
+import msgpack
+
+from channels.testing import ApplicationCommunicator, HttpCommunicator, WebsocketCommunicator
 from channels.layers import get_channel_layer
 from channels.routing import ProtocolTypeRouter, URLRouter
 
 from saccessco.consumers import AiConsumer
-from saccessco.routing import websocket_urlpatterns
+from saccessco.conversation.stream import get_stream
+from saccessco.routing import http_urlpatterns, websocket_urlpatterns
 
 # Make sure your CHANNEL_LAYERS are configured in settings.py:
 # CHANNEL_LAYERS = {
@@ -71,9 +75,10 @@ class AiConsumerChannelTests(TestCase, IsolatedAsyncioTestCase):
             f"/ws/saccessco/ai/{test_conversation_id}/"
         )
 
-        # 3. Connect the communicator
+        # 3. Connect the communicator, and wait until the consumer has joined its group
         connected, sub_protocol = await communicator.connect()
         self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(timeout=1.0), {"type": "ready"})
 
         # 4. Get the channel layer instance
         channel_layer = get_channel_layer()
@@ -106,4 +111,253 @@ class AiConsumerChannelTests(TestCase, IsolatedAsyncioTestCase):
         self.assertEqual(received_data, mock_ai_response_payload)
 
         # 9. Disconnect the communicator
-        await communicator.disconnect()
\ No newline at end of file
+        await communicator.disconnect()
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class AiConsumerFrameTests(TestCase, IsolatedAsyncioTestCase):
+    """
+    Tests the frames AiConsumer forwards to the WebSocket, on the in-memory channel layer.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.application = ProtocolTypeRouter({
+            "websocket": URLRouter(websocket_urlpatterns),
+        })
+
+    async def _connect(self, conversation_id):
+        communicator = WebsocketCommunicator(self.application, f"/ws/saccessco/ai/{conversation_id}/")
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(await communicator.receive_json_from(timeout=1), {"type": "ready"})
+        return communicator
+
+    async def test_pre_encoded_frame_is_forwarded_as_is(self):
+        communicator = await self._connect("frame_conv")
+        frame = '{"type":"ai_response","ai_response":{"speak":"Hello"}}'
+        await get_channel_layer().group_send(
+            f"{AiConsumer.GROUP_NAME_PREFIX}frame_conv", {'type': 'ai_response', 'text': frame})
+
+        self.assertEqual(await communicator.receive_from(timeout=1), frame)
+        await communicator.disconnect()
+
+    async def test_response_object_is_validated_and_encoded(self):
+        communicator = await self._connect("object_conv")
+        group_name = f"{AiConsumer.GROUP_NAME_PREFIX}object_conv"
+        await get_channel_layer().group_send(group_name, {'type': 'ai_response', 'ai_response': {'speak': 1}})
+        await get_channel_layer().group_send(group_name, {'type': 'ai_response', 'ai_response': {'speak': 'Hi'}})
+
+        # The invalid response is dropped, the valid one is sent
+        received = json.loads(await communicator.receive_from(timeout=1))
+        self.assertEqual(received, {'type': 'ai_response', 'ai_response': {'speak': 'Hi'}})
+        await communicator.disconnect()
+
+    @patch('saccessco.conversation.Conversation')
+    async def test_user_prompt_request_is_dispatched_and_acknowledged(self, mock_conversation_cls):
+        communicator = await self._connect("ingress_conv")
+        await communicator.send_json_to({"type": "user_prompt", "request_id": "7", "prompt": "Search flights",
+                                         "conversation_id": "someone_elses_conv"})
+
+        ack = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(ack, {"type": "ack", "request_id": "7", "status_code": 200,
+                               "response": {"message": "User prompt received successfully", "status": "success"}})
+        # The conversation comes from the socket's URL
+        mock_conversation_cls.assert_called_once_with(conversation_id="ingress_conv")
+        mock_conversation_cls.return_value.user_prompt.assert_called_once_with("Search flights")
+        await communicator.disconnect()
+
+    @patch('saccessco.conversation.Conversation')
+    async def test_page_change_request_is_dispatched(self, mock_conversation_cls):
+        communicator = await self._connect("ingress_page_conv")
+        await communicator.send_json_to({"type": "page_change", "request_id": "1", "html": "<p>Hi</p>"})
+
+        ack = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(ack["status_code"], 200)
+        self.assertEqual(ack["response"]["message"], "Page change received successfully")
+        mock_conversation_cls.return_value.page_change.assert_called_once_with("<p>Hi</p>", None)
+        await communicator.disconnect()
+
+    @patch('saccessco.conversation.Conversation')
+    async def test_invalid_request_is_rejected_with_serializer_errors(self, mock_conversation_cls):
+        communicator = await self._connect("ingress_invalid_conv")
+        await communicator.send_json_to({"type": "user_prompt", "request_id": "2", "prompt": "   "})
+
+        ack = await communicator.receive_json_from(timeout=1)
+        self.assertEqual(ack["request_id"], "2")
+        self.assertEqual(ack["status_code"], 400)
+        self.assertIn("prompt", ack["response"])
+        mock_conversation_cls.assert_not_called()
+        await communicator.disconnect()
+
+    async def test_receipt_ends_the_trace(self):
+        from saccessco import tracing
+
+        trace = tracing.new_trace("user_prompt")
+        with tracing.activate(trace):
+            with tracing.span("group_send"):
+                pass
+        communicator = await self._connect("receipt_conv")
+        await communicator.send_json_to({"type": "receipt", "trace_id": trace.trace_id, "seq": 1})
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        self.assertEqual(trace.find("client_receipt").attributes, {"transport": "websocket"})
+        await communicator.disconnect()
+
+    async def test_non_json_message_gets_error_frame(self):
+        communicator = await self._connect("ingress_garbage_conv")
+        await communicator.send_to(text_data="not json")
+
+        self.assertEqual((await communicator.receive_json_from(timeout=1))["type"], "error")
+        await communicator.disconnect()
+
+    async def test_msgpack_subprotocol_gets_binary_frames(self):
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/msgpack_conv/",
+                                             subprotocols=[AiConsumer.MSGPACK_SUBPROTOCOL])
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertEqual(subprotocol, AiConsumer.MSGPACK_SUBPROTOCOL)
+        self.assertEqual(msgpack.unpackb(await communicator.receive_from(timeout=1)), {"type": "ready"})
+
+        frame = '{"type":"ai_response","ai_response":{"speak":"Hello"}}'
+        await get_channel_layer().group_send(
+            f"{AiConsumer.GROUP_NAME_PREFIX}msgpack_conv", {'type': 'ai_response', 'text': frame})
+
+        self.assertEqual(msgpack.unpackb(await communicator.receive_from(timeout=1)), json.loads(frame))
+        await communicator.disconnect()
+
+    @patch('saccessco.conversation.Conversation')
+    async def test_msgpack_request_is_acknowledged_in_msgpack(self, mock_conversation_cls):
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/msgpack_req_conv/",
+                                             subprotocols=[AiConsumer.MSGPACK_SUBPROTOCOL])
+        await communicator.connect()
+        self.assertEqual(msgpack.unpackb(await communicator.receive_from(timeout=1)), {"type": "ready"})
+        await communicator.send_to(bytes_data=msgpack.packb({"type": "user_prompt", "request_id": "3", "prompt": "Hi"}))
+
+        ack = msgpack.unpackb(await communicator.receive_from(timeout=1))
+        self.assertEqual((ack["type"], ack["request_id"], ack["status_code"]), ("ack", "3", 200))
+        mock_conversation_cls.return_value.user_prompt.assert_called_once_with("Hi")
+        await communicator.disconnect()
+
+    async def test_json_is_default_without_subprotocol(self):
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/json_default_conv/")
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        self.assertIsNone(subprotocol)
+        self.assertEqual(await communicator.receive_from(timeout=1), '{"type":"ready"}')
+        await communicator.disconnect()
+
+    def _publish(self, conversation_id, *speeches):
+        stream = get_stream(conversation_id)
+        for speech in speeches:
+            stream.publish({"type": "ai_response", "ai_response": {"speak": speech}}, lambda seq, text: None)
+
+    async def test_missed_responses_replayed_before_ready(self):
+        self._publish("replay_conv", "One", "Two", "Three")
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/replay_conv/?last_seq=1")
+        await communicator.connect()
+        replayed = [await communicator.receive_json_from(timeout=1) for _ in range(2)]
+        self.assertEqual([(frame["seq"], frame["ai_response"]["speak"]) for frame in replayed],
+                         [(2, "Two"), (3, "Three")])
+        self.assertEqual(await communicator.receive_json_from(timeout=1), {"type": "ready", "last_seq": 3})
+        await communicator.disconnect()
+
+    async def test_nothing_replayed_without_last_seq(self):
+        self._publish("no_replay_conv", "One")
+        communicator = await self._connect("no_replay_conv")
+        self.assertTrue(await communicator.receive_nothing(timeout=0.1))
+        await communicator.disconnect()
+
+    async def test_replayed_response_not_sent_twice(self):
+        # Published after the socket joined the group but before the replay read the stream
+        self._publish("dup_conv", "One")
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/dup_conv/?last_seq=0")
+        await communicator.connect()
+        self.assertEqual((await communicator.receive_json_from(timeout=1))["seq"], 1)
+        self.assertEqual(await communicator.receive_json_from(timeout=1), {"type": "ready", "last_seq": 1})
+        group = f"{AiConsumer.GROUP_NAME_PREFIX}dup_conv"
+        await get_channel_layer().group_send(group, {'type': 'ai_response', 'seq': 1, 'text': '{"seq":1}'})
+        await get_channel_layer().group_send(group, {'type': 'ai_response', 'seq': 2, 'text': '{"seq":2}'})
+        self.assertEqual(await communicator.receive_from(timeout=1), '{"seq":2}')
+        await communicator.disconnect()
+
+    async def test_client_ahead_of_restarted_server_starts_again(self):
+        self._publish("restarted_conv", "One")
+        communicator = WebsocketCommunicator(self.application, "/ws/saccessco/ai/restarted_conv/?last_seq=7")
+        await communicator.connect()
+        self.assertEqual((await communicator.receive_json_from(timeout=1))["ai_response"]["speak"], "One")
+        self.assertEqual(await communicator.receive_json_from(timeout=1), {"type": "ready", "last_seq": 1})
+        await communicator.disconnect()
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}},
+                   SACCESSCO_HEARTBEAT_SECONDS=0.05, SACCESSCO_LONG_POLL_SECONDS=0.05)
+class ResponseHttpConsumerTests(TestCase, IsolatedAsyncioTestCase):
+    """
+    Tests the Server-Sent Events and long-poll deliveries of AI responses.
+    """
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.application = ProtocolTypeRouter({
+            "http": URLRouter(http_urlpatterns),
+        })
+
+    def _publish(self, conversation_id, *speeches):
+        stream = get_stream(conversation_id)
+        for speech in speeches:
+            stream.publish({"type": "ai_response", "ai_response": {"speak": speech}}, lambda seq, text: None)
+
+    async def _open_events(self, path, headers=()):
+        communicator = ApplicationCommunicator(self.application, {
+            "type": "http", "method": "GET", "path": path.partition("?")[0],
+            "query_string": path.partition("?")[2].encode(), "headers": list(headers),
+        })
+        await communicator.send_input({"type": "http.request", "body": b""})
+        start = await communicator.receive_output(timeout=1)
+        self.assertEqual(start["status"], 200)
+        self.assertIn((b"Content-Type", b"text/event-stream"), start["headers"])
+        return communicator
+
+    async def _next_event(self, communicator):
+        message = await communicator.receive_output(timeout=1)
+        self.assertTrue(message["more_body"])
+        return message["body"].decode()
+
+    async def test_event_stream_resumes_after_last_event_id(self):
+        self._publish("sse_conv", "One", "Two")
+        communicator = await self._open_events("/saccessco/events/sse_conv/?last_seq=0",
+                                               [(b"last-event-id", b"1")])
+        self.assertEqual(await self._next_event(communicator), 'event: ready\ndata: {"type":"ready","last_seq":1}\n\n')
+        self.assertTrue((await self._next_event(communicator)).startswith('id: 2\ndata: {"type":"ai_response"'))
+        self.assertEqual(await self._next_event(communicator), ": heartbeat\n\n")
+
+        group = f"{AiConsumer.GROUP_NAME_PREFIX}sse_conv"
+        await get_channel_layer().group_send(group, {"type": "ai_response", "seq": 2, "text": '{"seq":2}'})
+        await get_channel_layer().group_send(group, {"type": "ai_response", "seq": 3, "text": '{"seq":3}'})
+        event = await self._next_event(communicator)
+        while event == ": heartbeat\n\n":
+            event = await self._next_event(communicator)
+        self.assertEqual(event, 'id: 3\ndata: {"seq":3}\n\n')
+
+        await communicator.send_input({"type": "http.disconnect"})
+        await communicator.wait(timeout=1)
+
+    async def test_poll_returns_replayed_responses_at_once(self):
+        self._publish("poll_conv", "One", "Two", "Three")
+        response = await HttpCommunicator(self.application, "GET", "/saccessco/poll/poll_conv/?last_seq=1").get_response()
+        body = json.loads(response["body"])
+        self.assertEqual(body["last_seq"], 3)
+        self.assertEqual([frame["ai_response"]["speak"] for frame in body["responses"]], ["Two", "Three"])
+
+    @override_settings(SACCESSCO_LONG_POLL_SECONDS=5)
+    async def test_poll_waits_for_a_response(self):
+        communicator = HttpCommunicator(self.application, "GET", "/saccessco/poll/waiting_conv/?last_seq=0")
+        response = asyncio.ensure_future(communicator.get_response(timeout=5))
+        await asyncio.sleep(0.1)
+        await get_channel_layer().group_send(f"{AiConsumer.GROUP_NAME_PREFIX}waiting_conv",
+                                             {"type": "ai_response", "seq": 1, "text": '{"seq":1}'})
+        self.assertEqual(json.loads((await response)["body"]), {"last_seq": 1, "responses": [{"seq": 1}]})
+
+    async def test_poll_times_out_empty(self):
+        response = await HttpCommunicator(self.application, "GET", "/saccessco/poll/idle_conv/?last_seq=0").get_response()
+        self.assertEqual(json.loads(response["body"]), {"last_seq": 0, "responses": []})
+        self.assertIn((b"Access-Control-Allow-Origin", b"*"), response["headers"])
@@ -9,6 +9,7 @@ from concurrent.futures import ThreadPoolExecutor
 
 # Import the Conversation class and its dependencies
 from saccessco.conversation import Conversation
+from saccessco.conversation.fingerprint import get_template_cache
 from saccessco.ai import User, Model
 from saccessco.consumers import AiConsumer
 
@@ -72,6 +73,8 @@ class TestConversation(unittest.TestCase):
             if hasattr(instance, 'executor') and not instance.executor._shutdown:
                 instance.shutdown()
             del Conversation._instances[instance_id]  # Clear the instance from the registry
+        # The page template cache is process-wide; don't let analyses leak between tests
+        get_template_cache().clear()
 
     @patch('saccessco.ai.AIEngine')  # Mock the AIEngine dependency
     @patch('channels.layers.get_channel_layer')  # Mock the channel layer dependency
@@ -98,7 +101,28 @@ class TestConversation(unittest.TestCase):
         self.assertIsNot(conv1, conv3)  # Verify they are different objects
         self.assertTrue(conv3._initialized)  # Should be True after __init__ completes
 
-    @patch('saccessco.conversation.AIEngine')
+    @patch('saccessco.conversation.create_engine')
+    @patch('channels.layers.get_channel_layer')
+    def test_concurrent_requests_get_an_initialized_instance(self, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Requests of a new conversation in other threads wait for the first one to initialize it.
+        """
+        mock_get_channel_layer.return_value = InMemoryChannelLayer()
+        mock_ai_engine_cls.side_effect = lambda: time.sleep(0.1) or MagicMock()
+
+        def _request(_):
+            conversation = Conversation(conversation_id="race_id")
+            # Initialized by the time it's returned
+            return conversation, hasattr(conversation, '_slots')
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(_request, range(4)))
+
+        self.assertTrue(all(conversation is results[0][0] for conversation, _ in results))
+        self.assertEqual([initialized for _, initialized in results], [True] * 4)
+        mock_ai_engine_cls.assert_called_once_with()
+
+    @patch('saccessco.conversation.create_engine')
     @patch('channels.layers.get_channel_layer')
     def test_page_change_calls_ai_engine(self, mock_get_channel_layer, mock_ai_engine_cls):
         """
@@ -133,7 +157,7 @@ class TestConversation(unittest.TestCase):
         # Assert AIEngine.add_message_to_history was called
         mock_ai_engine_instance.add_message_to_history.assert_called_once_with(Model, "Mocked page analysis content")
 
-    @patch('saccessco.conversation.AIEngine')
+    @patch('saccessco.conversation.create_engine')
     @patch('saccessco.conversation.get_channel_layer')
     @patch('saccessco.conversation.async_to_sync') # <--- ADD THIS DECORATOR HERE
     def test_user_prompt_calls_ai_engine_and_sends_websocket(self, mock_async_to_sync, mock_get_channel_layer, mock_ai_engine_cls):
@@ -157,7 +181,7 @@ class TestConversation(unittest.TestCase):
         mock_ai_engine_instance = MagicMock()
         mock_ai_engine_cls.return_value = mock_ai_engine_instance
         mock_ai_response_dict = {
-            "execute": ["action1", "action2"],
+            "execute": {"plan": [{"action": "click", "selector": "#action1", "data": None}], "parameters": {}},
             "speak": "This is a mock AI response for the user."
         }
         mock_ai_engine_instance.respond.return_value = json.dumps(mock_ai_response_dict)
@@ -188,17 +212,17 @@ class TestConversation(unittest.TestCase):
 
         # 2. Assert that the *synchronous callable* returned by async_to_sync was called
         expected_group_name = f"{AiConsumer.GROUP_NAME_PREFIX}{conv.id}"
-        expected_payload_for_channel_layer = {
-            'type': 'ai_response',
-            'ai_response': mock_ai_response_dict,
-        }
-        mock_sync_group_send_callable.assert_called_once_with(
-            expected_group_name,
-            expected_payload_for_channel_layer
-        )
+        # The response is validated and encoded once, subscribers forward the text as is
+        mock_sync_group_send_callable.assert_called_once()
+        group_name, event = mock_sync_group_send_callable.call_args[0]
+        self.assertEqual(group_name, expected_group_name)
+        self.assertEqual(event['type'], 'ai_response')
+        self.assertEqual(event['seq'], conv._stream.last_seq)
+        self.assertEqual(json.loads(event['text']),
+                         {'type': 'ai_response', 'seq': event['seq'], 'ai_response': mock_ai_response_dict})
         # --- END NEW ASSERTIONS ---
 
-    @patch('saccessco.conversation.AIEngine')
+    @patch('saccessco.conversation.create_engine')
     @patch('channels.layers.get_channel_layer')
     def test_user_prompt_json_parsing_error(self, mock_get_channel_layer, mock_ai_engine_cls):
         """
@@ -247,7 +271,7 @@ class TestConversation(unittest.TestCase):
             self.assertTrue(sent_payload['ai_response']['raw_ai_response'].startswith("This is not valid JSON."))
         # --- END CRITICAL CHANGE ---
 
-    @patch('saccessco.conversation.AIEngine')
+    @patch('saccessco.conversation.create_engine')
     @patch('channels.layers.get_channel_layer')
     def test_shutdown_executor(self, mock_get_channel_layer, mock_ai_engine_cls):
         """
@@ -266,3 +290,158 @@ class TestConversation(unittest.TestCase):
 
         conv.shutdown()
         executor_mock.shutdown.assert_called_once_with(wait=True)
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('saccessco.conversation.get_channel_layer')
+    @patch('saccessco.conversation.async_to_sync')
+    def test_user_prompt_repairs_dead_selectors(self, mock_async_to_sync, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that a plan with a selector missing from the last page change gets one
+        repair round before it is sent.
+        """
+        mock_get_channel_layer.return_value = MagicMock(spec=InMemoryChannelLayer)
+        mock_sync_group_send_callable = MagicMock()
+        mock_async_to_sync.return_value = mock_sync_group_send_callable
+
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        dead_plan = {"execute": {"plan": [{"action": "focusElement", "selector": "#missing", "data": None}],
+                                 "parameters": {}}, "speak": ""}
+        repaired_plan = {"execute": {"plan": [{"action": "focusElement", "selector": "#query", "data": None}],
+                                     "parameters": {}}, "speak": "Focusing the search box."}
+        mock_ai_engine_instance.respond.side_effect = [
+            "Mocked page analysis content", json.dumps(dead_plan), json.dumps(repaired_plan)
+        ]
+
+        conv = Conversation(conversation_id="selector_repair_test")
+        conv.page_change("<html><body><input id='query'></body></html>")
+        conv.user_prompt("Focus the search box").result(timeout=5)
+
+        self.assertEqual(mock_ai_engine_instance.respond.call_count, 3)
+        self.assertTrue(mock_ai_engine_instance.respond.call_args_list[2][0][1].startswith("SELECTOR REPAIR"))
+        sent_payload = mock_sync_group_send_callable.call_args[0][1]
+        self.assertEqual(json.loads(sent_payload['text'])['ai_response']['speak'], "Focusing the search box.")
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('saccessco.conversation.get_channel_layer')
+    @patch('saccessco.conversation.async_to_sync')
+    def test_user_prompt_sends_optimized_plan(self, mock_async_to_sync, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that redundant plan steps are removed before the plan is sent.
+        """
+        mock_get_channel_layer.return_value = MagicMock(spec=InMemoryChannelLayer)
+        mock_sync_group_send_callable = MagicMock()
+        mock_async_to_sync.return_value = mock_sync_group_send_callable
+
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        plan = [{"action": "scrollTo", "selector": "#go", "data": None},
+                {"action": "waitForElement", "selector": "#go", "data": None},
+                {"action": "click", "selector": "#go", "data": None}]
+        mock_ai_engine_instance.respond.return_value = json.dumps(
+            {"execute": {"plan": plan, "parameters": {}}, "speak": "Searching."})
+
+        conv = Conversation(conversation_id="plan_optimizer_test")
+        conv.user_prompt("Search").result(timeout=5)
+
+        sent_payload = mock_sync_group_send_callable.call_args[0][1]
+        self.assertEqual(json.loads(sent_payload['text'])['ai_response']['execute']['plan'], plan[2:])
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('saccessco.conversation.get_channel_layer')
+    @patch('saccessco.conversation.async_to_sync')
+    def test_user_prompt_resolves_null_parameters(self, mock_async_to_sync, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that a null parameter given a value earlier in the conversation is filled in
+        before the plan is sent, and that unknown ones are left for the user.
+        """
+        mock_get_channel_layer.return_value = MagicMock(spec=InMemoryChannelLayer)
+        mock_sync_group_send_callable = MagicMock()
+        mock_async_to_sync.return_value = mock_sync_group_send_callable
+
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        plan = [{"action": "typeInto", "selector": "#to", "data": "destination"}]
+        mock_ai_engine_instance.respond.side_effect = [
+            json.dumps({"execute": {"plan": plan, "parameters": {"destination": "Madrid"}}, "speak": ""}),
+            json.dumps({"execute": {"plan": plan, "parameters": {"destination": None, "full_name": None}},
+                        "speak": ""}),
+        ]
+
+        conv = Conversation(conversation_id="slot_memory_test")
+        conv.user_prompt("Fly to Madrid").result(timeout=5)
+        conv.user_prompt("Type the destination again").result(timeout=5)
+
+        sent_payload = mock_sync_group_send_callable.call_args[0][1]
+        self.assertEqual(json.loads(sent_payload['text'])['ai_response']['execute']['parameters'],
+                         {"destination": "Madrid", "full_name": None})
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('channels.layers.get_channel_layer')
+    def test_large_page_change_is_analysed_by_region(self, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that a page above the chunking threshold is analysed region by region
+        and recorded as a single merged analysis turn.
+        """
+        from django.test import override_settings
+
+        mock_get_channel_layer.return_value = InMemoryChannelLayer()
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        mock_ai_engine_instance.respond_once.return_value = "Region analysis"
+
+        conv = Conversation(conversation_id="chunked_page_change_test")
+        test_html = "<html><body><header>Logo</header><main><form id='f'></form></main></body></html>"
+        with override_settings(SACCESSCO_CHUNKED_ANALYSIS_THRESHOLD=10):
+            conv.page_change(test_html)
+            conv.executor.submit(lambda: None).result(timeout=5)
+
+        mock_ai_engine_instance.respond.assert_not_called()
+        self.assertEqual(mock_ai_engine_instance.respond_once.call_count, 2)
+        history_calls = mock_ai_engine_instance.add_message_to_history.call_args_list
+        self.assertEqual(len(history_calls), 2)
+        self.assertEqual(history_calls[0][0][0], User)
+        self.assertIn("header, main", history_calls[0][0][1])
+        self.assertEqual(history_calls[1][0][0], Model)
+        self.assertIn("## Region: main\nRegion analysis", history_calls[1][0][1])
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('channels.layers.get_channel_layer')
+    def test_page_change_with_known_layout_skips_ai_engine(self, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that a second page with the same layout reuses the first analysis
+        with its own labels instead of calling AIEngine.respond.
+        """
+        mock_get_channel_layer.return_value = InMemoryChannelLayer()
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        mock_ai_engine_instance.respond.return_value = "Click 'Search flights to Madrid' to search."
+
+        conv = Conversation(conversation_id="page_template_test")
+        conv.page_change("<html><body><button aria-label='Search flights to Madrid'>Go</button></body></html>")
+        conv.page_change("<html><body><button aria-label='Search flights to Paris'>Go</button></body></html>")
+        conv.executor.submit(lambda: None).result(timeout=5)
+
+        mock_ai_engine_instance.respond.assert_called_once()
+        last_call = mock_ai_engine_instance.add_message_to_history.call_args_list[-1]
+        self.assertEqual(last_call[0], (Model, "Click 'Search flights to Paris' to search."))
+
+    @patch('saccessco.conversation.create_engine')
+    @patch('channels.layers.get_channel_layer')
+    def test_page_analyses_are_not_shared_between_conversations(self, mock_get_channel_layer, mock_ai_engine_cls):
+        """
+        Tests that a page with the layout of another conversation's page is analysed afresh,
+        as the other analysis quotes that conversation's page.
+        """
+        mock_get_channel_layer.return_value = InMemoryChannelLayer()
+        mock_ai_engine_instance = MagicMock()
+        mock_ai_engine_cls.return_value = mock_ai_engine_instance
+        mock_ai_engine_instance.respond.return_value = "Click 'Search flights to Madrid' to search."
+
+        for conversation_id in ("page_template_a", "page_template_b"):
+            conv = Conversation(conversation_id=conversation_id)
+            conv.page_change("<html><body><button aria-label='Search flights to Madrid'>Go</button></body></html>",
+                             url="https://flights.example.com")
+            conv.executor.submit(lambda: None).result(timeout=5)
+
+        self.assertEqual(mock_ai_engine_instance.respond.call_count, 2)
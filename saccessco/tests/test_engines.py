@@ -0,0 +1,45 @@
+# saccessco/tests/test_engines.py
+
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from saccessco import ai
+from saccessco.ai import create_engine, engine_class
+from saccessco.ai.stub import AIEngine as StubEngine
+
+
+class EngineRegistryTests(SimpleTestCase):
+
+    def test_engine_of_the_settings(self):
+        with override_settings(SACCESSCO_AI_ENGINE="stub"):
+            self.assertIs(engine_class(), StubEngine)
+        self.assertIs(engine_class("stub"), StubEngine)
+        engine = create_engine("stub", initial_instructions="")
+        self.assertIsInstance(engine, StubEngine)
+        self.assertEqual(engine.get_chat_history(), [])
+
+    @override_settings(SACCESSCO_AI_ENGINES={"cached": "saccessco.capture.cached.CachedAIEngine"})
+    def test_engines_are_dotted_paths(self):
+        from saccessco.capture.cached import CachedAIEngine
+
+        self.assertIs(engine_class("cached"), CachedAIEngine)
+        with self.assertRaisesMessage(ValueError, "expected one of cached"):
+            engine_class("stub")
+
+    def test_former_attributes(self):
+        self.assertIs(ai.StubAIEngine, StubEngine)
+        with self.assertRaises(AttributeError):
+            ai.NoSuchEngine
+
+    def test_provider_sdks_are_imported_when_their_engine_is_used(self):
+        code = ("import sys, django; django.setup(); import saccessco.conversation, saccessco.views; "
+                "print(sorted({'google.genai', 'openai'} & set(sys.modules)))")
+        environ = dict(os.environ, DJANGO_SETTINGS_MODULE="saccessco.settings",
+                       PYTHONPATH=str(settings.BASE_DIR.parent))
+        output = subprocess.run([sys.executable, "-c", code], env=environ, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "[]")
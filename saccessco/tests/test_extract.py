@@ -0,0 +1,165 @@
+# saccessco/tests/test_extract.py
+
+import json
+import random
+import unittest
+
+from benchmarks.extract import legacy_extract_json_and_preamble
+from saccessco.conversation.extract import extract_json_and_preamble, repair_json
+from saccessco.validators import validate_ai_response
+
+
+def _random_value(rng: random.Random, depth: int = 0):
+    kind = rng.randrange(6 if depth < 3 else 4)
+    if kind == 0:
+        return rng.randint(-1000, 1000)
+    if kind == 1:
+        return rng.choice([True, False, None])
+    if kind in (2, 3):
+        alphabet = "abc xyz,:{}[]'\"\\`é"
+        return "".join(rng.choice(alphabet) for _ in range(rng.randrange(12)))
+    if kind == 4:
+        return [_random_value(rng, depth + 1) for _ in range(rng.randrange(4))]
+    return {f"k{i}": _random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+
+
+def _random_response(rng: random.Random):
+    obj = {"speak": _random_value(rng), "execute": {"plan": [_random_value(rng, 1)], "parameters": {}}}
+    body = json.dumps(obj, indent=rng.choice([None, 2]))
+    preamble = rng.choice(["", "Sure.", "Here is the plan:\n", "Okay, I'll do that."])
+    epilogue = rng.choice(["", "\nLet me know!", " Done."])
+    layout = rng.randrange(3)
+    if layout == 0:
+        return obj, f"{preamble}```json\n{body}\n```{epilogue}"
+    if layout == 1:
+        return obj, f"{preamble}```\n{body}\n```{epilogue}"
+    return obj, f"{preamble}{body}{epilogue}"
+
+
+class LegacyCompatibilityTests(unittest.TestCase):
+
+    def test_fuzz_matches_legacy_extractor(self):
+        rng = random.Random(1234)
+        for _ in range(2000):
+            obj, response = _random_response(rng)
+            with self.subTest(response=response):
+                self.assertEqual(extract_json_and_preamble(response), legacy_extract_json_and_preamble(response))
+                self.assertEqual(extract_json_and_preamble(response)[1], obj)
+
+    def test_no_json_raises_value_error(self):
+        for response in ["", "Just some speech.", "An open { brace only", "```\nnot json\n```"]:
+            with self.subTest(response=response):
+                with self.assertRaises(ValueError):
+                    extract_json_and_preamble(response)
+                with self.assertRaises(ValueError):
+                    legacy_extract_json_and_preamble(response)
+
+    def test_lone_fence_inside_a_bare_object(self):
+        for response in ['{"speak": "use ``` fence"}', 'Sure. {"speak": "```json", "execute": {"plan": []}}']:
+            with self.subTest(response=response):
+                self.assertEqual(extract_json_and_preamble(response), legacy_extract_json_and_preamble(response))
+
+    def test_none_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            extract_json_and_preamble(None)
+
+
+class ExtractionTests(unittest.TestCase):
+
+    def test_first_of_several_objects(self):
+        response = 'First {"speak": "one"} then {"speak": "two"}'
+        self.assertEqual(extract_json_and_preamble(response), ('First  then {"speak": "two"}', {"speak": "one"}))
+        with self.assertRaises(ValueError):
+            legacy_extract_json_and_preamble(response)
+
+    def test_braces_inside_strings_are_skipped(self):
+        response = 'Plan: {"speak": "use } and { freely", "execute": {"plan": []}}'
+        preamble, obj = extract_json_and_preamble(response)
+        self.assertEqual(preamble, "Plan:")
+        self.assertEqual(obj["speak"], "use } and { freely")
+
+    def test_placeholder_braces_before_object_are_skipped(self):
+        preamble, obj = extract_json_and_preamble('Typing {destination} now. {"speak": "ok"}')
+        self.assertEqual(preamble, "Typing {destination} now.")
+        self.assertEqual(obj, {"speak": "ok"})
+
+    def test_json_fence_preferred_over_earlier_generic_fence(self):
+        response = 'Example:\n```\nprint(1)\n```\nPlan:\n```json\n{"speak": "ok"}\n```'
+        preamble, obj = extract_json_and_preamble(response)
+        self.assertEqual(obj, {"speak": "ok"})
+        self.assertEqual(preamble, "Example:\n```\nprint(1)\n```\nPlan:")
+
+    def test_object_inside_other_language_fence(self):
+        preamble, obj = extract_json_and_preamble('```javascript\nconst plan = {"speak": "ok"};\n```')
+        self.assertEqual(obj, {"speak": "ok"})
+        self.assertEqual(preamble, "")
+
+    def test_truncated_fence(self):
+        preamble, obj = extract_json_and_preamble('Here:\n```json\n{"speak": "Searching.", "execute": {"pl')
+        self.assertEqual(preamble, "Here:")
+        self.assertEqual(obj, {"speak": "Searching."})
+
+
+class RepairTests(unittest.TestCase):
+
+    def test_trailing_commas(self):
+        self.assertEqual(json.loads(repair_json('{"plan": [1, 2, ], "a": {"b": 1,},}')),
+                         {"plan": [1, 2], "a": {"b": 1}})
+
+    def test_single_quotes(self):
+        self.assertEqual(json.loads(repair_json("{'speak': 'Say \"hi\"', 'n': 'it\\'s'}")),
+                         {"speak": 'Say "hi"', "n": "it's"})
+
+    def test_truncated_member_is_dropped_whole(self):
+        self.assertEqual(json.loads(repair_json('{"speak": "ok", "execute": {"plan": [{"action": "cl')),
+                         {"speak": "ok"})
+
+    def test_truncated_after_colon(self):
+        self.assertEqual(json.loads(repair_json('{"speak": "ok", "execute":')), {"speak": "ok"})
+
+    def test_truncated_number_is_dropped(self):
+        self.assertEqual(json.loads(repair_json('{"speak": "ok", "n": 12')), {"speak": "ok"})
+
+    def test_truncated_after_complete_member(self):
+        self.assertEqual(json.loads(repair_json('{"speak": "ok", "execute": {"plan": [], "parameters": {}},')),
+                         {"speak": "ok", "execute": {"plan": [], "parameters": {}}})
+        self.assertEqual(json.loads(repair_json('["a", "b"')), ["a", "b"])
+
+    def test_fuzz_truncated_plans_validate(self):
+        rng = random.Random(4321)
+        actions = ["click", "typeInto", "enter", "scrollTo"]
+        for _ in range(500):
+            members = [("speak", "Searching flights, {'to': \"Madrid\"}, [1]."),
+                       ("execute", {"plan": [{"action": rng.choice(actions), "selector": f"#field-{i}",
+                                              "data": rng.choice([None, "destination", 3])}
+                                             for i in range(rng.randrange(4))],
+                                    "parameters": {"destination": "Madrid"}})]
+            rng.shuffle(members)
+            indent = rng.choice([None, 2])
+            body = json.dumps(dict(members), indent=indent)
+            # Where the first member ends: a shorter response has nothing to repair
+            first_end = len(json.dumps(dict(members[:1]), indent=indent)[:-1].rstrip())
+            cut = rng.randrange(1, len(body))
+            response = "```json\n" + body[:cut]
+            with self.subTest(response=response):
+                try:
+                    preamble, obj = extract_json_and_preamble(response)
+                except ValueError:
+                    self.assertLess(cut, first_end)
+                    continue
+                self.assertTrue(validate_ai_response({"type": "ai_response", "ai_response": obj}))
+
+    def test_truncated_first_member_is_not_repaired(self):
+        with self.assertRaises(ValueError):
+            json.loads(repair_json('{"speak": "Sea'))
+
+    def test_truncated_key_is_dropped(self):
+        self.assertEqual(json.loads(repair_json('{"speak": "ok", "exec')), {"speak": "ok"})
+
+    def test_valid_json_unchanged(self):
+        text = '{"a": [1, {"b": "c, }"}], "d": null}'
+        self.assertEqual(repair_json(text), text)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# saccessco/tests/test_fingerprint.py
+
+import unittest
+
+from saccessco.conversation.fingerprint import fingerprint_page, parameterise, PageTemplateCache
+from saccessco.conversation.snapshot import parse_snapshot
+
+
+def results_page(destination, rows, date="October 22, 2025"):
+    items = "".join(f"<li class='row' style='order:{i}'><span>Flight {i}</span>"
+                    f"<button aria-label='Select flight {i}'>Select</button></li>" for i in range(rows))
+    return (f"<html><body><h1>Flights to {destination}</h1>"
+            f"<button data-testid='depart-btn' aria-label='Depart {date}'>Depart</button>"
+            f"<ul>{items}</ul></body></html>")
+
+
+ANALYSIS = ("Function: choose the departure date, currently 'Depart October 22, 2025'.\n"
+            '{"execute": {"plan": [{"action": "click", "selector": "[aria-label=\'Depart October 22, 2025\']", '
+            '"data": null}], "parameters": {}}, "speak": "Flights to Madrid"}')
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_same_layout_different_text_shares_fingerprint(self):
+        a = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        b = fingerprint_page(parse_snapshot(results_page("Paris", 7, "November 3, 2025")))
+        self.assertEqual(a.key, b.key)
+
+    def test_different_layout_has_different_fingerprint(self):
+        a = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        b = fingerprint_page(parse_snapshot("<html><body><form><input name='q'></form></body></html>"))
+        self.assertNotEqual(a.key, b.key)
+
+    def test_selector_attribute_values_are_part_of_the_layout(self):
+        a = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        b = fingerprint_page(parse_snapshot(results_page("Madrid", 3).replace("depart-btn", "return-btn")))
+        self.assertNotEqual(a.key, b.key)
+
+    def test_parameterise_only_replaces_quoted_labels(self):
+        fingerprint = fingerprint_page(parse_snapshot("<body><button title='Search'>Go</button></body>"))
+        template, slots = parameterise("Search the flights with 'Search'.", fingerprint.labels)
+        self.assertEqual(template, "Search the flights with '{{L0}}'.")
+        self.assertEqual(slots, [("/0@title", "Search")])
+
+    def test_parameterise_replaces_labels(self):
+        fingerprint = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        template, slots = parameterise(ANALYSIS, fingerprint.labels)
+        self.assertNotIn("October 22, 2025", template)
+        self.assertIn("{{L0}}", template)
+        self.assertIn("Depart October 22, 2025", [text for _, text in slots])
+
+
+class PageTemplateCacheTests(unittest.TestCase):
+
+    def test_hit_substitutes_current_labels(self):
+        cache = PageTemplateCache()
+        cache.store(fingerprint_page(parse_snapshot(results_page("Madrid", 3))), ANALYSIS)
+
+        analysis = cache.lookup(fingerprint_page(parse_snapshot(results_page("Paris", 5, "November 3, 2025"))))
+        self.assertIsNotNone(analysis)
+        self.assertIn("Depart November 3, 2025", analysis)
+        self.assertIn("Flights to Paris", analysis)
+        self.assertNotIn("October", analysis)
+        self.assertEqual(cache.hits, 1)
+
+    def test_miss_for_unknown_layout(self):
+        cache = PageTemplateCache()
+        self.assertIsNone(cache.lookup(fingerprint_page(parse_snapshot(results_page("Madrid", 3)))))
+        self.assertEqual(cache.misses, 1)
+
+    def test_partial_match_is_not_reused(self):
+        cache = PageTemplateCache()
+        cache.store(fingerprint_page(parse_snapshot(results_page("Madrid", 3))), ANALYSIS)
+        # Same structure, but one of the labels the analysis refers to is gone
+        page = results_page("Paris", 3).replace("aria-label='Depart October 22, 2025'", "aria-label=''")
+        self.assertIsNone(cache.lookup(fingerprint_page(parse_snapshot(page))))
+        self.assertEqual((cache.hits, cache.misses), (0, 1))
+
+    def test_lookup_is_scoped(self):
+        cache = PageTemplateCache()
+        fingerprint = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        cache.store(fingerprint, ANALYSIS, scope=("conversation-1", "flights.example.com"))
+        self.assertIsNone(cache.lookup(fingerprint, scope=("conversation-2", "flights.example.com")))
+        self.assertIsNone(cache.lookup(fingerprint, scope=("conversation-1", "hotels.example.com")))
+        self.assertIsNotNone(cache.lookup(fingerprint, scope=("conversation-1", "flights.example.com")))
+
+    def test_analysis_without_labels_is_not_stored(self):
+        cache = PageTemplateCache()
+        fingerprint = fingerprint_page(parse_snapshot(results_page("Madrid", 3)))
+        cache.store(fingerprint, "A list of flights.")
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.lookup(fingerprint))
+
+    def test_lru_eviction(self):
+        cache = PageTemplateCache(max_entries=2)
+        pages = [results_page("Madrid", 1), "<body><form title='Search'></form></body>",
+                 "<body><nav title='Menu'></nav></body>"]
+        fingerprints = [fingerprint_page(parse_snapshot(page)) for page in pages]
+        cache.store(fingerprints[0], ANALYSIS)
+        cache.store(fingerprints[1], "The 'Search' form")
+        self.assertIsNotNone(cache.lookup(fingerprints[0]))  # most recently used now
+        cache.store(fingerprints[2], "The 'Menu'")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.lookup(fingerprints[1]))
+        self.assertIsNotNone(cache.lookup(fingerprints[0]))
@@ -0,0 +1,202 @@
+# saccessco/tests/test_layers.py
+
+import asyncio
+import threading
+import time
+from unittest import IsolatedAsyncioTestCase
+from unittest.mock import AsyncMock, patch
+
+from channels.exceptions import ChannelFull
+from channels_redis.core import RedisChannelLayer
+from redis.asyncio import BlockingConnectionPool
+
+from saccessco.layers import LocalFirstRedisChannelLayer
+
+
+class FakePipeline:
+    """Just enough of a redis pipeline for group_send: returns the given group members."""
+
+    def __init__(self, members, executed=None):
+        self.members = members
+        self.executed = executed
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    def zremrangebyscore(self, *args, **kwargs):
+        self.commands.append("zremrangebyscore")
+
+    def zrange(self, *args, **kwargs):
+        self.commands.append("zrange")
+
+    def eval(self, script, numkeys, *keys_and_args):
+        self.commands.append(("eval", keys_and_args[:numkeys]))
+
+    async def execute(self):
+        if self.executed is not None:
+            self.executed.append(self.commands)
+        if "zrange" in self.commands:
+            return [0, [member.encode("utf8") for member in self.members]]
+        return [0] * (len(self.commands) - 1) + [0]
+
+
+class FakeConnection:
+
+    def __init__(self, members, executed=None):
+        self.members = members
+        self.executed = executed
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self.members, self.executed)
+
+
+async def _never_from_redis(self, channel):
+    await asyncio.Event().wait()
+
+
+@patch.object(RedisChannelLayer, "receive_single", _never_from_redis)
+class LocalFirstRedisChannelLayerTests(IsolatedAsyncioTestCase):
+    GROUP = "WEB_SOCKET_GROUP_NAME_abc"
+
+    async def asyncSetUp(self):
+        self.layer = LocalFirstRedisChannelLayer(hosts=[("127.0.0.1", 6379)])
+        self.channel = await self.layer.new_channel()
+        self.remote_channel = "specific.0123456789abcdef!remote"
+
+    def _members(self, *channels):
+        return patch.object(self.layer, "connection", return_value=FakeConnection(list(channels)))
+
+    async def _start_receiving(self):
+        receiving = asyncio.ensure_future(self.layer.receive(self.channel))
+        # Let the receiver take the receive lock and wait in receive_single
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        return receiving
+
+    async def test_local_member_gets_message_without_redis(self):
+        receiving = await self._start_receiving()
+        with self._members(self.channel), patch.object(RedisChannelLayer, "send", AsyncMock()) as redis_send:
+            await self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"})
+        message = await asyncio.wait_for(receiving, timeout=1)
+        self.assertEqual(message, {"type": "ai_response", "text": "hi"})
+        redis_send.assert_not_called()
+        self.assertEqual((self.layer.local_deliveries, self.layer.remote_deliveries), (1, 0))
+
+    async def test_remote_member_goes_through_redis(self):
+        receiving = await self._start_receiving()
+        with self._members(self.channel, self.remote_channel), \
+                patch.object(self.layer, "_group_send_remote", AsyncMock()) as redis_send:
+            await self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"})
+        redis_send.assert_awaited_once_with(self.GROUP, [self.remote_channel], {"type": "ai_response", "text": "hi"})
+        self.assertEqual(await asyncio.wait_for(receiving, timeout=1), {"type": "ai_response", "text": "hi"})
+        self.assertEqual((self.layer.local_deliveries, self.layer.remote_deliveries), (1, 1))
+
+    async def test_remote_members_are_sent_in_one_round_trip(self):
+        executed = []
+        remote = [f"specific.0123456789abcdef!remote{i}" for i in range(3)]
+        with patch.object(self.layer, "connection", return_value=FakeConnection(remote, executed)):
+            await self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"})
+        # The members read, then one pipeline that adds the message to the process's Redis key
+        self.assertEqual(executed[1:], [["zremrangebyscore", ("eval", ("asgispecific.0123456789abcdef!",))]])
+        self.assertEqual(self.layer.remote_deliveries, 3)
+
+    async def test_local_capacity(self):
+        self.layer.capacity = 2
+        for text in ["one", "two"]:
+            await self.layer.send(self.channel, {"type": "ai_response", "text": text})
+        with self.assertRaises(ChannelFull):
+            await self.layer.send(self.channel, {"type": "ai_response", "text": "three"})
+        with self._members(self.channel):
+            await self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "dropped"})
+        self.assertEqual((await asyncio.wait_for(self.layer.receive(self.channel), timeout=1))["text"], "one")
+        await self.layer.send(self.channel, {"type": "ai_response", "text": "three"})
+        texts = [(await asyncio.wait_for(self.layer.receive(self.channel), timeout=1))["text"] for _ in range(2)]
+        self.assertEqual(texts, ["two", "three"])
+
+    async def test_local_expiry(self):
+        self.layer.expiry = 60
+        await self.layer.send(self.channel, {"type": "ai_response", "text": "old"})
+        with patch("saccessco.layers.time.time", return_value=time.time() + 61):
+            await self.layer.send(self.channel, {"type": "ai_response", "text": "new"})
+            self.assertEqual((await asyncio.wait_for(self.layer.receive(self.channel), timeout=1))["text"], "new")
+
+    async def test_message_sent_before_first_receive_is_kept(self):
+        with self._members(self.channel), patch.object(RedisChannelLayer, "send", AsyncMock()) as redis_send:
+            await self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"})
+        redis_send.assert_not_called()
+        self.assertEqual(await asyncio.wait_for(self.layer.receive(self.channel), timeout=1),
+                         {"type": "ai_response", "text": "hi"})
+
+    async def test_falls_back_to_redis_when_receiving_loop_is_gone(self):
+        layer = LocalFirstRedisChannelLayer(hosts=[("127.0.0.1", 6379)])
+        channel = await asyncio.to_thread(asyncio.run, layer.new_channel())
+        with patch.object(layer, "connection", return_value=FakeConnection([channel])), \
+                patch.object(layer, "_group_send_remote", AsyncMock()) as redis_send:
+            await layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"})
+        redis_send.assert_awaited_once_with(self.GROUP, [channel], {"type": "ai_response", "text": "hi"})
+        self.assertEqual((layer.local_deliveries, layer.remote_deliveries), (0, 1))
+
+    async def test_delivery_from_another_thread(self):
+        # Conversation sends with async_to_sync, from a worker thread with its own event loop
+        receiving = await self._start_receiving()
+
+        def _send():
+            with self._members(self.channel):
+                asyncio.run(self.layer.group_send(self.GROUP, {"type": "ai_response", "text": "hi"}))
+
+        thread = threading.Thread(target=_send)
+        thread.start()
+        await asyncio.to_thread(thread.join)
+        self.assertEqual(await asyncio.wait_for(receiving, timeout=1), {"type": "ai_response", "text": "hi"})
+
+    async def test_messages_for_other_local_channel_are_buffered(self):
+        other = await self.layer.new_channel()
+        receiving = await self._start_receiving()
+        await self.layer.send(other, {"type": "ai_response", "text": "first"})
+        await self.layer.send(self.channel, {"type": "ai_response", "text": "second"})
+        self.assertEqual(await asyncio.wait_for(receiving, timeout=1), {"type": "ai_response", "text": "second"})
+        self.assertEqual(await asyncio.wait_for(self.layer.receive(other), timeout=1),
+                         {"type": "ai_response", "text": "first"})
+
+    async def test_sent_message_is_copied(self):
+        receiving = await self._start_receiving()
+        message = {"type": "ai_response", "text": "hi"}
+        await self.layer.send(self.channel, message)
+        message["text"] = "changed"
+        self.assertEqual((await asyncio.wait_for(receiving, timeout=1))["text"], "hi")
+
+    async def test_redis_client_defaults(self):
+        # Reads outlast the blocking pop, and a busy pool makes commands wait rather than fail
+        self.assertGreater(self.layer.hosts[0]["socket_timeout"], self.layer.brpop_timeout)
+        self.assertIsInstance(self.layer.create_pool(0), BlockingConnectionPool)
+        layer = LocalFirstRedisChannelLayer(hosts=[{"address": "redis://localhost:6379", "socket_timeout": 30}])
+        self.assertEqual(layer.hosts[0]["socket_timeout"], 30)
+
+    async def test_pending_redis_receive_survives_local_deliveries(self):
+        redis_message = asyncio.Event()
+        calls = []
+
+        async def _from_redis(layer, channel):
+            calls.append(channel)
+            await redis_message.wait()
+            return self.channel, {"type": "ai_response", "text": "from redis"}
+
+        with patch.object(RedisChannelLayer, "receive_single", _from_redis):
+            for text in ["one", "two"]:
+                receiving = await self._start_receiving()
+                await self.layer.send(self.channel, {"type": "ai_response", "text": text})
+                self.assertEqual((await asyncio.wait_for(receiving, timeout=1))["text"], text)
+            receiving = await self._start_receiving()
+            redis_message.set()
+            self.assertEqual((await asyncio.wait_for(receiving, timeout=1))["text"], "from redis")
+        # One Redis pop, kept across the local wake-ups instead of cancelled and restarted
+        self.assertEqual(len(calls), 1)
+
+
+if __name__ == '__main__':
+    import unittest
+    unittest.main()
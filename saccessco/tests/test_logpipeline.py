@@ -0,0 +1,99 @@
+# saccessco/tests/test_logpipeline.py
+
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler
+
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
+
+from saccessco import logpipeline
+from saccessco.logpipeline import DroppingQueueHandler, is_sampled, payload
+
+
+class _ListHandler(logging.Handler):
+
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.threads = set()
+
+    def emit(self, record):
+        self.records.append(record)
+        self.threads.add(threading.current_thread().name)
+
+
+@override_settings(SACCESSCO_LOG_PAYLOAD_CHARS=10, SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE=0.0)
+class PayloadTests(SimpleTestCase):
+
+    def test_short_payload_logged_as_is(self):
+        self.assertEqual(str(payload("<p>Hi</p>")), "<p>Hi</p>")
+
+    def test_large_payload_truncated_and_hashed(self):
+        text = str(payload("<html>" + "x" * 1000))
+        self.assertTrue(text.startswith("<html>xxxx... [1006 chars, blake2b "))
+        self.assertEqual(text, str(payload("<html>" + "x" * 1000)))
+        self.assertNotEqual(text, str(payload("<html>" + "y" * 1000)))
+        self.assertIn("chars", str(payload({"html": "x" * 100})))
+
+    def test_sampled_conversations_log_payloads_in_full(self):
+        with override_settings(SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE=1.0):
+            self.assertEqual(str(payload("x" * 100, "conv")), "x" * 100)
+        with override_settings(SACCESSCO_LOG_PAYLOAD_SAMPLE_RATE=0.25):
+            sampled = [is_sampled(f"conv-{i}") for i in range(2000)]
+            self.assertEqual(sampled, [is_sampled(f"conv-{i}") for i in range(2000)])
+            self.assertAlmostEqual(sum(sampled) / len(sampled), 0.25, delta=0.05)
+            conversation_id = f"conv-{sampled.index(True)}"
+            self.assertEqual(str(payload({"conversation_id": conversation_id, "prompt": "x" * 100})),
+                             repr({"conversation_id": conversation_id, "prompt": "x" * 100}))
+
+    def test_conversation_of_the_thread(self):
+        result = []
+
+        def _log():
+            logpipeline.set_conversation("thread-conv")
+            result.append(payload("x").conversation_id)
+
+        thread = threading.Thread(target=_log)
+        thread.start()
+        thread.join()
+        self.assertEqual(result, ["thread-conv"])
+        self.assertIsNone(payload("x").conversation_id)
+
+
+class ConfigureTests(SimpleTestCase):
+
+    def setUp(self):
+        self.handler = _ListHandler()
+        self.handler.setLevel(logging.INFO)
+        self.addCleanup(logging.getLogger("saccessco.test_logpipeline").handlers.clear)
+
+    def test_handlers_write_from_a_listener_thread(self):
+        # Its listeners are replaced: put the project's back
+        self.addCleanup(logpipeline.configure, settings.LOGGING)
+        logpipeline.configure({
+            "version": 1,
+            "disable_existing_loggers": False,
+            "handlers": {"list": {"()": lambda: self.handler, "level": "INFO"}},
+            "loggers": {"saccessco.test_logpipeline": {"handlers": ["list"], "level": "DEBUG", "propagate": False}},
+        })
+        logger = logging.getLogger("saccessco.test_logpipeline")
+        self.assertEqual(len(logger.handlers), 1)
+        self.assertIsInstance(logger.handlers[0], QueueHandler)
+        logger.debug("Below the handler's level")
+        logger.info("Logged %s", payload("x" * 1000))
+        logpipeline.stop()
+        self.assertEqual([record.getMessage()[:10] for record in self.handler.records], ["Logged xxx"])
+        self.assertNotIn(threading.current_thread().name, self.handler.threads)
+
+    def test_full_queue_drops_records(self):
+        handler = DroppingQueueHandler(queue.Queue(1))
+        logger = logging.getLogger("saccessco.test_logpipeline")
+        logger.addHandler(handler)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, "propagate", True)
+        logger.error("Queued")
+        logger.error("Dropped")
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.get_nowait().getMessage(), "Queued")
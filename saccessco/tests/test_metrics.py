@@ -0,0 +1,89 @@
+# saccessco/tests/test_metrics.py
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from prometheus_client import REGISTRY
+
+from saccessco import metrics
+from saccessco.conversation import Conversation
+
+
+def _value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+class MetricsTests(unittest.TestCase):
+
+    def test_llm_call_counts_in_flight_and_observes_latency(self):
+        count = _value("saccessco_llm_seconds_count", provider="gemini", model="flash")
+        with metrics.llm_call("gemini", "flash"):
+            self.assertEqual(_value("saccessco_llm_in_flight", provider="gemini"), 1)
+        self.assertEqual(_value("saccessco_llm_in_flight", provider="gemini"), 0)
+        self.assertEqual(_value("saccessco_llm_seconds_count", provider="gemini", model="flash"), count + 1)
+
+    def test_record_usage(self):
+        prompt = _value("saccessco_llm_prompt_tokens_total", provider="chtgpt", model="gpt-4o")
+        completion = _value("saccessco_llm_completion_tokens_total", provider="chtgpt", model="gpt-4o")
+        metrics.record_usage("chtgpt", "gpt-4o", {"prompt_tokens": 120, "completion_tokens": 30})
+        metrics.record_usage("chtgpt", "gpt-4o", None)
+        self.assertEqual(_value("saccessco_llm_prompt_tokens_total", provider="chtgpt", model="gpt-4o"), prompt + 120)
+        self.assertEqual(_value("saccessco_llm_completion_tokens_total", provider="chtgpt", model="gpt-4o"),
+                         completion + 30)
+
+    def test_multiprocess_values_are_added_up(self):
+        script = ("from saccessco import metrics\n"
+                  "metrics.PAGE_CHANGE_BYTES.labels('http').inc(5)\n"
+                  "metrics.WEBSOCKET_CONNECTIONS.inc()\n")
+        with tempfile.TemporaryDirectory() as path:
+            env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=path)
+            for _ in range(2):
+                subprocess.run([sys.executable, "-c", script], env=env, check=True)
+            with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": path}):
+                text = metrics.exposition().decode()
+        self.assertIn('saccessco_page_change_bytes_total{transport="http"} 10.0', text)
+        # Both processes have exited: their connections aren't live anymore
+        self.assertNotRegex(text, r"saccessco_websocket_connections [1-9]")
+
+
+class ConversationMetricsTests(unittest.TestCase):
+
+    def setUp(self):
+        Conversation._instances = {}
+
+    @patch('saccessco.conversation.async_to_sync')
+    @patch('saccessco.conversation.create_engine')
+    def test_user_prompt_updates_metrics(self, mock_ai_engine_cls, mock_async_to_sync):
+        # Not valid as a plan: only its speech is sent
+        mock_ai_engine_cls.return_value.respond.return_value = json.dumps(
+            {"speak": "Hello", "execute": {"plan": [{"action": "explode"}], "parameters": {}}})
+        live = _value("saccessco_live_conversations")
+        failures = _value("saccessco_plan_validation_failures_total", reason="schema")
+        sends = _value("saccessco_channel_send_seconds_count")
+
+        conversation = Conversation(conversation_id="metrics_conv")
+        self.assertEqual(_value("saccessco_live_conversations"), live + 1)
+        conversation.user_prompt("Hello there").result(timeout=5)
+
+        self.assertEqual(_value("saccessco_executor_queue_depth"), 0)
+        self.assertEqual(_value("saccessco_plan_validation_failures_total", reason="schema"), failures + 1)
+        self.assertEqual(_value("saccessco_channel_send_seconds_count"), sends + 1)
+        conversation.shutdown()
+        self.assertEqual(_value("saccessco_live_conversations"), live)
+
+
+class MetricsViewTests(SimpleTestCase):
+
+    def test_metrics_endpoint(self):
+        metrics.PAGE_CHANGE_BYTES.labels('http')
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        self.assertIn(b"saccessco_live_conversations", response.content)
+        self.assertIn(b"saccessco_page_change_bytes_total", response.content)
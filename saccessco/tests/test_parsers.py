@@ -0,0 +1,64 @@
+# saccessco/tests/test_parsers.py
+
+import datetime
+import decimal
+import io
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from saccessco.parsers import FastJSONParser
+from saccessco.renderers import FastJSONRenderer
+
+
+class FastJSONParserTests(SimpleTestCase):
+    """
+    Tests that FastJSONParser parses what JSONParser does.
+    """
+
+    def test_parses_like_json_parser(self):
+        body = '{"conversation_id": "abc", "html": "<p>caf\u00e9 \u2028</p>", "n": [1, 2.5, null]}'.encode()
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+
+    def test_other_encoding(self):
+        body = '{"prompt": "caf\u00e9"}'.encode('latin-1')
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body), parser_context={'encoding': 'latin-1'}),
+                         {"prompt": "caf\u00e9"})
+
+    def test_invalid_json_is_a_parse_error(self):
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b'{"prompt": '))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    """
+    Tests that FastJSONRenderer renders what JSONRenderer does, compactly.
+    """
+
+    def test_renders_like_json_renderer(self):
+        data = {"message": "Page change received successfully", "status": "success", "line": "a\u2028b"}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_renders_serializer_errors(self):
+        data = {"html": [ErrorDetail("This field is required.", code="required")], "lazy": gettext_lazy("Hello")}
+        self.assertEqual(FastJSONRenderer().render(data), b'{"html":["This field is required."],"lazy":"Hello"}')
+
+    def test_renders_non_string_keys_and_datetimes_like_json_renderer(self):
+        at = datetime.datetime(2025, 10, 22, 9, 30, 0, 123456, tzinfo=datetime.timezone.utc)
+        data = {1: "x", None: True, "at": at, "day": at.date(), "amount": decimal.Decimal("1.50")}
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertIn(b'"at":"2025-10-22T09:30:00.123456Z"', FastJSONRenderer().render(data))
+        # More than orjson can encode: left to JSONRenderer
+        data["big"] = 2 ** 70
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_none_renders_empty(self):
+        self.assertEqual(FastJSONRenderer().render(None), b'')
+
+    def test_indented_output_left_to_json_renderer(self):
+        data = {"status": "success"}
+        self.assertEqual(FastJSONRenderer().render(data, "application/json; indent=4"),
+                         JSONRenderer().render(data, "application/json; indent=4"))
@@ -0,0 +1,82 @@
+# saccessco/tests/test_plan_optimizer.py
+
+import unittest
+
+from saccessco.conversation.plan_optimizer import optimize_plan
+
+
+def step(action, selector, data=None):
+    return {"action": action, "selector": selector, "data": data}
+
+
+class PreparatoryStepTests(unittest.TestCase):
+
+    def test_scroll_before_step_on_same_selector_removed(self):
+        plan, removed = optimize_plan([step("scrollTo", "#go"), step("click", "#go")])
+        self.assertEqual(plan, [step("click", "#go")])
+        self.assertEqual([(r.index, r.step["action"]) for r in removed], [(0, "scrollTo")])
+
+    def test_wait_before_step_on_same_selector_removed(self):
+        plan, removed = optimize_plan([step("waitForElement", "#q"), step("typeInto", "#q", "city")])
+        self.assertEqual(plan, [step("typeInto", "#q", "city")])
+        self.assertEqual(len(removed), 1)
+
+    def test_chain_of_preparatory_steps_removed(self):
+        plan, removed = optimize_plan([step("scrollTo", "#go"), step("waitForElement", "#go"), step("click", "#go")])
+        self.assertEqual(plan, [step("click", "#go")])
+        self.assertEqual([r.index for r in removed], [0, 1])
+
+    def test_preparatory_step_on_other_selector_kept(self):
+        original = [step("waitForElement", "#results"), step("click", "#go")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+    def test_trailing_wait_kept(self):
+        original = [step("click", "#go"), step("waitForElement", "#results")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+    def test_focus_before_click_kept(self):
+        # element.click() doesn't move focus, and focus handlers may open pickers
+        original = [step("focusElement", "#from"), step("click", "#from")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+
+class RepeatedStepTests(unittest.TestCase):
+
+    def test_repeated_idempotent_step_removed(self):
+        plan, removed = optimize_plan([step("scrollTo", "#a"), step("scrollTo", "#a"), step("click", "#b")])
+        self.assertEqual(plan, [step("scrollTo", "#a"), step("click", "#b")])
+        self.assertEqual([r.index for r in removed], [0])
+
+    def test_repeated_type_with_same_data_removed(self):
+        plan, _ = optimize_plan([step("typeInto", "#q", "city"), step("typeInto", "#q", "city")])
+        self.assertEqual(plan, [step("typeInto", "#q", "city")])
+
+    def test_type_with_different_data_kept(self):
+        original = [step("typeInto", "#q", "from"), step("typeInto", "#q", "to")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+    def test_repeated_clicks_kept(self):
+        original = [step("click", "#add-adult"), step("click", "#add-adult")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+    def test_repeated_enter_and_submit_kept(self):
+        original = [step("enter", "#q"), step("enter", "#q"), step("submitForm", "#f"), step("submitForm", "#f")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+    def test_non_adjacent_repeats_kept(self):
+        original = [step("focusElement", "#a"), step("click", "#b"), step("focusElement", "#a")]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+
+class MalformedPlanTests(unittest.TestCase):
+
+    def test_non_list_returned_unchanged(self):
+        self.assertEqual(optimize_plan(None), (None, []))
+
+    def test_non_dict_steps_kept(self):
+        original = ["scrollTo #a", step("scrollTo", "#a"), 3]
+        self.assertEqual(optimize_plan(original), (original, []))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+# saccessco/tests/test_production.py
+
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+# Runs with the production settings: the API over the lean ASGI application
+CHILD = """
+import json, sys
+import saccessco.asgi_production
+from django.conf import settings
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+token = {"HTTP_AUTHORIZATION": "Bearer ops-token"}
+print(json.dumps({
+    "debug": settings.DEBUG,
+    "apps": settings.INSTALLED_APPS,
+    "middleware": settings.MIDDLEWARE,
+    "usage": client.get("/saccessco/usage/", **token).status_code,
+    "anonymous": [client.get("/saccessco/usage/").status_code, client.get("/saccessco/traces/").status_code,
+                  client.get("/metrics").status_code,
+                  client.post("/saccessco/profile/", {"conversation_id": "c"}, content_type="application/json").status_code],
+    "invalid": client.post("/saccessco/user_prompt/", {}, content_type="application/json").status_code,
+    "test_page": client.get("/test-page/").status_code,
+    "modules": sorted({"daphne", "django.contrib.sessions", "django.contrib.auth.models"} & set(sys.modules)),
+}))
+"""
+
+
+class ProductionSettingsTests(SimpleTestCase):
+
+    def _run(self, **environ):
+        environ = dict(os.environ, DJANGO_SETTINGS_MODULE="saccessco.settings.production",
+                       PYTHONPATH=str(settings.BASE_DIR.parent), **environ)
+        return subprocess.run([sys.executable, "-c", CHILD], env=environ, capture_output=True, text=True)
+
+    def test_api_only(self):
+        process = self._run(DJANGO_SECRET_KEY="test", SACCESSCO_OPS_TOKEN="ops-token")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        self.assertFalse(result["debug"])
+        self.assertNotIn("daphne", result["apps"])
+        self.assertNotIn("django.contrib.sessions.middleware.SessionMiddleware", result["middleware"])
+        self.assertEqual((result["usage"], result["invalid"], result["test_page"]), (200, 400, 404))
+        self.assertEqual(result["anonymous"], [403, 403, 403, 403])
+        self.assertEqual(result["modules"], [])
+
+    def test_no_operator_endpoints_without_a_token(self):
+        process = self._run(DJANGO_SECRET_KEY="test", SACCESSCO_OPS_TOKEN="")
+        self.assertEqual(process.returncode, 0, process.stderr)
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        self.assertEqual(result["usage"], 404)
+        self.assertEqual(result["anonymous"], [404, 404, 404, 404])
+
+    def test_secret_key_is_required(self):
+        process = self._run(DJANGO_SECRET_KEY="")
+        self.assertNotEqual(process.returncode, 0)
+        self.assertIn("DJANGO_SECRET_KEY", process.stderr)
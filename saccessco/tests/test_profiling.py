@@ -0,0 +1,143 @@
+# saccessco/tests/test_profiling.py
+
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ElementTree
+from collections import Counter
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+
+from saccessco import profiling
+from saccessco.conversation import Conversation
+
+
+def _busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(100))
+
+
+class _ProfileDirMixin:
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(SACCESSCO_PROFILE_DIR=self.directory, SACCESSCO_PROFILE_INTERVAL=0.001,
+                                     SACCESSCO_PROFILING=True)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ProfilingTests(_ProfileDirMixin, SimpleTestCase):
+
+    def test_disabled_profile_is_a_shared_no_op(self):
+        self.assertIs(profiling.profile("page_change"), profiling.profile("user_prompt", "conv"))
+        with profiling.profile("page_change"):
+            self.assertFalse(profiling.wanted())
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_profile_writes_collapsed_stacks_and_flamegraph(self):
+        with profiling.profile("page_change", "conv/1", enabled=True) as running:
+            self.assertTrue(profiling.wanted())
+            with profiling.profile("nested", enabled=True) as nested:
+                _busy(0.05)
+        self.assertFalse(profiling.wanted())
+        profiling.flush()
+        self.assertIsNone(nested.path)
+        self.assertTrue(running.path.name.endswith(".svg"))
+        self.assertIn("page_change-conv_1", running.path.name)
+        folded = running.path.with_suffix(".folded").read_text()
+        self.assertIn("_busy (test_profiling.py:", folded)
+        self.assertGreater(sum(int(line.rsplit(" ", 1)[1]) for line in folded.splitlines()), 5)
+        ElementTree.fromstring(running.path.read_text())
+
+    def test_sampler_clears_itself_when_it_exits(self):
+        # A sampler that has decided to exit is still alive for a moment: the next profile
+        # mustn't take it for a running one
+        with profiling.profile("first", enabled=True):
+            sampler = profiling._sampler
+            _busy(0.005)
+        sampler.join(timeout=1)
+        self.assertIsNone(profiling._sampler)
+        with profiling.profile("second", enabled=True) as second:
+            _busy(0.02)
+        self.assertTrue(second.samples)
+        profiling.flush()
+
+    def test_conversation_switched_on(self):
+        self.assertFalse(profiling.wanted("profiled_conv"))
+        profiling.enable_conversation("profiled_conv")
+        self.addCleanup(profiling.enable_conversation, "profiled_conv", False)
+        self.assertTrue(profiling.wanted("profiled_conv"))
+        self.assertIn("profiled_conv", profiling.profiled_conversations())
+        with override_settings(SACCESSCO_PROFILING=False):
+            self.assertFalse(profiling.wanted("profiled_conv"))
+            self.assertFalse(profiling.requested("1"))
+
+    @override_settings(SACCESSCO_PROFILE_MAX_FILES=2)
+    def test_oldest_profiles_are_pruned(self):
+        for i in range(4):
+            running = profiling.Profile(f"profile{i}")
+            running.samples = Counter({(_busy.__code__,): 1})
+            running.started, running.seconds = time.time() + i, 0.01
+            path = profiling.write(running)
+            # Distinct modification times, oldest first
+            timestamp = time.time() - 10 + i
+            os.utime(path, (timestamp, timestamp))
+        self.assertEqual(sorted(path.name.split("-")[1] for path in self.directory.glob("*.svg")),
+                         ["profile2", "profile3"])
+        self.assertEqual(len(list(self.directory.glob("*.folded"))), 2)
+
+    def test_write_errors_are_logged_not_raised(self):
+        with patch("saccessco.profiling.flamegraph", side_effect=ValueError("bad stack")):
+            with self.assertLogs("saccessco", "ERROR") as logs:
+                with profiling.profile("page_change", enabled=True):
+                    _busy(0.02)
+                profiling.flush()
+        self.assertIn("bad stack", "\n".join(logs.output))
+
+    def test_flamegraph(self):
+        svg = profiling.flamegraph(Counter({"main;parse;<lambda>": 3, "main;send": 1}), "title & more")
+        root = ElementTree.fromstring(svg)
+        titles = [element.text for element in root.iter("{http://www.w3.org/2000/svg}title")]
+        self.assertIn("main: 4 samples (100.0%)", titles)
+        self.assertIn("<lambda>: 3 samples (75.0%)", titles)
+
+
+@override_settings(SACCESSCO_AI_ENGINE="stub", SACCESSCO_STUB_LATENCY_SECONDS=0.0)
+class ProfiledRequestTests(_ProfileDirMixin, APITestCase):
+
+    def test_page_change_header_profiles_the_request_and_its_conversation_work(self):
+        Conversation._instances.pop("header_conv", None)
+        html = "<html><body><table>" + "<tr><td><a href='/x'>Row</a></td></tr>" * 2000 + "</table></body></html>"
+        # Slow enough to be sampled
+        with patch("saccessco.views.metrics.PAGE_CHANGE_BYTES", **{"labels.side_effect": lambda *args: _busy(0.02) or MagicMock()}):
+            response = self.client.post(reverse('page_change'), {"conversation_id": "header_conv", "html": html},
+                                        format='json', HTTP_X_SACCESSCO_PROFILE="1")
+        self.assertEqual(response.status_code, 200)
+        conversation = Conversation._instances.pop("header_conv")
+        conversation.shutdown()
+        profiling.flush()
+        names = {path.name.split("-")[1] for path in self.directory.glob("*.folded")}
+        self.assertEqual(names, {"page_change_api", "page_change"})
+
+    @patch('saccessco.views.Conversation')
+    def test_no_profile_without_header(self, MockConversation):
+        self.client.post(reverse('page_change'), {"conversation_id": "c", "html": "<p>Hi</p>"}, format='json')
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_toggle_conversation(self):
+        self.addCleanup(profiling.enable_conversation, "api_conv", False)
+        response = self.client.post(reverse('profile'), {"conversation_id": "api_conv"}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("api_conv", response.data["conversations"])
+        response = self.client.post(reverse('profile'), {"conversation_id": "api_conv", "enabled": False},
+                                    format='json')
+        self.assertNotIn("api_conv", response.data["conversations"])
+        self.assertEqual(self.client.post(reverse('profile'), {}, format='json').status_code, 400)
@@ -0,0 +1,90 @@
+# saccessco/tests/test_regions.py
+
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock, patch
+
+from django.test import override_settings
+
+from saccessco.conversation import regions as regions_module
+from saccessco.conversation.regions import split_regions, analyse_regions
+from saccessco.conversation.snapshot import parse_snapshot
+
+HTML = """
+<html><head><title>Results</title><script>var x = 1;</script></head><body>
+  <header><a href="/">Home</a></header>
+  <div class="wrapper">
+    <nav><a href="/flights">Flights</a></nav>
+    <main>
+      <form id="filters"><input name="max_price"></form>
+      <ul class="results"><li>Row 1</li><li>Row 2</li></ul>
+    </main>
+  </div>
+  <p>Loose paragraph</p>
+  <div role="dialog"><button>Accept cookies</button></div>
+</body></html>
+"""
+
+
+class SplitRegionsTests(unittest.TestCase):
+
+    def test_splits_on_outermost_landmarks(self):
+        regions = split_regions(parse_snapshot(HTML), max_chars=10_000)
+        self.assertEqual([name for name, _ in regions], ["header", "nav", "main", "dialog", "content"])
+        main_html = dict(regions)["main"]
+        self.assertIn("filters", main_html)
+        self.assertIn("Loose paragraph", dict(regions)["content"])
+
+    def test_scripts_are_distilled_away(self):
+        regions = split_regions(parse_snapshot(HTML), max_chars=10_000)
+        self.assertFalse(any("var x" in html for _, html in regions))
+
+    def test_large_region_is_split_into_parts(self):
+        rows = "".join(f"<li>Result row number {i}</li>" for i in range(200))
+        regions = split_regions(parse_snapshot(f"<body><main><ul>{rows}</ul></main></body>"), max_chars=1_000)
+        self.assertGreater(len(regions), 1)
+        self.assertTrue(all(name.startswith("main (part ") for name, _ in regions))
+        self.assertTrue(all(len(html) <= 1_000 for _, html in regions))
+        self.assertIn("Result row number 199", regions[-1][1])
+
+
+class AnalyseRegionsTests(unittest.TestCase):
+
+    def test_regions_are_analysed_concurrently_and_merged_in_order(self):
+        engine = MagicMock()
+        running = []
+        peak = []
+        lock = threading.Lock()
+
+        def respond_once(role, prompt):
+            with lock:
+                running.append(1)
+                peak.append(len(running))
+            time.sleep(0.1)
+            with lock:
+                running.pop()
+            return f"analysis of {prompt.splitlines()[1].split()[3]}"
+
+        engine.respond_once.side_effect = respond_once
+        regions = [("header", "<header/>"), ("nav", "<nav/>"), ("main", "<main/>")]
+
+        started = time.monotonic()
+        merged = analyse_regions(engine, regions, "Results")
+        elapsed = time.monotonic() - started
+
+        self.assertLess(elapsed, 0.25)
+        self.assertGreater(max(peak), 1)
+        self.assertLess(merged.index("## Region: header"), merged.index("## Region: nav"))
+        self.assertLess(merged.index("## Region: nav"), merged.index("## Region: main"))
+        self.assertIn("analysis of 'main'", merged)
+
+    @override_settings(SACCESSCO_ANALYSIS_POOL_SIZE=3)
+    def test_one_pool_of_the_settings_size(self):
+        with patch.object(regions_module, "_pool", None):
+            with ThreadPoolExecutor(max_workers=8) as threads:
+                pools = list(threads.map(lambda _: regions_module._get_pool(), range(8)))
+            self.assertTrue(all(pool is pools[0] for pool in pools))
+            self.assertEqual(pools[0]._max_workers, 3)
+            pools[0].shutdown()
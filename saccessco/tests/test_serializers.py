@@ -53,6 +53,24 @@ class PageChangeSerializerTests(TestCase):
         self.assertIn('html', serializer.errors)
         self.assertIn('This field may not be blank.', serializer.errors['html'])
 
+    def test_html_with_surrogate_character(self):
+        """
+        Test that lone surrogates are rejected, as by CharField.
+        """
+        data = {'html': '<p>\ud800</p>', 'conversation_id': 'test_conversation_id'}
+        serializer = PageChangeSerializer(data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('Surrogate characters are not allowed: U+D800.', serializer.errors['html'])
+
+    def test_html_is_kept_as_sent(self):
+        """
+        Test that the (large) html isn't stripped, nor copied.
+        """
+        html = '<html><body>' + 'x' * 100_000 + '</body></html>\n'
+        serializer = PageChangeSerializer(data={'html': html, 'conversation_id': 'test_conversation_id'})
+        self.assertTrue(serializer.is_valid())
+        self.assertIs(serializer.validated_data['html'], html)
+
 
 class UserPromptSerializerTests(TestCase):
     """
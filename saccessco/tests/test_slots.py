@@ -0,0 +1,98 @@
+# saccessco/tests/test_slots.py
+
+import unittest
+
+from saccessco.conversation.slots import RECENT_PROMPTS, SlotMemory, slot_type, is_sensitive
+
+
+class SlotTypeTests(unittest.TestCase):
+
+    def test_types_from_parameter_names(self):
+        cases = {"departure_date": "date", "returnDay": "date", "check_in": "date", "destination": "location",
+                 "fromCity": "location", "to": "location", "email": "email", "mobile_phone": "phone",
+                 "full_name": "name", "adults": "number", "total": None, "update_mode": None}
+        for name, expected in cases.items():
+            with self.subTest(name=name):
+                self.assertEqual(slot_type(name), expected)
+
+    def test_sensitive_names(self):
+        for name in ["password", "pinCode", "card_number", "cvv"]:
+            self.assertTrue(is_sensitive(name), name)
+        for name in ["shipping_address", "opinion", "destination"]:
+            self.assertFalse(is_sensitive(name), name)
+
+
+class SlotMemoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.memory = SlotMemory()
+
+    def test_resolves_by_parameter_name(self):
+        self.memory.observe_parameters({"destination": "Madrid", "origin": None})
+        parameters = {"destination": None}
+        self.assertEqual(self.memory.resolve(parameters), {"destination": "Madrid"})
+        self.assertEqual(parameters, {"destination": "Madrid"})
+
+    def test_given_values_are_kept(self):
+        self.memory.observe_parameters({"destination": "Madrid"})
+        parameters = {"destination": "Paris"}
+        self.assertEqual(self.memory.resolve(parameters), {})
+        self.assertEqual(parameters, {"destination": "Paris"})
+
+    def test_named_value_not_reused_for_other_name_of_same_type(self):
+        # The origin is not the destination
+        self.memory.observe_parameters({"origin": "Madrid"})
+        self.assertEqual(self.memory.resolve({"destination": None}), {})
+
+    def test_resolves_single_date_from_prompt(self):
+        self.memory.observe_prompt("I want to fly to Rome on 22 October 2025")
+        self.assertEqual(self.memory.resolve({"departure_date": None}), {"departure_date": "22 October 2025"})
+
+    def test_two_dates_are_ambiguous(self):
+        self.memory.observe_prompt("From October 22 to October 29")
+        self.assertEqual(self.memory.resolve({"departure_date": None}), {})
+
+    def test_date_of_the_departure_not_reused_for_the_return(self):
+        self.memory.observe_prompt("Fly to Rome on 22 October 2025")
+        parameters = {"departure_date": "22 October 2025", "return_date": None}
+        self.assertEqual(self.memory.resolve(parameters), {})
+        self.assertEqual(parameters["return_date"], None)
+        # Nor when the plan gives the departure date in another format
+        self.assertEqual(self.memory.resolve({"departure_date": "2025-10-22", "return_date": None}), {})
+
+    def test_one_value_fills_one_parameter_of_a_plan(self):
+        self.memory.observe_prompt("Fly to Rome on 22 October 2025")
+        self.assertEqual(self.memory.resolve({"departure_date": None, "return_date": None}),
+                         {"departure_date": "22 October 2025"})
+
+    def test_only_latest_prompts_are_used(self):
+        self.memory.observe_prompt("On 22 October 2025")
+        for _ in range(RECENT_PROMPTS):
+            self.memory.observe_prompt("Something else")
+        self.assertEqual(self.memory.resolve({"departure_date": None}), {})
+
+    def test_same_date_said_twice_is_one_candidate(self):
+        self.memory.observe_prompt("On 2025-10-22")
+        self.memory.observe_prompt("Yes, 2025-10-22 please")
+        self.assertEqual(self.memory.resolve({"date": None}), {"date": "2025-10-22"})
+
+    def test_resolves_email_from_prompt(self):
+        self.memory.observe_prompt("Send it to jane.doe@example.com")
+        self.assertEqual(self.memory.resolve({"email": None}), {"email": "jane.doe@example.com"})
+
+    def test_sensitive_parameters_never_remembered(self):
+        self.memory.observe_parameters({"password": "hunter2"})
+        self.assertEqual(self.memory.resolve({"password": None}), {})
+
+    def test_untyped_parameter_left_missing(self):
+        self.memory.observe_prompt("On 22 October")
+        self.assertEqual(self.memory.resolve({"promo": None}), {})
+
+    def test_clear(self):
+        self.memory.observe_parameters({"destination": "Madrid"})
+        self.memory.clear()
+        self.assertEqual(self.memory.resolve({"destination": None}), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+# saccessco/tests/test_snapshot.py
+
+import unittest
+
+from saccessco.conversation.snapshot import parse_snapshot, count_selector_matches, dead_selectors, is_date_selector
+
+HTML = """
+<html><body>
+  <form id="search">
+    <input id="query" name="q">
+    <button data-testid="search-btn">Search</button>
+    <button class="secondary">Reset</button>
+    <button class="secondary">Clear</button>
+  </form>
+</body></html>
+"""
+
+
+class SelectorMatchTests(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = parse_snapshot(HTML)
+
+    def test_counts_matches_per_step(self):
+        plan = [
+            {"action": "focusElement", "selector": "#query", "data": None},
+            {"action": "scrollTo", "selector": "button.secondary", "data": None},
+            {"action": "waitForElement", "selector": "#missing", "data": None},
+        ]
+        self.assertEqual(count_selector_matches(self.snapshot, plan), [1, 2, 0])
+        self.assertEqual(dead_selectors(plan, [1, 2, 0]), ["#missing"])
+
+    def test_steps_after_dom_changing_action_are_unknown(self):
+        plan = [
+            {"action": "click", "selector": "[data-testid='search-btn']", "data": None},
+            {"action": "click", "selector": "#results .first", "data": None},
+        ]
+        self.assertEqual(count_selector_matches(self.snapshot, plan), [1, None])
+
+    def test_date_selectors_are_unknown(self):
+        selector = "[aria-label*='October 22, 2025']"
+        self.assertTrue(is_date_selector(selector))
+        plan = [{"action": "click", "selector": selector, "data": None}]
+        self.assertEqual(count_selector_matches(self.snapshot, plan), [None])
+
+    def test_invalid_selector_is_unknown(self):
+        plan = [{"action": "click", "selector": "button[", "data": None}]
+        self.assertEqual(count_selector_matches(self.snapshot, plan), [None])
+
+    def test_no_snapshot(self):
+        plan = [{"action": "click", "selector": "#query", "data": None}]
+        self.assertEqual(count_selector_matches(None, plan), [None])
@@ -0,0 +1,56 @@
+# saccessco/tests/test_stream.py
+
+import json
+import unittest
+
+from saccessco.conversation.stream import ResponseStream, find_stream, get_stream
+
+MESSAGE = {"type": "ai_response", "ai_response": {"speak": "Hello"}}
+
+
+class ResponseStreamTests(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        self.stream = ResponseStream(max_frames=3)
+
+    def _publish(self, count):
+        for _ in range(count):
+            self.stream.publish(MESSAGE, lambda seq, text: self.sent.append((seq, text)))
+
+    def test_messages_numbered_in_order(self):
+        self._publish(3)
+        self.assertEqual([seq for seq, _ in self.sent], [1, 2, 3])
+        self.assertEqual(json.loads(self.sent[1][1]), {**MESSAGE, "seq": 2})
+        self.assertEqual(self.stream.last_seq, 3)
+
+    def test_message_not_modified(self):
+        message = dict(MESSAGE)
+        self.stream.publish(message, lambda seq, text: None)
+        self.assertEqual(message, MESSAGE)
+
+    def test_since_returns_sent_frames_after_seq(self):
+        self._publish(3)
+        self.assertEqual(self.stream.since(1), self.sent[1:])
+        self.assertEqual(self.stream.since(3), [])
+
+    def test_buffer_is_bounded(self):
+        self._publish(5)
+        with self.assertLogs("saccessco", level="WARNING"):
+            self.assertEqual([seq for seq, _ in self.stream.since(0)], [3, 4, 5])
+
+    def test_no_frames_kept_when_disabled(self):
+        stream = ResponseStream(max_frames=0)
+        self.assertEqual(stream.publish(MESSAGE, lambda seq, text: None), 1)
+        with self.assertLogs("saccessco", level="WARNING"):
+            self.assertEqual(stream.since(0), [])
+
+    def test_streams_by_conversation(self):
+        self.assertIsNone(find_stream("stream_test_conv"))
+        stream = get_stream("stream_test_conv")
+        self.assertIs(get_stream("stream_test_conv"), stream)
+        self.assertIs(find_stream("stream_test_conv"), stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
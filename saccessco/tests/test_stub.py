@@ -0,0 +1,41 @@
+# saccessco/tests/test_stub.py
+
+import json
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from saccessco.ai import StubAIEngine, User
+from saccessco.conversation import Conversation
+from saccessco.validators import validate_ai_response
+
+
+@override_settings(SACCESSCO_STUB_LATENCY_SECONDS=0.0)
+class StubAIEngineTests(SimpleTestCase):
+
+    def test_prompt_answered_with_a_valid_empty_plan(self):
+        engine = StubAIEngine()
+        response = json.loads(engine.respond(User, "Find flights to Lisbon"))
+        self.assertEqual(response["execute"], {"plan": [], "parameters": {}})
+        self.assertTrue(validate_ai_response({"type": "ai_response", "ai_response": response}))
+        self.assertEqual(engine.get_chat_history()[-1], {"role": "user", "parts": [{"text": "Find flights to Lisbon"}]})
+        self.assertGreater(engine.last_usage["prompt_tokens"], engine.last_usage["completion_tokens"])
+
+    def test_page_change_answered_with_an_analysis(self):
+        engine = StubAIEngine()
+        history = engine.get_chat_history()
+        self.assertTrue(engine.respond_once(User, "PAGE CHANGE\n<html></html>").startswith("PAGE ANALYSIS"))
+        self.assertEqual(engine.get_chat_history(), history)
+
+    @override_settings(SACCESSCO_STUB_LATENCY_SECONDS=0.05, SACCESSCO_STUB_JITTER=0.0)
+    def test_waits_like_a_model(self):
+        started = time.perf_counter()
+        StubAIEngine(initial_instructions="").respond(User, "Hello")
+        self.assertGreaterEqual(time.perf_counter() - started, 0.05)
+
+    @override_settings(SACCESSCO_AI_ENGINE="stub")
+    def test_selected_by_setting(self):
+        Conversation._instances = {}
+        conversation = Conversation(conversation_id="stub_conv")
+        self.assertIsInstance(conversation.ai_engine, StubAIEngine)
+        conversation.shutdown()
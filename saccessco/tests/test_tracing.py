@@ -0,0 +1,141 @@
+# saccessco/tests/test_tracing.py
+
+import json
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from saccessco import tracing
+from saccessco.conversation import Conversation
+
+
+class TracingTests(unittest.TestCase):
+
+    def setUp(self):
+        tracing.get_buffer().clear()
+
+    def test_spans_nest_under_the_active_trace(self):
+        trace = tracing.new_trace("user_prompt", transport="http")
+        with tracing.activate(trace):
+            with tracing.span("llm", model="m") as llm:
+                tracing.record_span("llm.first_token", llm.start_ns)
+            with tracing.span("parse"):
+                pass
+        self.assertIsNone(tracing.current_trace())
+
+        llm, first_token, parse = trace.find("llm"), trace.find("llm.first_token"), trace.find("parse")
+        self.assertEqual(llm.parent_id, trace.root.span_id)
+        self.assertEqual(first_token.parent_id, llm.span_id)
+        self.assertEqual(parse.parent_id, trace.root.span_id)
+        self.assertEqual(llm.attributes, {"model": "m"})
+        self.assertIsNone(trace.root.end_ns)
+        trace.end()
+        self.assertGreaterEqual(trace.root.duration_ms, llm.duration_ms)
+
+    def test_nothing_recorded_without_an_active_trace(self):
+        with tracing.span("parse") as span:
+            self.assertIsNone(span)
+        self.assertIsNone(tracing.record_span("queue_wait", time.time_ns()))
+        tracing.end_trace()
+
+    def test_failed_span_records_the_error(self):
+        trace = tracing.new_trace("user_prompt")
+        with tracing.activate(trace), self.assertRaises(ValueError):
+            with tracing.span("parse"):
+                raise ValueError("bad")
+        self.assertEqual(trace.find("parse").error, "ValueError('bad')")
+
+    def test_trace_followed_on_another_thread(self):
+        trace = tracing.new_trace("user_prompt")
+
+        def _work():
+            with tracing.activate(trace):
+                with tracing.span("llm"):
+                    pass
+
+        worker = threading.Thread(target=_work)
+        worker.start()
+        worker.join()
+        self.assertEqual(trace.find("llm").parent_id, trace.root.span_id)
+
+    def test_buffer_keeps_the_last_traces(self):
+        buffer = tracing.TraceBuffer(max_traces=2)
+        traces = [tracing.Trace("user_prompt") for _ in range(3)]
+        for trace in traces:
+            buffer.add(trace)
+        self.assertEqual(buffer.traces(), traces[1:])
+        self.assertIsNone(buffer.get(traces[0].trace_id))
+
+    def test_receipt_measured_from_group_send(self):
+        trace = tracing.new_trace("user_prompt")
+        self.assertIsNone(tracing.record_receipt(trace.trace_id))
+        with tracing.activate(trace):
+            with tracing.span("group_send"):
+                pass
+        receipt = tracing.record_receipt(trace.trace_id, transport="websocket")
+        self.assertEqual(receipt.start_ns, trace.find("group_send").end_ns)
+        self.assertEqual(receipt.parent_id, trace.root.span_id)
+        self.assertIsNone(tracing.record_receipt("unknown"))
+
+    def _trace(self, engine, model, llm_ms):
+        trace = tracing.Trace("user_prompt", engine=engine, model=model)
+        llm = tracing.Span("llm", trace.trace_id, trace.root.span_id, 0)
+        llm.end_ns = int(llm_ms * 1e6)
+        trace.add(llm)
+        trace.end()
+        return trace
+
+    def test_stage_percentiles_per_engine_and_model(self):
+        traces = [self._trace("gemini", "flash", ms) for ms in range(1, 101)]
+        traces.append(self._trace("chtgpt", "gpt-4o", 500))
+        groups = tracing.stage_percentiles(traces)
+        self.assertEqual({(group["engine"], group["model"]) for group in groups},
+                         {("gemini", "flash"), ("chtgpt", "gpt-4o")})
+
+        [gemini] = tracing.stage_percentiles(traces, engine="gemini")
+        self.assertEqual(gemini["stages"]["llm"], {"count": 100, "p50": 50.0, "p90": 90.0, "p99": 99.0})
+        self.assertIn("user_prompt", gemini["stages"])
+        self.assertEqual(tracing.stage_percentiles(traces, model="none"), [])
+
+    def test_otlp_export(self):
+        trace = self._trace("gemini", "flash", 2)
+        trace.root.error = "boom"
+        [resource_spans] = tracing.to_otlp([trace])["resourceSpans"]
+        spans = resource_spans["scopeSpans"][0]["spans"]
+        root, llm = spans
+        self.assertEqual(len(root["traceId"]), 32)
+        self.assertEqual(len(root["spanId"]), 16)
+        self.assertNotIn("parentSpanId", root)
+        self.assertEqual(llm["parentSpanId"], root["spanId"])
+        self.assertEqual(llm["endTimeUnixNano"], "2000000")
+        self.assertEqual(root["status"], {"code": 2, "message": "boom"})
+        self.assertIn({"key": "engine", "value": {"stringValue": "gemini"}}, root["attributes"])
+
+
+class ConversationTracingTests(unittest.TestCase):
+
+    def setUp(self):
+        tracing.get_buffer().clear()
+        Conversation._instances = {}
+
+    @patch('saccessco.conversation.async_to_sync')
+    @patch('saccessco.conversation.create_engine')
+    def test_user_prompt_stages_are_traced(self, mock_ai_engine_cls, mock_async_to_sync):
+        mock_ai_engine_cls.return_value.respond.return_value = json.dumps({"speak": "Hello"})
+        group_send = mock_async_to_sync.return_value
+        conversation = Conversation(conversation_id="traced_conv")
+
+        trace = tracing.new_trace("user_prompt")
+        with tracing.activate(trace):
+            future = conversation.user_prompt("Hello there")
+        future.result(timeout=5)
+
+        names = [span.name for span in trace.spans]
+        for stage in ["queue_wait", "parse", "check_selectors", "validate_response", "group_send"]:
+            self.assertIn(stage, names)
+        self.assertIsNotNone(trace.root.end_ns)
+        self.assertIsNone(trace.root.error)
+        frame = json.loads(group_send.call_args[0][1]["text"])
+        self.assertEqual(frame["trace_id"], trace.trace_id)
+        self.assertIsNotNone(tracing.record_receipt(trace.trace_id))
@@ -0,0 +1,81 @@
+# saccessco/tests/test_validators.py
+
+import copy
+import unittest
+
+from saccessco.validators import validate_ai_response, ai_response_validator, _is_common_shape
+
+VALID = {
+    "type": "ai_response",
+    "ai_response": {
+        "execute": {
+            "plan": [
+                {"action": "click", "selector": "[data-testid='depart-btn']", "data": None},
+                {"action": "typeInto", "selector": "#origin", "data": "origin"},
+            ],
+            "parameters": {"origin": "Tel Aviv", "passengers": 2},
+        },
+        "speak": "Setting the origin.",
+    },
+}
+
+
+def _variants():
+    """
+    Valid and invalid variations of the common message shape.
+    """
+    yield VALID
+    yield {"type": "ai_response", "ai_response": {"speak": "Only speech"}}
+    yield {"type": "ai_response", "ai_response": {}}
+    for path, value in [
+        (("type",), "other"),
+        (("ai_response", "speak"), 3),
+        (("ai_response", "execute"), []),
+        (("ai_response", "execute", "plan"), {}),
+        (("ai_response", "execute", "parameters"), []),
+        (("ai_response", "execute", "plan", 0, "action"), "hover"),
+        (("ai_response", "execute", "plan", 0, "selector"), None),
+        (("ai_response", "execute", "plan", 0, "data"), (1, 2)),
+        (("ai_response", "execute", "plan", 0, "extra"), 1),
+        (("ai_response", "execute", "parameters", "when"), {1, 2}),
+        (("ai_response", "execute", "parameters", "9 not a name"), {1, 2}),
+        (("ai_response", "extra"), 1),
+        (("extra",), 1),
+        (("seq",), 7),
+        (("seq",), 0),
+        (("seq",), 1.5),
+        (("seq",), True),
+        (("seq",), "7"),
+        (("trace_id",), "4bf92f3577b34da6a3ce929d0e0e4736"),
+        (("trace_id",), None),
+    ]:
+        data = copy.deepcopy(VALID)
+        target = data
+        for key in path[:-1]:
+            target = target[key]
+        target[path[-1]] = value
+        yield data
+
+
+class ValidateAiResponseTests(unittest.TestCase):
+
+    def test_valid_message(self):
+        self.assertTrue(validate_ai_response(VALID))
+
+    def test_invalid_message(self):
+        self.assertFalse(validate_ai_response({"type": "ai_response"}))
+        self.assertFalse(validate_ai_response("not a dict"))
+
+    def test_fast_path_agrees_with_schema(self):
+        for data in _variants():
+            with self.subTest(data=data):
+                schema_valid = ai_response_validator.is_valid(data)
+                self.assertEqual(validate_ai_response(data), schema_valid)
+                # The fast path may defer to the schema, but must never accept what it rejects
+                if _is_common_shape(data):
+                    self.assertTrue(schema_valid)
+
+    def test_fast_path_covers_common_shape(self):
+        self.assertTrue(_is_common_shape(VALID))
+        self.assertTrue(_is_common_shape({**VALID, "seq": 7}))
+        self.assertTrue(_is_common_shape({**VALID, "seq": 7, "trace_id": "4bf92f3577b34da6a3ce929d0e0e4736"}))
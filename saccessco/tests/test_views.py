@@ -4,6 +4,7 @@ import json
 from unittest.mock import patch, MagicMock
 from rest_framework.test import APITestCase
 from rest_framework import status
+from django.test import override_settings
 from django.urls import reverse
 import logging
 
@@ -60,7 +61,7 @@ class APIViewTests(APITestCase):
         mock_serializer_instance.is_valid.assert_called_once_with()
 
         MockConversation.assert_called_once_with(conversation_id="test_conv_123")
-        mock_conversation_instance.page_change.assert_called_once_with("<html>mock_html</html>")
+        mock_conversation_instance.page_change.assert_called_once_with("<html>mock_html</html>", None)
 
         # --- REMOVED THIS ASSERTION ---
         # mock_future.result.assert_called_once_with(timeout=None)
@@ -163,3 +164,57 @@ class APIViewTests(APITestCase):
 
         MockConversation.assert_not_called()
 
+
+class TraceAPIViewTests(APITestCase):
+    """
+    Unit tests for the tracing of UserPromptAPIView and the trace endpoints.
+    """
+
+    def setUp(self):
+        from saccessco import tracing
+        tracing.get_buffer().clear()
+
+    @patch('saccessco.views.Conversation')
+    def test_user_prompt_is_traced(self, MockConversation):
+        from saccessco import tracing
+        response = self.client.post(reverse('user_prompt'), {"conversation_id": "c1", "prompt": "Hi"}, format='json')
+        trace_id = response['X-Trace-Id']
+
+        response = self.client.get(reverse('traces'))
+        [trace] = response.data["traces"]
+        self.assertEqual(trace["trace_id"], trace_id)
+        # Named by a pseudonym: the ID would let anyone read the conversation's responses
+        self.assertEqual(trace["attributes"], {"transport": "http", "conversation": tracing.conversation_ref("c1")})
+        self.assertNotIn(b'"c1"', response.content)
+        self.assertEqual([span["name"] for span in trace["spans"]], ["user_prompt", "validate_request"])
+
+    @patch('saccessco.views.Conversation')
+    def test_otlp_export_and_stats(self, MockConversation):
+        self.client.post(reverse('user_prompt'), {"conversation_id": "c1", "prompt": "Hi"}, format='json')
+
+        response = self.client.get(reverse('traces_otlp'))
+        self.assertNotIn(b'"c1"', response.content)
+        spans = response.data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        self.assertEqual({span["name"] for span in spans}, {"user_prompt", "validate_request"})
+
+        response = self.client.get(reverse('traces_stats'))
+        [group] = response.data["groups"]
+        self.assertEqual(group["stages"]["validate_request"]["count"], 1)
+        self.assertEqual(self.client.get(reverse('traces_stats'), {"engine": "other"}).data, {"groups": []})
+
+
+class OpsTokenTests(APITestCase):
+    """
+    Tests that the operator endpoints need SACCESSCO_OPS_TOKEN once it is set.
+    """
+
+    @override_settings(SACCESSCO_OPS_TOKEN="ops-token")
+    def test_token_required(self):
+        for name in ['traces', 'traces_otlp', 'traces_stats', 'usage', 'profile', 'metrics']:
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name)).status_code, 403)
+                self.assertEqual(self.client.get(reverse(name), HTTP_AUTHORIZATION="Bearer wrong").status_code, 403)
+                self.assertEqual(self.client.get(reverse(name), HTTP_AUTHORIZATION="Bearer ops-token").status_code,
+                                 200)
+        response = self.client.post(reverse('profile'), {"conversation_id": "c"}, format='json')
+        self.assertEqual(response.status_code, 403)
@@ -0,0 +1,327 @@
+# saccessco/tracing.py
+"""
+Latency tracing of user prompts, from the request to the client's receipt of the response.
+
+A trace is started where a prompt arrives and activated (a context variable) wherever its
+work runs, the conversation's executor thread included. Code times its stages with
+span(name), which does nothing when no trace is active. Traces are kept in a ring buffer,
+exported as OpenTelemetry (OTLP/JSON) spans and summarised as per stage percentiles.
+
+Traces name their conversation by conversation_ref(), never by its ID: the ID is all a
+client needs to read a conversation's responses, and traces are served to operators.
+"""
+import hashlib
+import math
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("saccessco_trace", default=None)
+_span: ContextVar[Optional["Span"]] = ContextVar("saccessco_span", default=None)
+
+
+class Span:
+    """
+    One timed stage of a trace. Times are nanoseconds since the epoch, as in OpenTelemetry.
+    """
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str], start_ns: int,
+                 attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.start_ns = start_ns
+        self.end_ns: Optional[int] = None
+        self.attributes = dict(attributes or {})
+        self.error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name, "span_id": self.span_id, "parent_id": self.parent_id,
+            "start_ns": self.start_ns, "end_ns": self.end_ns, "duration_ms": self.duration_ms,
+            "attributes": self.attributes, "error": self.error,
+        }
+
+
+class Trace:
+    """
+    The spans of one user prompt. Its root span lasts until end() is called, once the
+    response was sent; the client's receipt may still be added after that.
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.trace_id = secrets.token_hex(16)
+        self.root = Span(name, self.trace_id, None, time.time_ns(), attributes)
+        self.spans: List[Span] = [self.root]
+
+    @property
+    def attributes(self) -> dict:
+        return self.root.attributes
+
+    def set_attributes(self, **attributes):
+        self.root.set_attributes(**attributes)
+
+    def add(self, span: Span):
+        # list.append is atomic: spans are added from the request, executor and event loop threads
+        self.spans.append(span)
+
+    def find(self, name: str) -> Optional[Span]:
+        """
+        The last span of this name.
+        """
+        for span in reversed(self.spans):
+            if span.name == name:
+                return span
+        return None
+
+    def end(self, error: Optional[str] = None):
+        if self.root.end_ns is None:
+            self.root.end_ns = time.time_ns()
+            self.root.error = error
+
+    def to_dict(self) -> dict:
+        return {"trace_id": self.trace_id, "name": self.root.name, "attributes": self.attributes,
+                "duration_ms": self.root.duration_ms, "spans": [span.to_dict() for span in list(self.spans)]}
+
+
+class TraceBuffer:
+    """
+    The last max_traces traces, oldest first, looked up by trace id.
+    """
+
+    def __init__(self, max_traces: int = 500):
+        self.max_traces = max_traces
+        self._traces: "OrderedDict[str, Trace]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces[trace.trace_id] = trace
+            while len(self._traces) > self.max_traces:
+                self._traces.popitem(last=False)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        return self._traces.get(trace_id)
+
+    def traces(self) -> List[Trace]:
+        with self._lock:
+            return list(self._traces.values())
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+_buffer: Optional[TraceBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> TraceBuffer:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = TraceBuffer(getattr(settings, "SACCESSCO_TRACE_BUFFER", 500))
+        return _buffer
+
+
+def conversation_ref(conversation_id: Optional[str]) -> Optional[str]:
+    """
+    A stable pseudonym of a conversation ID, keyed with SECRET_KEY, for what is shown to
+    operators: it tells conversations apart without handing out their IDs.
+    """
+    if conversation_id is None:
+        return None
+    key = settings.SECRET_KEY.encode("utf-8")[:64]
+    return hashlib.blake2b(conversation_id.encode("utf-8"), key=key, digest_size=8).hexdigest()
+
+
+def new_trace(name: str, **attributes) -> Trace:
+    """
+    Starts a trace and keeps it in the buffer. It isn't active until activate(trace).
+    """
+    trace = Trace(name, **attributes)
+    get_buffer().add(trace)
+    return trace
+
+
+@contextmanager
+def activate(trace: Optional[Trace]):
+    """
+    Makes the trace current for the block, in this thread or task. Does nothing for None.
+    """
+    if trace is None:
+        yield None
+        return
+    trace_token = _trace.set(trace)
+    span_token = _span.set(trace.root)
+    try:
+        yield trace
+    finally:
+        _span.reset(span_token)
+        _trace.reset(trace_token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def current_trace_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.trace_id if trace is not None else None
+
+
+def set_attributes(**attributes):
+    """
+    Sets attributes of the current trace, such as the engine and model that answer it.
+    """
+    trace = _trace.get()
+    if trace is not None:
+        trace.set_attributes(**attributes)
+
+
+def end_trace(error: Optional[str] = None):
+    trace = _trace.get()
+    if trace is not None:
+        trace.end(error)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Times the block as a span of the current trace, a child of the enclosing span. Yields
+    the span, or None when no trace is active.
+    """
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    parent = _span.get()
+    current = Span(name, trace.trace_id, parent.span_id if parent is not None else None, time.time_ns(), attributes)
+    token = _span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.error = repr(e)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        _span.reset(token)
+        trace.add(current)
+
+
+def record_span(name: str, start_ns: int, end_ns: Optional[int] = None, **attributes) -> Optional[Span]:
+    """
+    Adds a span timed elsewhere, such as the time a task waited in a queue, to the current trace.
+    """
+    trace = _trace.get()
+    if trace is None:
+        return None
+    parent = _span.get()
+    recorded = Span(name, trace.trace_id, parent.span_id if parent is not None else None, start_ns, attributes)
+    recorded.end_ns = end_ns if end_ns is not None else time.time_ns()
+    trace.add(recorded)
+    return recorded
+
+
+def record_receipt(trace_id: str, **attributes) -> Optional[Span]:
+    """
+    Records that the client got the response of the trace: a 'client_receipt' span from the
+    end of its group_send until now. Returns None for traces no longer (or never) buffered.
+    """
+    trace = get_buffer().get(trace_id)
+    sent = trace.find("group_send") if trace is not None else None
+    if sent is None or sent.end_ns is None:
+        return None
+    receipt = Span("client_receipt", trace_id, trace.root.span_id, sent.end_ns, attributes)
+    receipt.end_ns = max(time.time_ns(), sent.end_ns)
+    trace.add(receipt)
+    return receipt
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """
+    Nearest-rank percentile of an ascending list.
+    """
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def stage_percentiles(traces: Iterable[Trace], engine: Optional[str] = None,
+                      model: Optional[str] = None) -> List[dict]:
+    """
+    p50/p90/p99 durations in milliseconds of every stage (span name), per engine and model.
+    engine and model select one of them.
+    """
+    durations: Dict[tuple, Dict[str, List[float]]] = {}
+    for trace in traces:
+        key = (trace.attributes.get("engine"), trace.attributes.get("model"))
+        if (engine is not None and key[0] != engine) or (model is not None and key[1] != model):
+            continue
+        stages = durations.setdefault(key, {})
+        for recorded in list(trace.spans):
+            if recorded.end_ns is not None:
+                stages.setdefault(recorded.name, []).append(recorded.duration_ms)
+    groups = []
+    for (group_engine, group_model), stages in durations.items():
+        summary = {}
+        for name, values in sorted(stages.items()):
+            values.sort()
+            summary[name] = {"count": len(values), "p50": percentile(values, 0.5),
+                             "p90": percentile(values, 0.9), "p99": percentile(values, 0.99)}
+        groups.append({"engine": group_engine, "model": group_model, "stages": summary})
+    return groups
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        # 64 bit integers are strings in OTLP/JSON
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(recorded: Span) -> dict:
+    otlp = {
+        "traceId": recorded.trace_id,
+        "spanId": recorded.span_id,
+        "name": recorded.name,
+        "kind": 1,  # SPAN_KIND_INTERNAL
+        "startTimeUnixNano": str(recorded.start_ns),
+        "endTimeUnixNano": str(recorded.end_ns if recorded.end_ns is not None else recorded.start_ns),
+        "attributes": [{"key": key, "value": _otlp_value(value)}
+                       for key, value in recorded.attributes.items() if value is not None],
+        "status": {"code": 2, "message": recorded.error} if recorded.error else {"code": 0},
+    }
+    if recorded.parent_id is not None:
+        otlp["parentSpanId"] = recorded.parent_id
+    return otlp
+
+
+def to_otlp(traces: Iterable[Trace]) -> dict:
+    """
+    The traces as an OTLP/JSON ExportTraceServiceRequest, which OpenTelemetry collectors accept
+    on /v1/traces.
+    """
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "saccessco"}}]},
+        "scopeSpans": [{
+            "scope": {"name": "saccessco.tracing"},
+            "spans": [_otlp_span(recorded) for trace in traces for recorded in list(trace.spans)],
+        }],
+    }]}
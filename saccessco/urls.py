@@ -15,17 +15,32 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 # from django.contrib import admin
+from django.conf import settings
 from django.urls import path
 
 from saccessco.views import PageChangeAPIView, UserPromptAPIView, TestHtmlView, PageManipulatorTestPageView, \
-    FormSubmitSuccessView
+    FormSubmitSuccessView, TraceListAPIView, TraceExportAPIView, TraceStatsAPIView, MetricsView, \
+    UsageAPIView, ProfileAPIView
 
 urlpatterns = [
     #    path('admin/', admin.site.urls),
     path('saccessco/user_prompt/', UserPromptAPIView.as_view(), name='user_prompt'),
     path('saccessco/page_change/', PageChangeAPIView.as_view(), name='page_change'),
-    path('test-page/', TestHtmlView.as_view(), name='test_page'),
-    path('test-page-manipulator/', PageManipulatorTestPageView.as_view(), name='test_page_manipulator'),
-    path('form-submit-success/', FormSubmitSuccessView.as_view(), name='form_submit_success'),
-
 ]
+
+if getattr(settings, "SACCESSCO_OPS_ENDPOINTS", True):
+    urlpatterns += [
+        path('saccessco/traces/', TraceListAPIView.as_view(), name='traces'),
+        path('saccessco/traces/otlp/', TraceExportAPIView.as_view(), name='traces_otlp'),
+        path('saccessco/traces/stats/', TraceStatsAPIView.as_view(), name='traces_stats'),
+        path('saccessco/usage/', UsageAPIView.as_view(), name='usage'),
+        path('saccessco/profile/', ProfileAPIView.as_view(), name='profile'),
+        path('metrics', MetricsView.as_view(), name='metrics'),
+    ]
+
+if getattr(settings, "SACCESSCO_TEST_PAGES", True):
+    urlpatterns += [
+        path('test-page/', TestHtmlView.as_view(), name='test_page'),
+        path('test-page-manipulator/', PageManipulatorTestPageView.as_view(), name='test_page_manipulator'),
+        path('form-submit-success/', FormSubmitSuccessView.as_view(), name='form_submit_success'),
+    ]
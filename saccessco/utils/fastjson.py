@@ -0,0 +1,35 @@
+"""
+JSON encoding for hot paths. Uses orjson when it is installed and falls back to the
+standard library otherwise; both produce compact output.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is in requirements.txt
+    orjson = None
+
+
+def dumps(obj) -> str:
+    if orjson is not None:
+        return orjson.dumps(obj).decode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def dumps_bytes(obj, default=None) -> bytes:
+    """
+    default is called with objects that can't be encoded otherwise, as json.dumps does:
+    with a default, datetimes are passed to it too rather than encoded by orjson, and int,
+    float, bool and None keys are encoded as json.dumps encodes them.
+    """
+    if orjson is not None:
+        if default is None:
+            return orjson.dumps(obj)
+        return orjson.dumps(obj, default=default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default).encode("utf-8")
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -1,5 +1,4 @@
-import json
-from jsonschema import validate, ValidationError
+from jsonschema import Draft7Validator
 import logging
 
 logger = logging.getLogger("saccessco")
@@ -18,6 +17,15 @@ ai_response_schema = {
       "description": "Indicates the overall type of the AI response.",
       "enum": ["ai_response"]
     },
+    "seq": {
+      "type": "integer",
+      "description": "Position of the response in its conversation, from 1; clients use it to ask for missed responses.",
+      "minimum": 1
+    },
+    "trace_id": {
+      "type": "string",
+      "description": "Trace of the user prompt answered, which the client acknowledges on receipt."
+    },
     "ai_response": {
       "type": "object",
       "description": "Contains the detailed AI response, which can include an execution plan and speech.",
@@ -95,28 +103,73 @@ ai_response_schema = {
   "additionalProperties": False
 }
 
+# Built once: validate() would re-check the schema and build a new validator for every message.
+# No format checker is attached, the schema doesn't rely on "format".
+ai_response_validator = Draft7Validator(ai_response_schema)
+
+_ACTIONS = frozenset(ai_response_schema["properties"]["ai_response"]["properties"]["execute"]["properties"]
+                     ["plan"]["items"]["properties"]["action"]["enum"])
+_JSON_TYPES = (str, int, float, bool, type(None), list, dict)
+
+
+def _is_common_shape(data) -> bool:
+    """
+    Hand written check for the shape Conversation sends. Only ever accepts data the schema
+    accepts; anything unusual returns False and goes through full validation.
+    """
+    if type(data) is not dict or data.get("type") != "ai_response":
+        return False
+    keys = data.keys()
+    if keys != {"type", "ai_response"}:
+        if "ai_response" not in keys or not keys <= {"type", "ai_response", "seq", "trace_id"}:
+            return False
+        if "seq" in keys and (type(data["seq"]) is not int or data["seq"] < 1):
+            return False
+        if "trace_id" in keys and type(data["trace_id"]) is not str:
+            return False
+    ai_response = data["ai_response"]
+    if type(ai_response) is not dict or not ai_response.keys() <= {"execute", "speak"}:
+        return False
+    if "speak" in ai_response and type(ai_response["speak"]) is not str:
+        return False
+    if "execute" in ai_response:
+        execute = ai_response["execute"]
+        if type(execute) is not dict or execute.keys() != {"plan", "parameters"}:
+            return False
+        plan, parameters = execute["plan"], execute["parameters"]
+        if type(plan) is not list or type(parameters) is not dict:
+            return False
+        for step in plan:
+            if (type(step) is not dict or step.keys() != {"selector", "action", "data"}
+                    or type(step["selector"]) is not str or step["action"] not in _ACTIONS
+                    or type(step["data"]) not in _JSON_TYPES):
+                return False
+        for value in parameters.values():
+            if type(value) not in _JSON_TYPES:
+                return False
+    return True
+
+
 def validate_ai_response(data: dict) -> bool:
     """
     Validates a given JSON object against the AI response schema.
+    The common shape is checked by hand; only data failing that check pays for full validation.
 
     Args:
         data: The JSON object (as a Python dictionary) to validate.
 
     Returns:
-        True if the data is valid, False otherwise. Prints validation errors if invalid.
+        True if the data is valid, False otherwise. Logs validation errors if invalid.
     """
-    try:
-        validate(instance=data, schema=ai_response_schema)
-        logger.info("Validation successful: Data conforms to the schema.")
+    if _is_common_shape(data):
         return True
-    except ValidationError as e:
-        logger.error(f"Validation Error: {e.message}")
-        logger.info(f"Path: {list(e.path)}")
-        logger.info(f"Validator: {e.validator} with value {e.validator_value}")
-        return False
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON Decode Error: Input is not a valid JSON object. {e}")
-        return False
+    try:
+        error = next(ai_response_validator.iter_errors(data), None)
     except Exception as e:
         logger.error(f"An unexpected error occurred during validation: {e}")
         return False
+    if error is None:
+        return True
+    logger.error(f"Validation Error: {error.message} at {list(error.path)} "
+                 f"(validator: {error.validator})")
+    return False
@@ -1,4 +1,6 @@
 # saccessco/views.py
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render, redirect
 from django.utils.decorators import method_decorator
 from django.views import View
@@ -10,7 +12,10 @@ from rest_framework.response import Response
 from rest_framework import status
 
 from .conversation import Conversation
-from .serializers import PageChangeSerializer, UserPromptSerializer
+from .serializers import PageChangeSerializer, ProfileToggleSerializer, UserPromptSerializer
+from . import accounting, metrics, profiling, tracing
+from .permissions import HasOpsToken, has_ops_token
+from .logpipeline import payload
 import logging
 
 logger = logging.getLogger("saccessco")
@@ -18,13 +23,21 @@ logger = logging.getLogger("saccessco")
 class PageChangeAPIView(APIView):
 
     def post(self, request, *args, **kwargs):
+        # The conversation work it submits is profiled too, see saccessco.profiling
+        with profiling.profile("page_change_api", enabled=profiling.requested(request.headers.get(profiling.HEADER))):
+            return self._post(request)
+
+    def _post(self, request):
+        metrics.PAGE_CHANGE_BYTES.labels('http').inc(int(request.META.get('CONTENT_LENGTH') or 0))
         serializer = PageChangeSerializer(data=request.data)
         if serializer.is_valid():
-            conversation_id = serializer.data["conversation_id"]
+            conversation_id = serializer.validated_data['conversation_id']
             page_change_html = serializer.validated_data['html']
+            # The extension's requests come from the page, with its Origin
+            url = serializer.validated_data.get('url') or request.headers.get('Origin')
 
             conversation = Conversation(conversation_id=conversation_id)
-            conversation.page_change(page_change_html)
+            conversation.page_change(page_change_html, url)
 
             return Response(
                 {"message": "Page change received successfully", "status": "success"},
@@ -41,27 +54,132 @@ class PageChangeAPIView(APIView):
 class UserPromptAPIView(APIView):
 
     def post(self, request, *args, **kwargs):
-        logger.info(f"UserPromptAPIView called with {request.data}")
-        serializer = UserPromptSerializer(data=request.data)
-        if serializer.is_valid():
-            conversation_id = serializer.data["conversation_id"]
-            user_prompt = serializer.validated_data['prompt']
+        logger.info("UserPromptAPIView called with %s", payload(request.data))
+        # Followed until the client acknowledges the response, see saccessco.tracing
+        trace = tracing.new_trace("user_prompt", transport="http")
+        with tracing.activate(trace):
+            with tracing.span("validate_request"):
+                serializer = UserPromptSerializer(data=request.data)
+                valid = serializer.is_valid()
+            if valid:
+                conversation_id = serializer.validated_data['conversation_id']
+                user_prompt = serializer.validated_data['prompt']
+                trace.set_attributes(conversation=tracing.conversation_ref(conversation_id))
+
+                conversation = Conversation(conversation_id=conversation_id)
+                conversation.user_prompt(user_prompt)
+
+                # --- ADD THIS RETURN STATEMENT ---
+                response = Response(
+                    {"message": "User prompt received successfully", "status": "success"},
+                    status=status.HTTP_200_OK
+                )
+                response['X-Trace-Id'] = trace.trace_id
+                return response
+                # --- END ADDITION ---
+            else:
+                trace.end(error="invalid request")
+                # If the data is not valid, return the errors
+                return Response(
+                    serializer.errors,
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+
+def _limit(request, default=100) -> int:
+    try:
+        return max(int(request.query_params.get('limit', default)), 0)
+    except ValueError:
+        return default
+
+
+class TraceListAPIView(APIView):
+    """
+    The last traced user prompts, newest first, with their spans. ?limit=N (default 100).
+    """
+    permission_classes = [HasOpsToken]
+
+    def get(self, request, *args, **kwargs):
+        traces = tracing.get_buffer().traces()[::-1][:_limit(request)]
+        return Response({"traces": [trace.to_dict() for trace in traces]})
+
+
+class TraceExportAPIView(APIView):
+    """
+    The buffered traces as OpenTelemetry OTLP/JSON, ready to POST to a collector's /v1/traces.
+    """
+    permission_classes = [HasOpsToken]
+
+    def get(self, request, *args, **kwargs):
+        return Response(tracing.to_otlp(tracing.get_buffer().traces()))
+
+
+class TraceStatsAPIView(APIView):
+    """
+    Per stage p50/p90/p99 durations (ms) of the buffered traces, per engine and model.
+    ?engine= and ?model= select one.
+    """
+    permission_classes = [HasOpsToken]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"groups": tracing.stage_percentiles(
+            tracing.get_buffer().traces(),
+            engine=request.query_params.get('engine'), model=request.query_params.get('model'))})
+
+
+class UsageAPIView(APIView):
+    """
+    Token and cost accounting of the LLM calls, see saccessco.accounting: totals per day,
+    model and site domain, and the conversations spending the most, by their
+    tracing.conversation_ref(). ?sort=cost (default), tokens, seconds or calls; ?limit=N
+    (default 100); ?domain= selects a site's conversations.
+    """
+    permission_classes = [HasOpsToken]
+
+    def get(self, request, *args, **kwargs):
+        sort = request.query_params.get('sort', 'cost')
+        if sort not in accounting.SORT_KEYS:
+            return Response({"sort": [f"Expected one of {', '.join(accounting.SORT_KEYS)}."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        report = accounting.get_ledger().report(sort, _limit(request), request.query_params.get('domain'))
+        report["budgets"] = {
+            "conversation_usd": getattr(settings, "SACCESSCO_CONVERSATION_BUDGET_USD", None),
+            "daily_usd": getattr(settings, "SACCESSCO_DAILY_BUDGET_USD", None),
+        }
+        return Response(report)
+
+
+class ProfileAPIView(APIView):
+    """
+    The conversations whose every request is profiled, see saccessco.profiling. POST
+    {"conversation_id": ..., "enabled": true or false} switches one on or off.
+    """
+    permission_classes = [HasOpsToken]
+
+    def get(self, request, *args, **kwargs):
+        return Response({"conversations": profiling.profiled_conversations(),
+                         "enabled": getattr(settings, "SACCESSCO_PROFILING", False)})
 
-            conversation = Conversation(conversation_id=conversation_id)
-            conversation.user_prompt(user_prompt)
+    def post(self, request, *args, **kwargs):
+        serializer = ProfileToggleSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        profiling.enable_conversation(serializer.validated_data['conversation_id'],
+                                      serializer.validated_data['enabled'])
+        return Response({"conversations": profiling.profiled_conversations(),
+                         "enabled": getattr(settings, "SACCESSCO_PROFILING", False)})
+
+
+class MetricsView(View):
+    """
+    The metrics in the Prometheus text format, see saccessco.metrics.
+    """
+
+    def get(self, request, *args, **kwargs):
+        if not has_ops_token(request):
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.exposition(), content_type=metrics.CONTENT_TYPE)
 
-            # --- ADD THIS RETURN STATEMENT ---
-            return Response(
-                {"message": "User prompt received successfully", "status": "success"},
-                status=status.HTTP_200_OK
-            )
-            # --- END ADDITION ---
-        else:
-            # If the data is not valid, return the errors
-            return Response(
-                serializer.errors,
-                status=status.HTTP_400_BAD_REQUEST
-            )
 
 class TestHtmlView(TemplateView):
     template_name = "test.html"